@@ -0,0 +1,512 @@
+#!/usr/bin/python
+"""
+Headless benchmark of command base load, query and render.
+
+For every size a synthetic catalog is generated: program tags and other
+tags are drawn from power law distributions, so few tags match most
+commands like in real command bases. Every backend is then measured in
+fresh processes, so load times and peak memory are not skewed by
+earlier runs:
+
+- ``cold``: compile command base from json files.
+- ``warm``: open compiled command base, run queries of every class (see
+  `QUERY_CLASSES`) and type queries into UI drawn on a curses stand-in
+  (`Window`), so no terminal is needed.
+
+Time to prompt of ``shearch.py`` itself is measured too, median must
+stay within `STARTUP_BUDGET`, otherwise exit status is 1.
+
+Latencies are reported as percentiles in milliseconds, memory as peak
+resident set size in KiB. Results are written as json, so runs can be
+compared to find regressions.
+
+Usage: ``python benchmark.py [-s sizes] [-b backends] [-f files] [-o output]``.
+"""
+
+import argparse
+import curses
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from timeit import default_timer as timer
+
+import padpool
+import shearch
+from db import backend
+from db import usage
+
+LIMIT = 40
+"""Results fetched per query, about two screens like `listview`."""
+
+QUERY_CLASSES = ('wide', 'medium', 'narrow', 'prefix', 'fuzzy')
+"""
+Queries by number of matching commands: the most common tags, tags of
+medium frequency, two tags of one command, prefix of a tag and a tag
+with a typo (approximate search).
+"""
+
+SCREEN = (40, 120)
+"""Rows and columns of stand-in terminal."""
+
+SIZES = (1000, 10000, 100000, 1000000)
+"""Default numbers of commands in synthetic catalogs."""
+
+SHEARCH_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'shearch.py')
+
+STARTUP_BUDGET = 100
+"""Milliseconds from start of `SHEARCH_FILE` to drawn prompt (median)."""
+
+_PROMPT = b'tags:'
+
+_SYLLABLES = ('ba', 'cor', 'de', 'fi', 'git', 'ka', 'lo', 'mi', 'nu', 'pre',
+              'qu', 'ra', 'st', 'tor', 'un', 've', 'x', 'zo')
+
+class Curses(object):
+
+    """Stand-in of `curses` module, creates `Window` pads."""
+
+    def __getattr__(self, name):
+        return getattr(curses, name)
+
+    def doupdate(self):
+        pass
+
+    def newpad(self, rows, cols):
+        return Window(rows, cols)
+
+class Window(object):
+
+    """Stand-in of curses window keeping its text in memory."""
+
+    def __init__(self, rows, cols):
+        self._lines = [[u' '] * cols for row in range(rows)]
+        self._y = 0
+        self._x = 0
+
+    def addstr(self, *args):
+        y, x, text = self._args(args)
+        line = self._lines[y]
+        text = text[:len(line) - x]
+        line[x:x + len(text)] = list(text)
+        self._y, self._x = y, min(x + len(text), len(line) - 1)
+
+    def box(self):
+        pass
+
+    def clrtoeol(self):
+        line = self._lines[self._y]
+        line[self._x:] = [u' '] * (len(line) - self._x)
+
+    def erase(self):
+        for line in self._lines:
+            line[:] = [u' '] * len(line)
+
+    def getch(self):
+        return -1
+
+    def getmaxyx(self):
+        return len(self._lines), len(self._lines[0])
+
+    def getyx(self):
+        return self._y, self._x
+
+    def insstr(self, *args):
+        y, x, text = self._args(args)
+        line = self._lines[y]
+        line[x:x] = list(text)
+        del line[-len(text) or len(line):]
+
+    def instr(self, y, x, n=None):
+        self._y, self._x = y, x
+        end = len(self._lines[y]) if n is None else x + n
+        return u''.join(self._lines[y][x:end]).encode('utf-8')
+
+    def keypad(self, flag):
+        pass
+
+    def move(self, y, x):
+        self._y, self._x = y, x
+
+    def noutrefresh(self, *args):
+        pass
+
+    def refresh(self, *args):
+        pass
+
+    def resize(self, rows, cols):
+        self._lines = [(line + [u' '] * cols)[:cols]
+                       for line in self._lines[:rows]]
+
+    def timeout(self, delay):
+        pass
+
+    def _args(self, args):
+        """Return (y, x, text) of arguments of `addstr` or `insstr`."""
+        if isinstance(args[0], int):
+            y, x, text = args[:3]
+        else:
+            y, x, text = self._y, self._x, args[0]
+        if isinstance(text, bytes):
+            text = text.decode('utf-8')
+        return y, x, text
+
+def generate(size, directory, seed=0, n_queries=100, files=1):
+    """
+    Write catalog of `size` commands split into `files` json files in
+    `directory`.
+
+    Return dictionary of queries, key is query class, value is list of
+    (tags, prefix, approximate).
+    """
+    rng = random.Random(seed)
+    programs = _words(rng, max(20, size // 50))
+    tags = _words(rng, max(100, int(size ** 0.75)))
+    queries = dict((name, []) for name in QUERY_CLASSES)
+
+    out = None
+    part = None
+    for n in range(size):
+        if n * files // size != part:
+            # Streamed, so 1M commands do not have to fit in memory.
+            if out is not None:
+                out.write('\n]}\n')
+                out.close()
+            part = n * files // size
+            out = open(os.path.join(directory, 'synthetic-%04d.json' % part),
+                       'w')
+            out.write('{"item": [\n')
+        else:
+            out.write(',\n')
+
+        program = _pick(rng, programs)
+        item_tags = [program]
+        for m in range(rng.randint(1, 5)):
+            tag = _pick(rng, tags)
+            if tag not in item_tags:
+                item_tags.append(tag)
+
+        args = [u'--%s' % tag for tag in item_tags[1:3]]
+        args.append(u'/tmp/file%d' % n)
+        command = u' '.join([program] + args)
+        item = {
+            u'command': command,
+            u'description': u'%s %s, synthetic command %d.' % (
+                program.capitalize(), u' '.join(item_tags[1:]), n),
+            u'tag': item_tags,
+        }
+        if n % 10 == 0:
+            item[u'nix_edit'] = {
+                u'mask': command.replace(args[-1], u'%s'),
+                u'args': [args[-1]],
+            }
+        out.write(json.dumps(item))
+
+        if rng.random() < 2.0 * n_queries / size:
+            _add_queries(rng, queries, item_tags, n_queries)
+    if out is not None:
+        out.write('\n]}\n')
+        out.close()
+
+    for name in ('wide', 'medium'):
+        # Common tags of all commands, not just of sampled ones.
+        vocabulary = (programs[:5] + tags[:5] if name == 'wide' else
+                      tags[len(tags) // 20:len(tags) // 10])
+        queries[name] = [([rng.choice(vocabulary)], False, False)
+                         for n in range(n_queries)]
+    return queries
+
+def load(data, directory):
+    """Make backend `data` use json files of `directory`, load them."""
+    data.DB_DIR = directory
+    if hasattr(data, 'INDEX_FILE'):
+        data.INDEX_FILE = os.path.join(directory, 'catalog.idx')
+    if hasattr(data, 'SQLITE_FILE'):
+        data.SQLITE_FILE = os.path.join(directory, 'catalog.sqlite')
+    # No usage log, results keep command base order.
+    data.frecency = usage.Scores(os.devnull + '.missing')
+    data.refresh()
+
+def measure(phase, name, directory):
+    """Return results of `phase` for backend `name`, see module docs."""
+    data = backend.get(name)
+    start = timer()
+    load(data, os.path.join(directory, 'db'))
+    result = {'load': timer() - start}
+    if phase == 'warm':
+        with open(os.path.join(directory, 'queries.json')) as f:
+            queries = json.load(f)
+        result['queries'] = query(data, queries)
+        result.update(render(data, queries))
+    result['peak_rss_kb'] = peak_rss()
+    return result
+
+def peak_rss():
+    """Return peak resident set size of this process in KiB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Bytes on macOS.
+        rss //= 1024
+    return rss
+
+def percentiles(samples):
+    """Return percentiles of `samples` (seconds) in milliseconds."""
+    samples = sorted(samples)
+    if not samples:
+        return {'n': 0}
+
+    def rank(p):
+        return round(1000 * samples[min(int(p * len(samples)),
+                                        len(samples) - 1)], 4)
+
+    return {
+        'n': len(samples),
+        'mean': round(1000 * sum(samples) / len(samples), 4),
+        'p50': rank(0.5),
+        'p90': rank(0.9),
+        'p99': rank(0.99),
+        'max': round(1000 * samples[-1], 4),
+    }
+
+def query(data, queries):
+    """Return latencies of `get_commands` by query class."""
+    result = {}
+    for name in QUERY_CLASSES:
+        samples = []
+        found = 0
+        for tags, prefix, approximate in queries[name]:
+            if hasattr(data, 'cache'):
+                # Measure search itself, not cache of repeated queries.
+                data.cache.clear()
+            start = timer()
+            found += len(data.get_commands(tags, prefix, approximate, LIMIT))
+            samples.append(timer() - start)
+        result[name] = percentiles(samples)
+        result[name]['results'] = found / max(len(samples), 1.0)
+    return result
+
+def render(data, queries):
+    """
+    Return latencies of typing and of building `command_.Command`.
+
+    Queries are typed into UI drawn on `Window` one character at a time.
+    Every character is searched by `shearch.Searcher` and its results are
+    shown, as when keys are typed slower than `shearch.KEY_INTERVAL`.
+    """
+    shearch.curses = padpool.curses = Curses()
+    shearch.init(Window(*SCREEN), data)
+    shearch.searcher = shearch.Searcher(shearch.get_search,
+                                        2 * shearch.n_rows)
+    shearch.searcher.start()
+
+    keys = []
+    for tags, prefix, approximate in queries['narrow']:
+        shearch.search = data.Search()
+        typed = ''
+        for ch in ' '.join(tags):
+            typed += ch
+            start = timer()
+            shearch.searcher.submit(typed)
+            shearch.show_searched(wait=True)
+            keys.append(timer() - start)
+
+    items = data.get_commands(queries['wide'][0][0], limit=LIMIT)
+    builds = []
+    for n, item in enumerate(items * (1 + 200 // max(len(items), 1))):
+        start = timer()
+        command = shearch.build_command(item, shearch.pad + n % shearch.n_rows)
+        builds.append(timer() - start)
+        shearch.release_command(command)
+    return {'typing': percentiles(keys), 'command': percentiles(builds)}
+
+def run(sizes, names, n_queries, seed, files=1):
+    """Return list of results for every size and backend."""
+    results = []
+    for size in sizes:
+        directory = tempfile.mkdtemp(prefix='shearch-bench-')
+        try:
+            _log('generating %d commands' % size)
+            start = timer()
+            # Queries are kept out of json files of command base.
+            db_dir = os.path.join(directory, 'db')
+            os.mkdir(db_dir)
+            queries = generate(size, db_dir, seed, n_queries, files)
+            with open(os.path.join(directory, 'queries.json'), 'w') as f:
+                json.dump(queries, f)
+            _log('generated in %.1f s' % (timer() - start))
+
+            for name in names:
+                result = {'backend': name, 'size': size}
+                for phase in ('cold', 'warm'):
+                    _log('%s %s %d' % (phase, name, size))
+                    output = subprocess.check_output(
+                        [sys.executable, os.path.abspath(__file__),
+                         '--phase', phase, '-b', name, directory])
+                    measured = json.loads(output.decode('utf-8'))
+                    result['load_' + phase] = measured.pop('load')
+                    result['peak_rss_kb_' + phase] = measured.pop(
+                        'peak_rss_kb')
+                    result.update(measured)
+                results.append(result)
+        finally:
+            shutil.rmtree(directory)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark shearch on synthetic command bases.')
+    parser.add_argument('directory', nargs='?', help=argparse.SUPPRESS)
+    parser.add_argument('--phase', choices=('cold', 'warm'),
+                        help=argparse.SUPPRESS)
+    parser.add_argument('-s', '--sizes',
+                        default=','.join(str(size) for size in SIZES),
+                        help='comma separated numbers of commands '
+                        '(default %(default)s)')
+    parser.add_argument('-b', '--backends',
+                        default=','.join(sorted(backend.BACKENDS)),
+                        help='comma separated backends (default %(default)s)')
+    parser.add_argument('-n', '--queries', type=int, default=100,
+                        help='queries per class (default %(default)s)')
+    parser.add_argument('-f', '--files', type=int, default=1,
+                        help='json files of every catalog '
+                        '(default %(default)s)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of synthetic catalogs')
+    parser.add_argument('-r', '--startup-runs', type=int, default=10,
+                        help='runs measuring time to prompt, 0 to skip '
+                        '(default %(default)s)')
+    parser.add_argument('-o', '--output', default='-',
+                        help='json file (default standard output)')
+    args = parser.parse_args()
+
+    if args.phase:
+        # Child process measuring one backend.
+        result = measure(args.phase, args.backends, args.directory)
+        sys.stdout.write(json.dumps(result))
+        return
+
+    report = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'limit': LIMIT,
+    }
+    if args.startup_runs > 0:
+        _log('startup')
+        report['startup'] = percentiles(startup(args.startup_runs))
+        report['startup']['budget'] = STARTUP_BUDGET
+        report['startup']['within_budget'] = (
+            report['startup']['p50'] <= STARTUP_BUDGET)
+    report['results'] = run([int(size) for size in args.sizes.split(',')],
+                            args.backends.split(','), args.queries, args.seed,
+                            args.files)
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as out:
+            json.dump(report, out, indent=2, sort_keys=True)
+
+    if not report.get('startup', {}).get('within_budget', True):
+        _log('time to prompt is over budget of %d ms' % STARTUP_BUDGET)
+        return 1
+    return 0
+
+def startup(runs):
+    """
+    Return times (seconds) from start of `SHEARCH_FILE` to drawn prompt.
+
+    Shearch runs in a pseudo terminal with installed command base, enter
+    is pressed as soon as prompt is drawn.
+    """
+    import fcntl
+    import pty
+    import select
+    import struct
+    import termios
+
+    samples = []
+    for n in range(runs):
+        start = timer()
+        pid, fd = pty.fork()
+        if pid == 0:
+            fcntl.ioctl(0, termios.TIOCSWINSZ,
+                        struct.pack('HHHH', SCREEN[0], SCREEN[1], 0, 0))
+            os.environ['TERM'] = 'xterm'
+            # Chosen command is written to descriptor 3.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), 3)
+            os.execv(sys.executable, [sys.executable, SHEARCH_FILE])
+
+        output = b''
+        while _PROMPT not in output and select.select([fd], [], [], 10)[0]:
+            chunk = _read(fd)
+            if not chunk:
+                break
+            output += chunk
+        samples.append(timer() - start)
+
+        os.write(fd, b'\r')
+        while _read(fd):
+            pass
+        os.waitpid(pid, 0)
+        os.close(fd)
+        if _PROMPT not in output:
+            raise RuntimeError('Prompt was not drawn: %r' % output)
+    return samples
+
+def _add_queries(rng, queries, item_tags, n_queries):
+    """Add queries of command tagged with `item_tags` (narrow classes)."""
+    tag = rng.choice(item_tags)
+    candidates = {
+        'narrow': (rng.sample(item_tags, min(2, len(item_tags))),
+                   False, False),
+        'prefix': ([tag[:2]], True, False),
+        'fuzzy': ([_typo(rng, tag)], False, True),
+    }
+    for name, candidate in candidates.items():
+        if len(queries[name]) < n_queries:
+            queries[name].append(candidate)
+
+def _read(fd):
+    """Return output of pseudo terminal `fd`, empty when it is closed."""
+    try:
+        return os.read(fd, 4096)
+    except OSError:
+        return b''
+
+def _log(message):
+    sys.stderr.write('%s\n' % message)
+    sys.stderr.flush()
+
+def _pick(rng, words):
+    """Return one of `words`, first ones are much more likely."""
+    return words[int(len(words) * rng.random() ** 3)]
+
+def _typo(rng, word):
+    """Return `word` with one character replaced."""
+    n = rng.randrange(len(word))
+    return word[:n] + rng.choice('aeiouxyz') + word[n + 1:]
+
+def _words(rng, count):
+    """Return `count` distinct pronounceable words."""
+    result = []
+    seen = set()
+    while len(result) < count:
+        word = u''.join(rng.choice(_SYLLABLES)
+                        for n in range(rng.randint(2, 4)))
+        if len(result) >= len(_SYLLABLES) ** 2:
+            word += u'%d' % len(result)
+        if word not in seen:
+            seen.add(word)
+            result.append(word)
+    return result
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Non-interactive queries, this module defines the following functions:
+
+- `parser`: argument parser of ``shearch.py``.
+- `run`: answer queries of parsed arguments.
+
+Commands are looked up without terminal (curses is never initialized)
+and written to standard output as they are found, so they can be fed to
+scripts, editors or fzf::
+
+    shearch.py --query git status --format json
+    shearch.py --batch --format tsv < queries
+
+Query is a list of tags, see `db.backend`. In batch mode every line of
+standard input is a query and command base is loaded once for all of
+them. Formats:
+
+- ``tsv``: command, description and tags (separated by space) per line.
+- ``json``: json object per line. In batch mode one json list of
+  objects per query instead.
+- ``nul``: commands terminated by NUL character (``fzf --read0``,
+  ``xargs -0``).
+
+In batch mode results of every query are followed by an empty line
+(``tsv``) or an empty record (``nul``).
+"""
+
+__docformat__ = 'reStructuredText'
+
+import argparse
+import errno
+import itertools
+import json
+import re
+import sys
+
+FORMATS = ('tsv', 'json', 'nul')
+"""Output formats, see module docs."""
+
+_SEPARATORS = re.compile(r'[\t\r\n]')
+
+def parser():
+    """Return argument parser of ``shearch.py``."""
+    result = argparse.ArgumentParser(
+        description='Search commands by tags. Without options shows '
+        'interactive search, chosen command is written to descriptor 3.')
+    result.add_argument('-q', '--query', nargs='+', metavar='tag',
+                        help='print commands tagged with all tags')
+    result.add_argument('-b', '--batch', action='store_true',
+                        help='answer queries read from standard input, '
+                        'one per line')
+    result.add_argument('-f', '--format', choices=FORMATS, default='tsv',
+                        help='output format (default %(default)s)')
+    result.add_argument('-n', '--limit', type=int,
+                        help='maximum number of commands per query')
+    result.add_argument('-p', '--prefix', action='store_true',
+                        help='last tag matches tags starting with it')
+    result.add_argument('-a', '--approximate', action='store_true',
+                        help='search words of commands and similar tags '
+                        'when nothing matches')
+    return result
+
+def run(args, data=None):
+    """
+    Answer queries of parsed `args` using `data` (see `db.backend`).
+
+    Return exit status: 0 if any command was found, 1 otherwise.
+    """
+    if data is None:
+        from db import backend
+        data = backend.connect()
+
+    out = getattr(sys.stdout, 'buffer', sys.stdout)
+    found = False
+    try:
+        if not args.batch:
+            for item in lookup(data, args.query, args):
+                found = True
+                out.write(_format(item, args.format))
+            out.flush()
+            return 0 if found else 1
+
+        for line in iter(sys.stdin.readline, ''):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            items = list(lookup(data, line.split(), args))
+            if args.format == 'json':
+                out.write(_encode(json.dumps(items, default=dict,
+                                             sort_keys=True) + '\n'))
+            else:
+                for item in items:
+                    out.write(_format(item, args.format))
+                out.write(b'\n' if args.format == 'tsv' else b'\0')
+            found = found or bool(items)
+            # Answer now, caller may wait for it before the next query.
+            out.flush()
+    except IOError as e:
+        if e.errno != errno.EPIPE:
+            raise
+        # Reader has seen enough (head, fzf).
+    return 0 if found else 1
+
+def lookup(data, tags, args):
+    """
+    Return iterator of items of `data` matching `tags`, see `parser`.
+    Items are fetched a page at a time as it is iterated.
+    """
+    if not tags:
+        return iter([])
+    cursor = data.cursor(tags, args.prefix)
+    if args.approximate and not cursor.count():
+        cursor = data.cursor(tags, False, True)
+    return itertools.islice(cursor, args.limit)
+
+def _encode(text):
+    return text.encode('utf-8')
+
+def _format(item, output_format):
+    """Return record of `item` in `output_format` as bytes."""
+    if output_format == 'json':
+        return _encode(json.dumps(item, default=dict, sort_keys=True) + '\n')
+    if output_format == 'nul':
+        return _encode(item['command']) + b'\0'
+    fields = [item['command'], item['description'], u' '.join(item['tag'])]
+    # Tabs and line ends would break columns.
+    return _encode(u'\t'.join(_SEPARATORS.sub(u' ', field)
+                              for field in fields) + u'\n')
@@ -15,6 +15,7 @@ How To Use This Module
 1. Import it: ``>>> import command_``.
 
 2. Initialize command: ``>>> mycommand = command_.Command(...)``.
+   It is shown on next ``curses.doupdate()``.
 
 3. Interact with command::
 
@@ -23,18 +24,24 @@ How To Use This Module
     b) Move cursor: ``mycommand.get_input_field().move(0, 0)``.
 
     c) Edit command in-place: ``mycommand.edit()``.
+
+    d) Show resolved ``%c`` placeholder: ``mycommand.resolve(c, output)``.
 """
 
 __docformat__ = 'reStructuredText'
 
+from bisect import bisect_left, bisect_right
 import curses
 from curses import textpad
-import difflib
 import re
-import sre_constants
-import subprocess
 
 import bindings
+import gapbuffer
+import resolver
+import tracing
+
+_WORD = re.compile(r'\w+')
+"""Word for word traversal (ALT_B, ALT_F, CTRL_W)."""
 
 class Command(textpad.Textbox):
 
@@ -65,18 +72,20 @@ class Command(textpad.Textbox):
     stdscr = None
     """Global, main terminal screen."""
 
+    @tracing.traced('Command')
     def __init__(self, item, box, input_field, tab_offset, *args, **kwargs):
         """
         Extend `Textbox` `__init__` method. Initialize a `Command` object.
 
         Parameters:
 
-        - `item`: a dictionary containing command, description, tags.
+        - `item`: a mapping (dictionary or `db.index.Item`) containing
+          command, description, tags.
         - `box`:
             - `_line_number`: Number of row command is rendered in terminal.
             - `_y_offset`: _y_ offset from left terminal screen edge.
             - `_xmax`: Maximum screen size, _x_ axis.
-        - `input_field`: edible window (one line).
+        - `input_field`: edible window (one line), grown to fit command.
         - `tab_offset`: Number of characters tab characters to show.
         """
 
@@ -89,14 +98,20 @@ class Command(textpad.Textbox):
         """Dictionary of indexes of words (arguments) that are tabbable.
         Key is index of position in input field, value is word."""
 
-        self._tab_args = {}
-        """Dictionary of words (arguments), that are tabbable.
-        Key is the word, value is a list of starting indexes of that word."""
-
         self._index_tab = []
-        """Indexes of edible arguments (_x_ axis)."""
+        """Sorted indexes of edible arguments (_x_ axis)."""
+
+        self._broken_arg = None
+        """(prev_arg, start_idx, end_idx) of argument changed by last edit."""
+
+        self._shadow_command = None
+        """`GapBuffer` with command as it will be returned."""
 
-        self._shadow_command = ''
+        self._word_starts = []
+        """Sorted indexes of words in `_shadow_command`."""
+
+        self._pending = set()
+        """Commands of `%c` placeholders waiting for `resolver`."""
 
         self._prev_ch = ''
         """Previous character. Used for navigation hacks."""
@@ -120,17 +135,19 @@ class Command(textpad.Textbox):
         """Relative _x_ offset."""
 
         if 'nix_edit' in self._item:
-            self._shadow_command = self._format_command(
+            self._shadow_command = gapbuffer.GapBuffer(self._format_command(
                 self._item['nix_edit']['mask'],
                 self._item['nix_edit']['args']
-            )
+            ))
         else:
-            self._shadow_command = self._item['command']
+            self._shadow_command = gapbuffer.GapBuffer(self._item['command'])
+        self._index_words()
 
-        self._print_command(self._shadow_command)
+        self._print_command(self._shadow_command.text())
 
         textpad.Textbox.__init__(self, *args, **kwargs)
 
+    @tracing.traced()
     def do_command(self, ch):
         """Extend `Textbox` `do_command` method."""
 
@@ -152,7 +169,6 @@ class Command(textpad.Textbox):
                 elif ch is bindings.KEY_F:
                     _s = self._next_word(cx)
                     self._input_field.move(0, _s)
-                self._adjust_index_tab()
                 return self._super_return(1, 0)
             #else: Treat the rest as _prev_ch was not ESC key. Ignore or cont?
 
@@ -209,29 +225,22 @@ class Command(textpad.Textbox):
         elif ch in bindings.backspace:
             insert_char = False
             if clear_word:
-                self._shadow_command = (self._shadow_command[:cx - 1] +
-                                        self._shadow_command[_e - 1:])
-                self._adjust_index_tab()
+                # Marked word is gone already, like in the input field.
+                self._replace(cx, _e, '')
                 return self._super_return(1, 0)
-            self._shadow_command = (self._shadow_command[:cx - 1] +
-                                    self._shadow_command[_e:])
+            self._replace(max(cx - 1, 0), _e, '')
             ch = bindings.CTRL_H
         elif ch in bindings.delete:
             insert_char = False
             if clear_word:
-                self._shadow_command = (self._shadow_command[:cx - 1] +
-                                        self._shadow_command[_e - 1:])
-                self._adjust_index_tab()
+                self._replace(cx, _e, '')
                 return self._super_return(1, 0)
-            self._shadow_command = (self._shadow_command[:cx] +
-                                    self._shadow_command[_e + 1:])
+            self._replace(cx, _e + 1, '')
             ch = bindings.CTRL_D
         elif ch in bindings.yank:
-            self._shadow_command = (self._shadow_command[:cx] +
-                                    str(self._yank) +
-                                    self._shadow_command[_e:])
+            self._replace(cx, _e, str(self._yank))
+            self._fit(len(self._shadow_command))
             self._put_chars(str(self._yank))
-            self._adjust_index_tab()
             return self._super_return(1, 0)
         else:
             try:
@@ -243,25 +252,26 @@ class Command(textpad.Textbox):
             # We are lost. Read the command from _input_field.
             ret_val = textpad.Textbox.do_command(self, ch)
             cy, cx = self._input_field.getyx()
-            self._shadow_command = self._input_field.instr(0, 0)
+            self._set_command(self._input_field.instr(0, 0))
             self._input_field.move(0, cx)
             return self._super_return(ret_val, 0)
 
         if insert_char:
             try:
-                self._shadow_command = (self._shadow_command[:cx] +
-                                        character +
-                                        self._shadow_command[_e:])
+                self._replace(cx, _e, character)
             except UnicodeDecodeError:
                 return self._super_return(1, 0)
+            self._fit(len(self._shadow_command))
 
         ret_val = textpad.Textbox.do_command(self, ch)
-        self._adjust_index_tab()
 
         return self._super_return(ret_val, 0)
 
+    @tracing.traced()
     def edit(self, validate=None):
         "Edit in the widget window and collect the results."
+        # Placeholders are not replaced under user's hands.
+        self._pending.clear()
         while 1:
             ch = self.win.getch()
             if validate:
@@ -289,57 +299,117 @@ class Command(textpad.Textbox):
         return self.gather()
 
     def get_command(self):
-        return self._shadow_command
+        return self._shadow_command.text()
+
+    def get_item(self):
+        """Return item command was created from."""
+        return self._item
 
     def get_input_field(self):
         """Return input field. Used to control cursor."""
         return self._input_field
 
+    def move(self, line_number):
+        """Show command in another row of main terminal window."""
+        if line_number == self._line_number:
+            return
+        self._line_number = line_number
+        self._print_command(self._shadow_command.text())
+
     def print_description(self):
         """Print command description in main terminal window."""
         stdscr.move(2, 1)
         stdscr.clrtoeol()
         stdscr.addstr(2, 2, self._item['description'])
-        stdscr.refresh()
 
-    def _adjust_index_tab(self):
+    def resolve(self, command, output):
+        """
+        Replace placeholder of `%c` `command` with its `output`. Failed
+        command (`resolver.FAILED`) is left as ``$(command)``, it is no
+        longer waited for.
+
+        Return True if command was printed again.
         """
-        Recalculate new <TAB> indexes for edible arguments.
+        if command not in self._pending:
+            return False
+
+        self._pending.discard(command)
+        self._tab_value = {}
+        self._index_tab = []
+        self._shadow_command = gapbuffer.GapBuffer(self._format_command(
+            self._item['nix_edit']['mask'],
+            self._item['nix_edit']['args']
+        ))
+        self._index_words()
+        self._input_field.erase()
+        self._print_command(self._shadow_command.text())
+        return True
+
+    @tracing.traced()
+    def _adjust_index_tab(self, start, removed, inserted):
+        """
+        Shift <TAB> indexes of edible arguments after an edit.
+
+        Edit at `start` replaced `removed` characters with `inserted`
+        ones. Only arguments from the one around `start` on are visited.
+        Argument changed by the edit takes its new value and is kept in
+        `_broken_arg`, see `_detect_broken_args`.
 
         Updates following structures:
 
-        - `_tab_args`
         - `_tab_value`
         - `_index_tab`
         """
-        # TODO: Create new tab value for new arguments.
-        #is_changed, prev_arg, start_idx, end_idx = _detect_broken_args()
-        self._index_tab = []
-        for key, value in self._tab_args.iteritems():
-            kw = r'\b' + re.escape(key)
-            self._tab_args[key] = [m.start() for m in re.finditer(
-                                   kw, self._shadow_command)]
-
-            for pos in self._tab_args[key]:
-                self._tab_value[pos] = key
-
-            # Compare previous and current tab indexes for a current argument.
-            # This seems buggy and probably is.
-            #self.prev_tab_args[key]
-
-            self._index_tab = sorted(list(set(
-                self._index_tab + self._tab_args[key])))
-
-    def _calculate_new_index_tab(self, prev, curr):
-        """Difference between previous and current command."""
-        # Difference between two strings in python [1]
-        # [1]: http://stackoverflow.com/questions/1209800/difference-between-two-strings-in-python-php
-        diff = difflib.SequenceMatcher(
-            a=prev,
-            b=curr
-        )
-        for i, block in enumerate(diff.get_matching_blocks()):
-            nstr = "match at a[%d] and b[%d] of length %d" % block
+        end = start + removed
+        delta = inserted - removed
+        self._broken_arg = None
+
+        typed = self._shadow_command[start:start + inserted]
+        # Typing a word right after an argument extends it.
+        extends = not removed and typed.split() == [typed]
+
+        # Only the argument before `start` may reach into the edit.
+        n = max(bisect_left(self._index_tab, start) - 1, 0)
+        stops = self._index_tab[n:]
+        del self._index_tab[n:]
+
+        for pos in stops:
+            word = self._tab_value.pop(pos)
+            pos_end = pos + len(word)
+            if end <= pos:
+                # Edit before argument.
+                pos += delta
+            elif start < pos_end or (extends and start == pos_end):
+                # Edit inside argument.
+                self._broken_arg = (word, pos, pos_end)
+                pos, pos_end = min(pos, start), max(pos_end, end) + delta
+                word = self._shadow_command[pos:pos_end]
+
+            if word and (not self._index_tab or pos > self._index_tab[-1]):
+                self._index_tab.append(pos)
+                self._tab_value[pos] = word
+
+    def _adjust_word_starts(self, start, removed, inserted):
+        """
+        Update `_word_starts` after an edit, see `_adjust_index_tab`.
+
+        Only words touching the edit are searched for again, indexes of
+        the following ones are shifted.
+        """
+        text = self._shadow_command
+        lo = start
+        while lo > 0 and _WORD.match(text[lo - 1]):
+            lo -= 1
+        hi = start + inserted
+        while hi < len(text) and _WORD.match(text[hi]):
+            hi += 1
+
+        delta = inserted - removed
+        i = bisect_left(self._word_starts, lo)
+        j = bisect_left(self._word_starts, hi - delta)
+        found = [lo + m.start() for m in _WORD.finditer(text[lo:hi])]
+        self._word_starts[i:] = found + [pos + delta for pos in
+                                         self._word_starts[j:]]
 
     def _clear_input_field(self):
         """Clear input field."""
@@ -347,17 +417,25 @@ class Command(textpad.Textbox):
         self._input_field.clrtoeol()
 
     def _delete_chars(self, count, move_cursor=-1):
-        """Removes n characters from a string."""
-        ret_val = 1
+        """Removes n characters from input field, repainted once."""
         if move_cursor > -1:
             self._input_field.move(0, move_cursor)
-        for i in range(count):
-            ret_val = textpad.Textbox.do_command(self, bindings.CTRL_D)
-        return ret_val
+        cy, cx = self._input_field.getyx()
+        if count < 1:
+            return 1
+
+        tail = ''
+        if cx + count < self._input_field.getmaxyx()[1]:
+            tail = self._input_field.instr(0, cx + count).rstrip()
+        self._input_field.move(0, cx)
+        self._input_field.clrtoeol()
+        self._input_field.addstr(0, cx, tail)
+        self._input_field.move(0, cx)
+        return 1
 
     def _detect_broken_args(self):
         """
-        Return tuple: (is_changed, prev_arg, start_idx, end_idx).
+        Return tuple: (is_changed, prev_arg, start_idx, end_idx) of last edit.
 
         Return values:
 
@@ -368,60 +446,9 @@ class Command(textpad.Textbox):
 
         When there is no match, (False, '', -1, -1) is return value.
         """
-        # Check, if any of the tabbable arguments is being changed.
-        # Find nearest index_tab
-        c_lo = -1
-        c_hi = -1
-        p_lo = -1
-        p_hi = -1
-        n_lo = -1
-        n_hi = -1
-
-        is_changed = False
-        prev_arg = ''
-        start_idx = -1
-        end_idx = -1
-
-        cy, cx = self._input_field.getyx()
-
-        idx, c_lo = self._find_next_field(cx, self._index_tab)
-        if c_lo > -1:
-            # Get tabbable index previous, current and next position.
-            c_hi = c_lo + len(self._tab_value[c_lo])
-
-            if idx >= 0 and len(self._index_tab) > 0:
-                # mylist[-1] is ok with python.
-                p_lo = self._index_tab[idx - 1]
-                p_hi = p_lo + len(self._tab_value[p_lo])
-
-            if (idx + 1) == len(self._index_tab):
-                # This case covers cyclic-ism.
-                n_lo = self._index_tab[0]
-                n_hi = n_lo + len(self._tab_value[n_lo])
-            elif (idx + 1) < len(self._index_tab):
-                n_lo = self._index_tab[idx + 1]
-                n_hi = n_lo + len(self._tab_value[n_lo])
-
-            # Find if changed occurred on tabbable word.
-            if p_lo <= cx <= p_hi:
-                is_changed = True
-                prev_arg = self._tab_value[p_lo]
-                start_idx = p_lo
-                end_idx = p_hi
-            if c_lo <= cx <= c_hi:
-                is_changed = True
-                prev_arg = self._tab_value[c_lo]
-                start_idx = c_lo
-                end_idx = c_hi
-            if n_lo <= cx <= n_hi:
-                is_changed = True
-                prev_arg = self._tab_value[n_lo]
-                start_idx = n_lo
-                end_idx = n_hi
-
-            # Figure if word is in tab_args
-            # Figure out changes of that word.
-            # Create new tabbable argument.
+        if self._broken_arg is None:
+            return (False, '', -1, -1)
+        return (True,) + self._broken_arg
 
     def _edit(self, cx, ch):
         """Puts removed characters before / after cursor in yank."""
@@ -430,18 +457,16 @@ class Command(textpad.Textbox):
 
         if ch is bindings.CTRL_K:
             self._yank = self._shadow_command[cx:]
-            self._shadow_command = self._shadow_command[:cx]
+            self._replace(cx, len(self._shadow_command), '')
         elif ch is bindings.CTRL_U:
             _s = 0
             self._yank = self._shadow_command[:cx]
-            self._shadow_command = self._shadow_command[cx:]
+            self._replace(0, cx, '')
         elif ch is bindings.CTRL_W:
             _s = self._prev_word(cx)
             self._yank = self._shadow_command[_s:cx]
-            self._shadow_command = (self._shadow_command[:_s] +
-                self._shadow_command[cx:])
+            self._replace(_s, cx, '')
 
-        self._adjust_index_tab()
         return self._delete_chars(len(self._yank), _s)
 
     def _find_next_field(self, cx, tab_field):
@@ -462,11 +487,20 @@ class Command(textpad.Textbox):
                 return (n, i)
         return (len(tab_field) - 1, tab_field[-1])
 
+    def _fit(self, length):
+        """Grow input field to hold `length` characters and the cursor."""
+        width = self._input_field.getmaxyx()[1]
+        if width <= length:
+            # Double, so typing at the end does not resize every time.
+            self._input_field.resize(1, max(length + 1, 2 * width))
+
+    @tracing.traced()
     def _format_command(self, command, args):
         """
         Make and return formatted command as string.
 
-        This is run on initialization.
+        This is run on initialization. Output of `%c` commands not
+        resolved yet or failed is shown as ``$(command)``, see `resolve`.
 
         Parameters:
 
@@ -478,32 +512,32 @@ class Command(textpad.Textbox):
         tmp_len = 0
         j = 0
         for i, holder in enumerate(holders):
-            if holder == "%s":
-                holder = args[j]
-                holders[i] = holder
-
-                if holder not in self._tab_args:
-                    self._tab_args[holder] = []
-                j += 1
-            elif holder == "%c":
-                holder = subprocess.Popen(
-                    args[j],
-                    stdout=subprocess.PIPE,
-                    shell=True
-                ).stdout.read().strip()
+            if holder in ("%s", "%c"):
+                if holder == "%s":
+                    holder = args[j]
+                else:
+                    holder = resolver.get(args[j])
+                    if holder is None:
+                        self._pending.add(args[j])
+                    if holder is None or holder is resolver.FAILED:
+                        # Shell runs it if command is chosen.
+                        holder = '$(%s)' % args[j]
                 holders[i] = holder
 
-                if holder not in self._tab_args:
-                    self._tab_args[holder] = []
+                if holder:
+                    # Create index_tab
+                    self._index_tab.append(tmp_len)
+                    self._tab_value[tmp_len] = holder
                 j += 1
             tmp_len += len(holder)
 
-        self._shadow_command = ''.join(holders)
-        # Create index_tab
-        self._adjust_index_tab()
-
         return ''.join(holders)
 
+    def _index_words(self):
+        """Find all words of `_shadow_command`."""
+        self._word_starts = [m.start() for m in
+                             _WORD.finditer(self._shadow_command.text())]
+
     def _mark_word(self, cx, selected_word):
         """Invert colors on marked word."""
         # Highlighting and selecting text with python curses [2]
@@ -535,35 +569,46 @@ class Command(textpad.Textbox):
         pass
 
     def _next_word(self, cx):
-        """Return starting index of next word."""
-        p = re.compile(r'\w+\b')
-        _s = [m.start() for m in p.finditer(self._shadow_command, cx)]
-        try:
-            _s = _s[1]
-        except IndexError:
-            _s = len(self._shadow_command)
-        return _s
+        """Return starting index of the word after the one at `cx`."""
+        n = bisect_right(self._word_starts, cx)
+        if cx >= len(self._shadow_command) or not _WORD.match(
+                self._shadow_command[cx]):
+            # Not in a word, the next one is skipped.
+            n += 1
+        if n < len(self._word_starts):
+            return self._word_starts[n]
+        return len(self._shadow_command)
 
     def _prev_word(self, cx):
         """Return starting index of previous word."""
-        p = re.compile(r'\w+\b')
-        _s = [m.start() for m in p.finditer(self._shadow_command, 0, cx)]
-        try:
-            _s = _s[-1]
-        except IndexError:
-            _s = 0
-        return _s
+        n = bisect_left(self._word_starts, cx)
+        if n > 0:
+            return self._word_starts[n - 1]
+        return 0
 
     def _print_command(self, command):
-        """Print command in the commands list in main terminal window."""
+        """
+        Print command in the commands list in main terminal window.
+
+        Output is only staged, ``curses.doupdate()`` shows it.
+        """
+        self._fit(len(command))
         self._input_field.addstr(0, 0, command)
-        self._input_field.refresh(0, 0, self._line_number,
+        self._input_field.noutrefresh(0, 0, self._line_number,
             self._y_offset, self._line_number, self._xmax)
 
     def _put_chars(self, yank):
-        """Inserts n characters in a string."""
-        for chy in yank:
-            textpad.Textbox.do_command(self, chy)
+        """Inserts characters at cursor in input field, repainted once."""
+        cy, cx = self._input_field.getyx()
+        # Characters shifted past the edge are lost, see `_fit`.
+        self._input_field.insstr(yank)
+        self._input_field.move(0, cx + len(yank))
+
+    def _replace(self, start, end, text):
+        """Replace command characters from `start` to `end` with `text`."""
+        self._shadow_command.replace(start, end, text)
+        self._adjust_index_tab(start, end - start, len(text))
+        self._adjust_word_starts(start, end - start, len(text))
 
     def _reformat_command(self):
         """Reformats current state of a command to match edible state."""
@@ -571,6 +616,20 @@ class Command(textpad.Textbox):
         #re.split(r'''("(?:[^\\"]+|\\.)*")|('(?:[^\\']+|\\.)*')''', nstr)
         pass
 
+    def _set_command(self, command):
+        """Replace whole command, arguments follow the changed part."""
+        old = self._shadow_command.text()
+        limit = min(len(old), len(command))
+        start = 0
+        while start < limit and old[start] == command[start]:
+            start += 1
+        end = 0
+        while (end < limit - start and
+                old[len(old) - end - 1] == command[len(command) - end - 1]):
+            end += 1
+        self._replace(start, len(old) - end,
+                      command[start:len(command) - end])
+
     def _super_return(self, ret_val, ch):
         """Only exit point from the graph."""
         self._prev_ch = ch
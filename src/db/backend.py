@@ -0,0 +1,83 @@
+"""
+command base backends
+
+A backend is a module keeping command base and answering queries. Each
+backend loads its command base when imported and provides:
+
+- ``refresh()``: reload command base if it changed, return True if so.
+- ``get_commands(tags, prefix=False, approximate=False, limit=None,
+  offset=0)``: return `limit` best items tagged with all `tags`, skipping
+  `offset` best ones.
+- ``cursor(tags, prefix=False, approximate=False)``: return cursor of
+  items `get_commands` would return.
+- ``count(tags, prefix=False, approximate=False)``: return number of
+  items `get_commands` would return without limit.
+- ``get_commands_many(queries, prefix=False, approximate=False,
+  limit=None)``: return list of `get_commands` results of tag lists.
+- ``iterate()``: yield all items in command base order.
+- ``Search``: class, ``Search().get_commands(query, limit=None,
+  offset=0)`` returns items of search as you type `query`,
+  ``Search().cursor(query)`` returns their cursor.
+- ``generation``: incremented whenever command base is reloaded.
+
+Items are dictionaries with ``command``, ``description``, ``tag`` and
+optional ``nix_edit``, like items of json files.
+
+Cursor creates items only when they are fetched, so callers showing a
+page of results do not pay for the rest:
+
+- ``count()``: return number of items.
+- ``fetch(limit=None, offset=0)``: return list of `limit` items after
+  `offset`.
+- ``approximate``: True if items approximately match query.
+- Iterating cursor yields all items, fetched a page at a time.
+
+Backends are listed in `BACKENDS`, `get` imports the chosen one.
+`connect` prefers resident server (`remote`), which provides ``Search``,
+``get_commands``, ``get_commands_many``, ``cursor`` and ``count`` only.
+"""
+
+import os
+
+BACKENDS = {
+    'json': 'data_json',
+    'sqlite': 'data_sqlite',
+}
+"""Key is backend name, value is its module."""
+
+BACKEND = os.environ.get('SHEARCH_BACKEND') or 'json'
+"""Name of backend used by default."""
+
+def connect():
+    """
+    Return `remote` if resident server runs, otherwise `get` backend.
+
+    Starts server for the next time when ``SHEARCH_SERVER`` is set.
+    """
+    remote = _import('remote')
+    if remote.available():
+        # Resident server has command base loaded already.
+        return remote
+    if os.environ.get('SHEARCH_SERVER'):
+        remote.start()
+    return get()
+
+def get(name=None):
+    """
+    Return backend module `name` (default `BACKEND`).
+
+    Raises `ValueError` for unknown backend.
+    """
+    name = name or BACKEND
+    if name not in BACKENDS:
+        raise ValueError('unknown backend: %s' % name)
+
+    return _import(BACKENDS[name])
+
+def _import(module):
+    """Return `module` of this package."""
+    package = __name__.rpartition('.')[0]
+    if package:
+        return __import__('%s.%s' % (package, module), fromlist=[module])
+    # Imported as top level module (tests).
+    return __import__(module)
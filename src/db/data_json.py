@@ -2,49 +2,472 @@
 json command parser module
 
 This demonstrates simple command base creation using data from example.json.
+
+Json files are compiled into `INDEX_FILE` (see `index` module). Index is
+rebuilt only when any json file is added, removed or changed (mtime, size)
+and is memory mapped otherwise.
+
+Big command bases split into many json files are compiled using several
+processes, see `compile_files`.
+
+This is the default backend, see `backend`.
 """
 
-import json
+from bisect import bisect_left
+import heapq
 import os
+import threading
+
+try:
+    from . import fuzzy
+    from . import index
+    from . import jsonstream
+    from . import lru
+    from . import usage
+except (ImportError, ValueError):
+    # Imported as top level module (tests).
+    import fuzzy
+    import index
+    import jsonstream
+    import lru
+    import usage
+
+DB_DIR = os.path.dirname(os.path.abspath(__file__))
+"""Directory with json files."""
+
+INDEX_FILE = os.path.join(DB_DIR, 'catalog.idx')
+"""Compiled command base."""
+
+CACHE_KEYS = 200000
+"""Command keys kept in `cache`."""
+
+LOAD_WORKERS = 8
+"""Maximum number of processes parsing json files, see `compile_files`."""
+
+PARALLEL_SIZE = 4 * 1024 * 1024
+"""Smaller command base (bytes of json) is parsed in one process."""
+
+PAGE_SIZE = 100
+"""Items fetched at once when `Cursor` is iterated."""
+
+def json_files():
+    """Return sorted list of command base files in `DB_DIR`."""
+    return jsonstream.files(DB_DIR)
+
+def load():
+    """Return `index.Index` of json files, compile it when outdated."""
+    json_file_names = json_files()
+    sig = index.signature(json_file_names)
+
+    try:
+        catalog = index.Index.open(INDEX_FILE)
+        if catalog.signature() == sig:
+            return catalog
+    except (EnvironmentError, ValueError):
+        # Missing or broken index.
+        pass
+
+    chunks = compile_files(json_file_names, sig, _workers(sig))
+
+    try:
+        index.write(INDEX_FILE, chunks)
+        return index.Index.open(INDEX_FILE)
+    except EnvironmentError:
+        # Read-only installation. Keep compiled index in memory.
+        return index.Index(b''.join(chunks))
+
+def compile_files(json_file_names, sig, workers=1):
+    """
+    Return compiled index of json files with signature `sig`, see
+    `index.Packer.chunks`. Items are compiled as they are read.
+
+    With more than one of `workers`, files are parsed and packed in that
+    many processes (see `index.pack_file`) and only merged here in file
+    order. Result is the same either way.
+    """
+    pool = None
+    if workers > 1:
+        try:
+            pool = _pool(workers)
+        except (EnvironmentError, ImportError):
+            # Processes are not available (sandbox, no /dev/shm).
+            pass
+
+    packer = index.Packer()
+    if pool is None:
+        for json_file in json_file_names:
+            for item in jsonstream.items(json_file):
+                packer.add(item)
+        return packer.chunks(sig)
+
+    try:
+        for part in pool.imap(index.pack_file, json_file_names):
+            packer.extend(part)
+    finally:
+        pool.terminate()
+    return packer.chunks(sig)
+
+def _pool(workers):
+    """
+    Return `multiprocessing.Pool` of `workers` processes or None if they
+    cannot be started safely.
+
+    Processes are forked only while no other threads run. Interactive
+    search loads command base in background thread, forked copy of locks
+    of other threads (curses, resolver) could be held forever, so workers
+    are started afresh then. Python 2 can only fork.
+    """
+    import multiprocessing
+
+    if not hasattr(multiprocessing, 'get_context'):
+        if threading.active_count() > 1:
+            return None
+        return multiprocessing.Pool(workers)
+    if threading.active_count() > 1:
+        return multiprocessing.get_context('spawn').Pool(workers)
+    return multiprocessing.get_context('fork').Pool(workers)
+
+def _workers(sig):
+    """Return number of processes parsing json files of signature `sig`."""
+    size = sum(entry[2] for entry in sig)
+    if os.name != 'posix' or len(sig) < 2 or size < PARALLEL_SIZE:
+        return 1
+    try:
+        import multiprocessing
+        cpus = multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
+    return min(LOAD_WORKERS, cpus, len(sig))
+
+catalog = load()
+"""Compiled command base."""
+
+db = index.Postings(catalog)
+"""Key is tag, value is sorted command keys."""
+
+command = index.Items(catalog)
+"""Index is command key, value is `index.Item` view."""
+
+generation = 0
+"""Incremented whenever command base is reloaded."""
+
+cache = lru.LRU(CACHE_KEYS)
+"""
+Sorted keys of recent queries, key is `cache_key` of query. Every query
+narrowing cached one starts from it.
+"""
+
+class Cursor(object):
+
+    """
+    Items of sorted `keys` ranked by `rank`, or as they are when they
+    are `approximate` matches. Items are created only for fetched rows
+    and only as many keys as fetched are ranked.
+    """
+
+    def __init__(self, keys, approximate=False):
+        self._keys = keys
+        self._ranked = keys if approximate or not frecency.get() else []
+        """Keys in order of items, their prefix when not all are ranked."""
+
+        self.approximate = approximate
+        """True if items approximately match query."""
+
+    def __iter__(self):
+        offset = 0
+        while offset < len(self._keys):
+            for item in self.fetch(PAGE_SIZE, offset):
+                yield item
+            offset += PAGE_SIZE
+
+    def count(self):
+        """Return number of items."""
+        return len(self._keys)
+
+    def fetch(self, limit=None, offset=0):
+        """Return list of `limit` (all if None) items after `offset`."""
+        end = len(self._keys)
+        if limit is not None:
+            end = min(offset + limit, end)
+        if len(self._ranked) < end:
+            # Rank ahead, next page is usually fetched too.
+            self._ranked = rank(self._keys, None if limit is None else
+                                max(end, 2 * len(self._ranked)))
+        return [command[key] for key in self._ranked[offset:end]]
+
+class Search(object):
+
+    """
+    Search as you type.
+
+    Query is a string of tags separated by whitespace. The last tag is
+    matched as prefix unless query ends with whitespace. Results of
+    previous queries are kept, so appending characters narrows previous
+    result and deleting them returns cached result.
 
-db = {}
-"""Key is tag, value is hash command."""
+    When nothing matches, commands approximately matching tags are
+    returned, best match first (see `fuzzy`).
+    """
 
-command = {}
-"""Key is hash command, value is item."""
+    def __init__(self):
+        self._generation = generation
+        self._results = [('', None)]
+        """Stack of (query, keys). Keys are None for empty query."""
 
-uberset = set()
-"""# Array of all keys (to be used with sets)."""
+        self._fuzzy = ('', [])
+        """Query and keys of last approximate search."""
 
-for json_file_name in os.listdir(os.path.dirname(__file__)):
-    if json_file_name.endswith('.json'):
-        json_file = os.path.join(os.path.dirname(__file__), json_file_name)
-        json_data = open(json_file)
-        data = json.load(json_data)
+        self.approximate = False
+        """True if last result is approximate."""
 
-        for item in data['item']:
-            key = hash(item['command'])
-            command[key] = item
-            uberset.add(key)
+    def cursor(self, query):
+        """Return `Cursor` of items matching `query`."""
+        keys = self.get_keys(query)
+        return Cursor(keys, self.approximate)
 
-            tags = item['tag']
-            for tag in tags:
-                if tag not in db:
-                    db[tag] = []
-                db[tag].append(key)
+    def get_commands(self, query, limit=None, offset=0):
+        """Return `limit` best items matching `query` after `offset`."""
+        return self.cursor(query).fetch(limit, offset)
 
-def get_commands(tags):
+    def get_keys(self, query):
+        """Return sorted keys of commands matching `query`."""
+        if self._generation != generation:
+            self.__init__()
+
+        while not query.startswith(self._results[-1][0]):
+            self._results.pop()
+        prev_query, keys = self._results[-1]
+        self.approximate = False
+        if prev_query == query:
+            return keys or self._get_fuzzy_keys(query)
+
+        # Only tags after previous complete tags add new restrictions.
+        tags = query.split()
+        start = len(prev_query.split())
+        if prev_query and not prev_query[-1].isspace():
+            start -= 1
+        is_prefix = not query[-1].isspace()
+
+        for n in range(start, len(tags)):
+            prefix = is_prefix and n == len(tags) - 1
+            key = cache_key(tags[:n + 1], prefix)
+            cached = cache.get(key)
+            if cached is not None:
+                keys = cached
+                continue
+
+            if keys is None:
+                keys = get_keys([tags[n]], prefix)
+            else:
+                keys = narrow(keys, tags[n], prefix)
+                cache.put(key, keys, len(keys) + 1)
+
+        self._results.append((query, keys))
+        return keys or self._get_fuzzy_keys(query)
+
+    def _get_fuzzy_keys(self, query):
+        if self._fuzzy[0] != query:
+            self._fuzzy = (query, get_keys(query.split(), approximate=True))
+        self.approximate = bool(self._fuzzy[1])
+        return self._fuzzy[1]
+
+def refresh():
+    """Reload command base if json files changed. Return True on reload."""
+    global catalog, db, command, generation
+
+    if catalog.signature() == index.signature(json_files()):
+        return False
+
+    catalog = load()
+    db = index.Postings(catalog)
+    command = index.Items(catalog)
+    generation += 1
+    # Keys of old command base.
+    cache.clear()
+    return True
+
+frecency = usage.Scores()
+"""Usage scores of commands."""
+
+def cache_key(tags, prefix=False, approximate=False):
+    """Return key of query in `cache`, same for any order of tags."""
+    if approximate:
+        # Approximate matches are ordered, order of tags may matter.
+        return (None, tuple(tags))
+    if prefix and tags:
+        return (frozenset(tags[:-1]), tags[-1])
+    return (frozenset(tags), None)
+
+def count(tags, prefix=False, approximate=False):
+    """Return number of commands `get_commands` returns without limit."""
+    return len(get_keys(tags, prefix, approximate))
+
+def cursor(tags, prefix=False, approximate=False):
+    """Return `Cursor` of items tagged with all `tags`, see `get_keys`."""
+    return Cursor(get_keys(tags, prefix, approximate), approximate)
+
+def get_commands(tags, prefix=False, approximate=False, limit=None, offset=0):
     # tags have to be in an array! Checking is omitted so be careful.
+    return cursor(tags, prefix, approximate).fetch(limit, offset)
+
+def get_commands_many(queries, prefix=False, approximate=False, limit=None):
+    """
+    Return list of `get_commands` results of every tag list of `queries`.
+
+    Queries with fewer tags run first, so queries sharing tags narrow
+    their cached keys.
+    """
+    results = [None] * len(queries)
+    for n in sorted(range(len(queries)), key=lambda n: len(queries[n])):
+        results[n] = get_commands(queries[n], prefix, approximate, limit)
+    return results
+
+def get_keys(tags, prefix=False, approximate=False):
+    """
+    Return sorted list of keys of commands tagged with all `tags`.
+
+    When `prefix` is True, the last tag matches every tag it is a prefix
+    of. When `approximate` is True, tags also match similar tags and
+    words of commands and descriptions and keys are ordered by match
+    quality.
+
+    Results are cached (see `cache`), do not modify them.
+    """
+    key = cache_key(tags, prefix, approximate)
+    result = cache.get(key)
+    if result is None:
+        result = _get_keys(tags, prefix, approximate)
+        cache.put(key, result, len(result) + 1)
+    return result
+
+def rank(keys, limit=None):
+    """
+    Return `limit` (all if None) keys of most frecently used commands.
+
+    Commands with equal score (never used) keep order of `keys`. Only
+    `limit` keys are selected with a heap, the rest is never sorted.
+    """
+    scores = frecency.get()
+    if not scores:
+        return keys[:limit]
+
+    def score(n):
+        return (scores.get(catalog.command_hash(keys[n]), 0), -n)
+
+    if limit is None:
+        order = sorted(range(len(keys)), key=score, reverse=True)
+    else:
+        order = heapq.nlargest(limit, range(len(keys)), key=score)
+    return [keys[n] for n in order]
+
+def iterate():
+    """Yield all items in command base order."""
+    for key in range(len(command)):
+        yield command[key]
+
+def narrow(keys, tag, prefix=False):
+    """
+    Return sorted keys of `keys` tagged with `tag`.
+
+    Parameters:
+
+    - `keys`: sorted keys or None for all keys.
+    - `tag`: tag or prefix of tag when `prefix` is True.
+    """
+    if not prefix:
+        postings = db.get(tag)
+        if postings is None:
+            return []
+        return _narrow(keys, postings)
+
+    first, end = catalog.tag_range(tag)
+    postings = [catalog.tag_postings(n) for n in range(first, end)]
+    if len(postings) < 2:
+        return _narrow(keys, postings[0]) if postings else []
+
+    if keys is None or sum(len(p) for p in postings) < len(keys):
+        # Few matching tags, merge their postings.
+        result = set()
+        for p in postings:
+            result.update(p)
+        result = sorted(result)
+        if keys is not None:
+            _intersect(result, keys)
+        return result
+
+    # Many matching tags, check tags of remaining keys.
     result = []
-    common = uberset
+    for key in keys:
+        for n in catalog.item_tags(key):
+            if first <= n < end:
+                result.append(key)
+                break
+    return result
+
+def _get_keys(tags, prefix, approximate):
+    """
+    Return keys of `get_keys` of uncached query.
+
+    Query one tag shorter is narrowed when it is cached. Otherwise
+    postings are intersected smallest first, candidates are filtered in
+    place and search stops as soon as there are none left.
+    """
+    if approximate:
+        return fuzzy.get_keys(catalog, tags)
+
+    if prefix and tags:
+        result = get_keys(tags[:-1]) if len(tags) > 1 else None
+        if result is None or result:
+            result = narrow(result, tags[-1], True)
+        return result
 
+    tags = set(tags)
+    if len(tags) > 1:
+        for tag in tags:
+            cached = cache.get(cache_key(tags - set([tag])))
+            if cached is not None:
+                return narrow(cached, tag)
+
+    postings = []
     for tag in tags:
+        keys = db.get(tag)
         # Return empty array if tag has no commands.
-        if tag not in db:
-            return result
-        common = common.intersection(set(db[tag]))
+        if keys is None:
+            return []
+        postings.append(keys)
+
+    if not postings:
+        return list(range(len(command)))
 
-    for key in common:
-        result.append(command[key])
+    postings.sort(key=len)
+    result = list(postings[0])
+    for keys in postings[1:]:
+        _intersect(result, keys)
+        if not result:
+            break
 
     return result
+
+def _narrow(keys, postings):
+    """Return sorted keys of `keys` (None for all) found in `postings`."""
+    if keys is None:
+        return list(postings)
+    if len(postings) < len(keys):
+        keys, postings = postings, keys
+    result = list(keys)
+    _intersect(result, postings)
+    return result
+
+def _intersect(result, keys):
+    """Remove keys from sorted `result` that are not in sorted `keys`."""
+    n = 0
+    lo = 0
+    hi = len(keys)
+    for key in result:
+        lo = bisect_left(keys, key, lo, hi)
+        if lo == hi:
+            break
+        if keys[lo] == key:
+            result[n] = key
+            n += 1
+    del result[n:]
@@ -0,0 +1,491 @@
+"""
+sqlite command parser module
+
+Command base is kept in SQLite database `SQLITE_FILE` and queried in
+place, so neither startup time nor memory grows with command base (see
+`backend`). Exact tag search intersects indexed ``item_tag`` table,
+approximate search matches words of tags, commands and descriptions
+with FTS5 full text index (prefix of word, no typos).
+
+Database is built from json files next to this module and rebuilt when
+any of them changes. Set ``SHEARCH_SQLITE`` to use a database built
+elsewhere with `build` and no signature, it is never rebuilt.
+"""
+
+import heapq
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+
+try:
+    from . import index
+    from . import jsonstream
+    from . import usage
+except (ImportError, ValueError):
+    # Imported as top level module (tests).
+    import index
+    import jsonstream
+    import usage
+
+DB_DIR = os.path.dirname(os.path.abspath(__file__))
+"""Directory with json files."""
+
+SQLITE_FILE = os.environ.get('SHEARCH_SQLITE') or os.path.join(
+    DB_DIR, 'catalog.sqlite')
+"""Command base database."""
+
+PAGE_SIZE = 100
+"""Items fetched at once when `Cursor` is iterated."""
+
+VERSION = 2
+"""Bump when database layout or contents change. Old ones are rebuilt."""
+
+_COLUMNS = 'id, command, description, nix_edit, tags'
+
+_FTS = ("CREATE VIRTUAL TABLE item_fts USING "
+        "fts5(tag, command, description, content='')")
+"""Full text index, only rowids (item ids) are stored."""
+
+_SEEN_SIZE = 1 << 24
+"""
+Bits of hashes of commands seen by `build`, only commands hitting a set
+bit are looked up in database to find repeated ones.
+"""
+
+_GLOB = re.compile(r'([*?[])')
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE item (
+    id INTEGER PRIMARY KEY,
+    command TEXT NOT NULL,
+    description TEXT NOT NULL,
+    nix_edit TEXT,
+    tags TEXT NOT NULL,
+    hash INTEGER NOT NULL
+);
+CREATE INDEX item_hash ON item (hash);
+CREATE TABLE tag (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE item_tag (
+    tag INTEGER NOT NULL,
+    item INTEGER NOT NULL,
+    PRIMARY KEY (tag, item)
+) WITHOUT ROWID;
+"""
+
+class Catalog(object):
+
+    """
+    Command base in SQLite database `path`.
+
+    Items are identified by integer ids in order of `build`. Every
+    thread gets its own connection.
+    """
+
+    def __init__(self, path):
+        """
+        Open database `path`.
+
+        Raises `sqlite3.DatabaseError` when `path` is not a command base.
+        """
+        if not os.path.exists(path):
+            raise sqlite3.OperationalError('no database: %s' % path)
+        self.path = path
+        self._local = threading.local()
+        self.fts = self._execute(
+            "SELECT count(*) FROM sqlite_master WHERE name = 'item_fts'"
+        ).fetchone()[0] > 0
+        """True if database has full text index."""
+
+    def count(self, tags, prefix=False, approximate=False):
+        """Return number of items `get_commands` returns without limit."""
+        sql, params = self._match(tags, prefix, approximate)
+        if sql is None:
+            return 0
+        return self._execute('SELECT count(*) FROM (%s)' % sql,
+                             params).fetchone()[0]
+
+    def get_commands(self, tags, prefix=False, approximate=False,
+                     limit=None, scores=None, offset=0):
+        """
+        Return `limit` (all if None) best items tagged with all `tags`,
+        skipping `offset` best ones.
+
+        Items are ordered by `scores` (key is command hash, see `usage`),
+        then by id. Approximate matches are ordered by relevance.
+        """
+        sql, params = self._match(tags, prefix, approximate)
+        if sql is None:
+            return []
+        params.extend([-1 if limit is None else limit, offset])
+
+        if approximate:
+            rows = self._execute(
+                'SELECT %s FROM item JOIN (%s) AS m ON item.id = m.rowid '
+                'ORDER BY m.rank LIMIT ? OFFSET ?' % (_COLUMNS, sql), params)
+            return [_item(row) for row in rows]
+
+        if not scores:
+            rows = self._execute(
+                'SELECT %s FROM item WHERE id IN (%s) ORDER BY id '
+                'LIMIT ? OFFSET ?' % (_COLUMNS, sql), params)
+            return [_item(row) for row in rows]
+
+        # Only ids and hashes of matching items are read, best ones first.
+        rows = self._execute(
+            'SELECT id, hash FROM item WHERE id IN (%s) ORDER BY id' % sql,
+            params[:-2])
+
+        def score(row):
+            return (scores.get(row[1], 0), -row[0])
+
+        if limit is None:
+            best = sorted(rows, key=score, reverse=True)
+        else:
+            best = heapq.nlargest(offset + limit, rows, key=score)
+        return [self.item(row[0]) for row in best[offset:]]
+
+    def item(self, key):
+        """Return item `key`. Raises `KeyError` if there is no such item."""
+        row = self._execute('SELECT %s FROM item WHERE id = ?' % _COLUMNS,
+                            [key]).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return _item(row)
+
+    def iterate(self):
+        """Yield all items in order of ids."""
+        for row in self._execute('SELECT %s FROM item ORDER BY id' %
+                                 _COLUMNS):
+            yield _item(row)
+
+    def signature(self):
+        """Return signature of json files of database, None if it has none."""
+        row = self._execute(
+            "SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def version(self):
+        """Return `VERSION` database was built with."""
+        return self._execute('PRAGMA user_version').fetchone()[0]
+
+    def _execute(self, sql, params=()):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            self._local.connection = connection
+        return connection.execute(sql, params)
+
+    def _match(self, tags, prefix, approximate):
+        """
+        Return (sql, params) of query selecting ids of items matching.
+
+        Sql is None when nothing can match.
+        """
+        if approximate:
+            if not tags or not self.fts:
+                return None, []
+            query = ' AND '.join('"%s"*' % tag.replace('"', '""')
+                                 for tag in tags)
+            return ('SELECT rowid, rank FROM item_fts '
+                    'WHERE item_fts MATCH ?', [query])
+
+        if not tags:
+            return 'SELECT id FROM item', []
+
+        selects = []
+        params = []
+        for n, tag in enumerate(tags):
+            if prefix and n == len(tags) - 1:
+                selects.append('SELECT DISTINCT item FROM item_tag '
+                               'WHERE tag IN '
+                               '(SELECT id FROM tag WHERE name GLOB ?)')
+                params.append(_GLOB.sub(r'[\1]', tag) + '*')
+            else:
+                selects.append('SELECT item FROM item_tag WHERE tag = '
+                               '(SELECT id FROM tag WHERE name = ?)')
+                params.append(tag)
+        return ' INTERSECT '.join(selects), params
+
+def build(path, items, sig=None):
+    """
+    Build database `path` of `items`.
+
+    Database with signature `sig` (see `index.signature`) is rebuilt
+    when json files change. It is written next to `path` and renamed, so
+    readers never see partially written database.
+    """
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.executescript(_SCHEMA)
+        try:
+            connection.execute(_FTS)
+            fts = True
+        except sqlite3.OperationalError:
+            # SQLite without FTS5, no approximate search.
+            fts = False
+
+        tag_ids = {}
+        n_items = 0
+        duplicates = {}
+        """Key is item id, value is tags and descriptions of duplicates."""
+        seen = bytearray(_SEEN_SIZE // 8)
+        """Bit of every command hash modulo `_SEEN_SIZE` added so far."""
+        for item in items:
+            command_hash = index.command_hash(item['command'])
+            bit = command_hash % _SEEN_SIZE
+            row = None
+            if seen[bit >> 3] & 1 << (bit & 7):
+                # Same command as earlier item is not added, its tags
+                # and description are added to that item.
+                row = connection.execute(
+                    'SELECT id FROM item WHERE hash = ? AND command = ?',
+                    (command_hash, item['command'])).fetchone()
+            seen[bit >> 3] |= 1 << (bit & 7)
+            if row is None:
+                key = n_items
+                n_items += 1
+                nix_edit = item.get('nix_edit')
+                connection.execute(
+                    'INSERT INTO item VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, item['command'], item['description'],
+                     json.dumps(nix_edit, sort_keys=True) if nix_edit
+                     else None,
+                     json.dumps(item['tag']), command_hash))
+            else:
+                key = row[0]
+                tags, descriptions = duplicates.setdefault(key, ([], []))
+                tags.extend(item['tag'])
+                descriptions.append(item['description'])
+
+            for tag in item['tag']:
+                if tag not in tag_ids:
+                    tag_ids[tag] = len(tag_ids)
+                    connection.execute('INSERT INTO tag VALUES (?, ?)',
+                                       (tag_ids[tag], tag))
+                connection.execute('INSERT OR IGNORE INTO item_tag '
+                                   'VALUES (?, ?)', (tag_ids[tag], key))
+            if fts and row is None:
+                connection.execute(
+                    'INSERT INTO item_fts (rowid, tag, command, description) '
+                    'VALUES (?, ?, ?, ?)',
+                    (key, ' '.join(item['tag']), item['command'],
+                     item['description']))
+
+        for key, (tags, descriptions) in duplicates.items():
+            _merge(connection, fts, key, tags, descriptions)
+
+        connection.execute('INSERT INTO meta VALUES (?, ?)',
+                           ('signature', json.dumps(sig) if sig else None))
+        connection.execute('PRAGMA user_version = %d' % VERSION)
+        connection.commit()
+    finally:
+        connection.close()
+    os.rename(tmp_path, path)
+
+def json_files():
+    """Return sorted list of command base files in `DB_DIR`."""
+    return jsonstream.files(DB_DIR)
+
+def load(path=None):
+    """Return `Catalog` of `path` (default `SQLITE_FILE`), build if outdated."""
+    path = path or SQLITE_FILE
+    json_file_names = json_files()
+    sig = index.signature(json_file_names)
+
+    catalog = _current(path, sig)
+    if catalog is not None:
+        return catalog
+
+    def items():
+        for json_file in json_file_names:
+            for item in jsonstream.items(json_file):
+                yield item
+
+    try:
+        build(path, items(), sig)
+    except (EnvironmentError, sqlite3.OperationalError):
+        # Read-only installation, database is kept in temporary
+        # directory. Only own one is trusted.
+        path = os.path.join(tempfile.gettempdir(),
+                            'shearch-%d.sqlite' % os.getuid())
+        try:
+            owned = os.stat(path).st_uid == os.getuid()
+        except OSError:
+            owned = False
+        catalog = _current(path, sig) if owned else None
+        if catalog is not None:
+            return catalog
+        build(path, items(), sig)
+    return Catalog(path)
+
+def _current(path, sig):
+    """
+    Return `Catalog` of `path` if it is built of json files of signature
+    `sig` (or of no files, see module docs), otherwise None.
+    """
+    try:
+        catalog = Catalog(path)
+        stored = catalog.signature()
+        if stored is None or (stored == sig and
+                              catalog.version() == VERSION):
+            return catalog
+    except sqlite3.DatabaseError:
+        # Missing or broken database.
+        pass
+    return None
+
+catalog = load()
+"""Command base."""
+
+generation = 0
+"""Incremented whenever command base is reloaded."""
+
+frecency = usage.Scores()
+"""Usage scores of commands."""
+
+class Search(object):
+
+    """
+    Search as you type, see `data_json.Search`.
+
+    Every query is answered by database, nothing is cached.
+    """
+
+    def __init__(self):
+        self.approximate = False
+        """True if last result is approximate."""
+
+    def cursor(self, query):
+        """Return `Cursor` of items matching `query`."""
+        tags = query.split()
+        if not tags:
+            # Empty query matches nothing.
+            tags = None
+        result = Cursor(tags, bool(tags) and not query[-1].isspace())
+        if tags and not result.count():
+            approximate = Cursor(tags, approximate=True)
+            if approximate.count():
+                result = approximate
+        self.approximate = result.approximate
+        return result
+
+    def get_commands(self, query, limit=None, offset=0):
+        """Return `limit` best items matching `query` after `offset`."""
+        return self.cursor(query).fetch(limit, offset)
+
+class Cursor(object):
+
+    """
+    Items of query, see `data_json.Cursor`. Every fetch is answered by
+    database, count is read once. Tags None match nothing.
+    """
+
+    def __init__(self, tags, prefix=False, approximate=False):
+        self._catalog = catalog
+        self._query = (tags, prefix, approximate)
+        self._count = None
+
+        self.approximate = approximate
+        """True if items approximately match query."""
+
+    def __iter__(self):
+        offset = 0
+        while offset < self.count():
+            for item in self.fetch(PAGE_SIZE, offset):
+                yield item
+            offset += PAGE_SIZE
+
+    def count(self):
+        """Return number of items."""
+        if self._count is None:
+            self._count = (0 if self._query[0] is None else
+                           self._catalog.count(*self._query))
+        return self._count
+
+    def fetch(self, limit=None, offset=0):
+        """Return list of `limit` (all if None) items after `offset`."""
+        tags, prefix, approximate = self._query
+        if tags is None:
+            return []
+        return self._catalog.get_commands(tags, prefix, approximate, limit,
+                                          frecency.get(), offset)
+
+def count(tags, prefix=False, approximate=False):
+    """Return number of commands `get_commands` returns without limit."""
+    return catalog.count(tags, prefix, approximate)
+
+def cursor(tags, prefix=False, approximate=False):
+    """Return `Cursor` of items tagged with all `tags`."""
+    return Cursor(tags, prefix, approximate)
+
+def get_commands(tags, prefix=False, approximate=False, limit=None, offset=0):
+    """Return `limit` best items tagged with all `tags`, see `Catalog`."""
+    return catalog.get_commands(tags, prefix, approximate, limit,
+                                frecency.get(), offset)
+
+def get_commands_many(queries, prefix=False, approximate=False, limit=None):
+    """Return list of `get_commands` results of every tag list of `queries`."""
+    return [get_commands(tags, prefix, approximate, limit) for tags in queries]
+
+def iterate():
+    """Yield all items in command base order."""
+    return catalog.iterate()
+
+def refresh():
+    """Rebuild database if json files changed. Return True on rebuild."""
+    global catalog, generation
+
+    sig = catalog.signature()
+    if sig is None or sig == index.signature(json_files()):
+        return False
+
+    catalog = load()
+    generation += 1
+    return True
+
+def _item(row):
+    """Return item of database `row` of `_COLUMNS`."""
+    result = {
+        u'command': row[1],
+        u'description': row[2],
+        u'tag': json.loads(row[4]),
+    }
+    if row[3]:
+        result[u'nix_edit'] = json.loads(row[3])
+    return result
+
+def _merge(connection, fts, key, tags, descriptions):
+    """
+    Add `tags` and `descriptions` of duplicates to item `key` being built
+    on `connection`, to its full text index when `fts`.
+    """
+    command, description, item_tags = connection.execute(
+        'SELECT command, description, tags FROM item WHERE id = ?',
+        (key,)).fetchone()
+    old_tags = json.loads(item_tags)
+    new_tags = list(old_tags)
+    for tag in tags:
+        if tag not in new_tags:
+            new_tags.append(tag)
+    connection.execute('UPDATE item SET tags = ? WHERE id = ?',
+                       (json.dumps(new_tags), key))
+
+    if fts:
+        # Contentless index forgets row given its indexed values.
+        connection.execute(
+            "INSERT INTO item_fts (item_fts, rowid, tag, command, "
+            "description) VALUES ('delete', ?, ?, ?, ?)",
+            (key, ' '.join(old_tags), command, description))
+        connection.execute(
+            'INSERT INTO item_fts (rowid, tag, command, description) '
+            'VALUES (?, ?, ?, ?)',
+            (key, ' '.join(new_tags), command,
+             ' '.join([description] + descriptions)))
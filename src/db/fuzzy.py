@@ -0,0 +1,125 @@
+"""
+approximate command matching module
+
+Finds commands for misspelled tags (``stauts``) and for words that are
+not tags but appear in commands or descriptions (``containers``).
+
+Gram table of compiled index (see `index`) gives candidate terms (tags
+and words) sharing most trigrams (bigrams for short tags) with a tag.
+Only the best `MAX_CANDIDATES` of them are verified with edit distance,
+so command base is never scanned.
+"""
+
+import heapq
+
+try:
+    from . import index
+except (ImportError, ValueError):
+    # Imported as top level module (tests).
+    import index
+
+MAX_CANDIDATES = 32
+"""Number of candidate terms verified with edit distance per tag."""
+
+def distance(a, b, limit):
+    """
+    Return edit distance between `a` and `b` (transpositions included).
+
+    Any distance above `limit` is returned as `limit` + 1.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    prev_prev = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        curr = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            curr[j] = min(prev[j] + 1, curr[j - 1] + 1, prev[j - 1] + cost)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2] and
+                    a[i - 2] == b[j - 1]):
+                curr[j] = min(curr[j], prev_prev[j - 2] + 1)
+        if min(curr) > limit:
+            return limit + 1
+        prev_prev, prev = prev, curr
+    return min(prev[-1], limit + 1)
+
+def max_distance(tag):
+    """Return allowed edit distance for `tag`."""
+    return 1 if len(tag) <= 5 else 2
+
+def get_keys(catalog, tags):
+    """
+    Return keys of commands approximately matching all `tags`.
+
+    Keys are ordered by match quality, exact matches first: each tag
+    costs twice the edit distance of its best matching term and one
+    more if that term is a word rather than a tag.
+    """
+    scores = None
+    """Key is command key, value is cost."""
+
+    for tag in tags:
+        costs = {}
+        for cost, postings in _terms(catalog, tag):
+            for key in postings:
+                if cost < costs.get(key, cost + 1):
+                    costs[key] = cost
+
+        if scores is None:
+            scores = costs
+        else:
+            scores = dict((key, cost + costs[key])
+                          for key, cost in scores.items() if key in costs)
+        if not scores:
+            return []
+
+    if scores is None:
+        return []
+    return sorted(scores, key=lambda key: (scores[key], key))
+
+def similar_terms(catalog, tag):
+    """Return list of (distance, term id) of terms similar to `tag`."""
+    tag = tag.lower()
+    limit = max_distance(tag)
+    size = 2 if len(tag) <= 4 else 3
+    tag_grams = index.grams(tag, size)
+
+    counts = {}
+    """Key is term id, value is number of shared grams."""
+
+    for gram in tag_grams:
+        n = catalog.gram_table.find(gram)
+        if n >= 0:
+            for term in catalog.gram_table.postings(n):
+                counts[term] = counts.get(term, 0) + 1
+
+    # Every edit changes at most `size` grams, transposition one more.
+    least = len(tag_grams) - (size + 1) * limit
+    candidates = heapq.nsmallest(
+        MAX_CANDIDATES,
+        ((-count, term) for term, count in counts.items() if count >= least)
+    )
+
+    result = []
+    for count, term in candidates:
+        d = distance(tag, _term_name(catalog, term), limit)
+        if d <= limit:
+            result.append((d, term))
+    return result
+
+def _term_name(catalog, term):
+    n_tags = len(catalog.tag_table)
+    if term < n_tags:
+        return catalog.tag_table.name(term).lower()
+    return catalog.word_table.name(term - n_tags)
+
+def _terms(catalog, tag):
+    """Yield (cost, postings) of terms similar to `tag`."""
+    n_tags = len(catalog.tag_table)
+    for d, term in similar_terms(catalog, tag):
+        if term < n_tags:
+            yield 2 * d, catalog.tag_table.postings(term)
+        else:
+            yield 2 * d + 1, catalog.word_table.postings(term - n_tags)
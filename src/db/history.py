@@ -0,0 +1,282 @@
+#!/usr/bin/python
+"""
+shell history importer module
+
+Turns shell history into command base items. History is streamed line by
+line, so files with millions of lines are imported in constant memory:
+
+1. `read` yields commands of bash, zsh (extended history too) or fish
+   history file.
+
+2. `Importer` counts commands by their template: values (paths, numbers,
+   quoted strings, option arguments...) are replaced with ``%s``. Values
+   that differ between uses of a template become ``nix_edit`` args, the
+   others stay in the command. Only `MAX_TEMPLATES` most used templates
+   are kept, so counts of rare commands are approximate.
+
+3. `write` stores items as json file in the format `data_json` reads.
+
+Usage: ``python history.py [-f format] [-o output] [history file...]``.
+Items are written to `HISTORY_FILE` by default, so they are compiled
+into command base on the next start.
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import re
+
+DB_DIR = os.path.dirname(os.path.abspath(__file__))
+"""Directory with json files."""
+
+HISTORY_FILE = os.path.join(DB_DIR, 'history.json')
+"""Default output, next to other json files of command base."""
+
+MAX_TAGS = 6
+"""Tags derived from a command."""
+
+MAX_TEMPLATES = 10000
+"""Templates kept while importing and written."""
+
+WRAPPERS = ('builtin', 'command', 'env', 'exec', 'nice', 'nohup', 'sudo',
+            'time')
+"""Commands running the next word as command."""
+
+_ASSIGNMENT = re.compile(r'^\w+=')
+_FISH = re.compile(r'^- cmd: (.*)$')
+_FISH_ESCAPE = re.compile(r'\\([\\n])')
+_OPTION = re.compile(r'^(--?[\w-]+=)(.+)$')
+_QUOTED = re.compile(r'''^(?:"(?:[^"\\]|\\.)*"|'[^']*')$''')
+_TAG = re.compile(r'^-{0,2}([A-Za-z][\w-]{2,})$')
+_TOKEN = re.compile(
+    r'''(?:[^\s'"\\]|\\.|"(?:[^"\\]|\\.)*"|'[^']*')+''')
+_VALUE = re.compile(r'''^(?:\d+|.*[/.:@~'"].*)$''')
+_ZSH = re.compile(r'^: \d+:\d+;(.*)$', re.DOTALL)
+
+class Importer(object):
+
+    """Counts commands by template in bounded memory."""
+
+    def __init__(self, max_templates=MAX_TEMPLATES):
+        self._max_templates = max_templates
+
+        self._templates = {}
+        """
+        Key is template, value is list [count, last use, tags, values of
+        last use, values of first use, list of flags if value varies].
+        """
+
+        self._uses = 0
+
+    def add(self, command):
+        """Count use of `command`. Return False if it was skipped."""
+        tokens = _TOKEN.findall(command)
+        if (not tokens or '\n' in command or
+                _TOKEN.sub('', command).strip()):
+            # Empty, multi line or unbalanced quotes.
+            return False
+
+        self._uses += 1
+        key, values = template(tokens)
+        entry = self._templates.get(key)
+        if entry is None:
+            self._templates[key] = [1, self._uses, tags(tokens), values,
+                                    values, [False] * len(values)]
+            if len(self._templates) > 2 * self._max_templates:
+                self._prune()
+        else:
+            entry[0] += 1
+            entry[1] = self._uses
+            for n, value in enumerate(values):
+                if value != entry[4][n]:
+                    entry[5][n] = True
+            entry[3] = values
+        return True
+
+    def items(self):
+        """Return list of items, most used first."""
+        best = heapq.nlargest(self._max_templates, self._templates.items(),
+                              key=lambda t: (t[1][0], t[1][1]))
+        return [item(key, *entry) for key, entry in best]
+
+    def _prune(self):
+        """Drop least used templates, amortized O(1) per command."""
+        self._templates = dict(heapq.nlargest(
+            self._max_templates, self._templates.items(),
+            key=lambda t: (t[1][0], t[1][1])))
+
+def detect(first_line):
+    """Return history format of file starting with `first_line`."""
+    if _ZSH.match(first_line):
+        return 'zsh'
+    if _FISH.match(first_line):
+        return 'fish'
+    return 'bash'
+
+def item(key, count, last_use, tags, values, first_values, varies):
+    """Return command base item of template `key`, see `Importer`."""
+    pieces = key.split('%s')
+    command = [pieces[0]]
+    mask = [pieces[0]]
+    args = []
+    for n, value in enumerate(values):
+        command.append(value)
+        if varies[n] or '%s' in value or '%c' in value:
+            mask.append('%s')
+            args.append(value)
+        else:
+            mask.append(value)
+        command.append(pieces[n + 1])
+        mask.append(pieces[n + 1])
+
+    result = {
+        'command': ''.join(command),
+        'description': 'From shell history (%d use%s).' % (
+            count, '' if count == 1 else 's'),
+        'tag': tags,
+    }
+    if args:
+        result['nix_edit'] = {'mask': ''.join(mask), 'args': args}
+    return result
+
+def read(path, history_format=None):
+    """
+    Yield commands of history file `path`.
+
+    Format is 'bash', 'zsh' or 'fish', detected when None.
+    """
+    with open(path, 'rb') as f:
+        lines = (_decode(line) for line in f)
+        first = next(lines, None)
+        if first is None:
+            return
+        lines = itertools.chain([first], lines)
+        history_format = history_format or detect(first)
+
+        if history_format == 'fish':
+            for line in lines:
+                m = _FISH.match(line)
+                if m:
+                    yield _FISH_ESCAPE.sub(
+                        lambda m: '\n' if m.group(1) == 'n' else '\\',
+                        m.group(1))
+        elif history_format == 'zsh':
+            command = None
+            for line in lines:
+                if command is None:
+                    m = _ZSH.match(line)
+                    command = m.group(1) if m else line
+                else:
+                    command += '\n' + line
+                if not command.endswith('\\'):
+                    yield command
+                    command = None
+            if command is not None:
+                yield command
+        else:
+            for line in lines:
+                # HISTTIMEFORMAT adds time stamp lines.
+                if not (line.startswith('#') and line[1:].isdigit()):
+                    yield line
+
+def tags(tokens):
+    """Return tags of command `tokens`: program, subcommand and options."""
+    tokens = iter(tokens)
+    for token in tokens:
+        if not _ASSIGNMENT.match(token) and token not in WRAPPERS:
+            break
+    else:
+        return []
+
+    result = [os.path.basename(token).lower() or token]
+    for token in tokens:
+        m = _TAG.match(token)
+        if m and m.group(1).lower() not in result:
+            result.append(m.group(1).lower())
+            if len(result) == MAX_TAGS:
+                break
+    return result
+
+def template(tokens):
+    """
+    Return (template, values) of command `tokens`.
+
+    Values are replaced with ``%s`` in template. Quotes of quoted values
+    stay in template. Program is a value only if it contains ``%``.
+    """
+    pieces = []
+    values = []
+    option = False
+    """True if previous token is an option, possibly with argument."""
+
+    for n, token in enumerate(tokens):
+        m = _OPTION.match(token)
+        if '%' in token and not (m or _QUOTED.match(token)):
+            # Would be taken for a placeholder.
+            pieces.append('%s')
+            values.append(token)
+        elif n == 0:
+            pieces.append(token)
+        elif m:
+            pieces.append(m.group(1) + '%s')
+            values.append(m.group(2))
+        elif _QUOTED.match(token):
+            pieces.append(token[0] + '%s' + token[0])
+            values.append(token[1:-1])
+        elif _VALUE.match(token) or (option and not token.startswith('-')):
+            pieces.append('%s')
+            values.append(token)
+        else:
+            pieces.append(token)
+        option = token.startswith('-') and not m
+    return ' '.join(pieces), values
+
+def write(items, path=None):
+    """Write `items` as json file `path`, replacing it at once."""
+    path = path or HISTORY_FILE
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as out:
+        json.dump({'item': items}, out, indent=4, sort_keys=True)
+    os.rename(tmp_path, path)
+
+def _decode(line):
+    """Return text of history file `line` without line end."""
+    line = line.rstrip(b'\r\n')
+    if b'\x83' in line:
+        # Zsh metafies bytes: 0x83 followed by byte xor 32.
+        data = bytearray(line)
+        out = bytearray()
+        n = 0
+        while n < len(data):
+            if data[n] == 0x83 and n + 1 < len(data):
+                out.append(data[n + 1] ^ 32)
+                n += 2
+            else:
+                out.append(data[n])
+                n += 1
+        line = bytes(out)
+    return line.decode('utf-8', 'replace')
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Import shell history into shearch command base.')
+    parser.add_argument('files', nargs='*', metavar='file',
+                        help='history file (default ~/.bash_history)')
+    parser.add_argument('-f', '--format', choices=('bash', 'zsh', 'fish'),
+                        help='history format (default detected)')
+    parser.add_argument('-o', '--output', default=HISTORY_FILE,
+                        help='json file (default %(default)s)')
+    parser.add_argument('-n', '--limit', type=int, default=MAX_TEMPLATES,
+                        help='maximum number of commands')
+    args = parser.parse_args()
+
+    importer = Importer(args.limit)
+    for path in args.files or [os.path.expanduser('~/.bash_history')]:
+        for command in read(path, args.format):
+            importer.add(command)
+    write(importer.items(), args.output)
+
+if __name__ == '__main__':
+    main()
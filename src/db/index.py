@@ -0,0 +1,771 @@
+"""
+compiled command base module
+
+Parsing every json file on each start gets slow once the command base
+grows, so commands are compiled once into a packed index file. The file
+is opened with mmap and lookups read it in place.
+
+File layout (native byte order, every number is unsigned 32 bit)::
+
+    header      magic, version, section offsets and counts
+    signature   json list of [name, mtime, size] of compiled json files
+    strings     string offsets (count + 1), utf-8 string data
+    items       command, description, nix_edit string id, first tag,
+                tag count, command hash (per item)
+    item tags   tag ids of items
+    tags        string id, first posting, posting count (per tag,
+                sorted by tag), postings are item keys
+    words       same as tags for words of commands and descriptions
+    grams       same as tags for bigrams and trigrams of tags and words,
+                postings are term ids (tag id or tag count + word id)
+    postings    postings of all tables (sorted per entry)
+"""
+
+from array import array
+from bisect import bisect_left
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    # Python 2.
+    from collections import Mapping
+
+try:
+    from . import jsonstream
+except (ImportError, ValueError):
+    # Imported as top level module (tests).
+    import jsonstream
+
+MAGIC = b'SHIX'
+
+VERSION = 6
+"""Bump when file layout changes. Old files are rebuilt."""
+
+NONE = 0xffffffff
+"""String id of missing value (item without nix_edit)."""
+
+_HEADER = struct.Struct('=4s16I')
+"""magic, version, n_items, n_strings, n_tags, n_words, n_grams and
+offsets of signature, signature length, strings, items, item tags, tags,
+words, grams, postings and end."""
+
+_ITEM = struct.Struct('=6I')
+_ENTRY = struct.Struct('=3I')
+
+_FIELDS = (u'command', u'description', u'tag', u'nix_edit')
+"""Keys of `Item`."""
+
+_UINT = 'I' if array('I').itemsize == 4 else 'L'
+"""Array type code of unsigned 32 bit integer."""
+
+_WORD = re.compile(r'\w{3,}', re.UNICODE)
+"""Words of commands and descriptions that get indexed."""
+
+def command_hash(command):
+    """Return 32 bit hash of `command` that stays same across runs."""
+    return zlib.crc32(_encode(command)) & 0xffffffff
+
+def grams(term, size=3):
+    """Return set of `size` long grams of `term`, padded with spaces."""
+    term = u' %s ' % term.lower()
+    return set(term[n:n + size] for n in range(len(term) - size + 1))
+
+def signature(file_names):
+    """Return list of [name, mtime, size] for each of `file_names`."""
+    result = []
+    for file_name in file_names:
+        st = os.stat(file_name)
+        result.append([os.path.basename(file_name), st.st_mtime, st.st_size])
+    return result
+
+def words(text):
+    """Return set of lowercase words of `text` that get indexed."""
+    return set(word for word in _WORD.findall(text.lower())
+               if not word.isdigit())
+
+def flatten(postings):
+    """
+    Return (names, counts, keys) of `postings`: sorted names, number of
+    keys of every name and their keys in one array. Unlike dictionary of
+    arrays it is pickled quickly.
+    """
+    names = sorted(postings)
+    counts = array(_UINT, [len(postings[name]) for name in names])
+    keys = array(_UINT)
+    for name in names:
+        keys.extend(postings[name])
+    return names, counts, keys
+
+def pack(items, sig):
+    """
+    Compile `items` and return index as bytes.
+
+    Parameters:
+
+    - `items`: iterable of items (dictionaries) as found in json files.
+    - `sig`: signature of json files, see `signature`.
+    """
+    packer = Packer()
+    for item in items:
+        packer.add(item)
+    return b''.join(packer.chunks(sig))
+
+def pack_file(json_file):
+    """
+    Return `Packer.part` of items of `json_file`. Worker processes of
+    `data_json` compile files with it, importing this module has no side
+    effects unlike importing `data_json`.
+    """
+    packer = Packer()
+    for item in jsonstream.items(json_file):
+        packer.add(item)
+    return packer.part()
+
+def write(path, chunks):
+    """
+    Write compiled index `chunks` (see `Packer.chunks`) into file `path`.
+
+    File is written next to `path` and renamed, so readers never see
+    partially written index.
+    """
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as out:
+        for chunk in chunks:
+            out.write(chunk)
+    os.rename(tmp_path, path)
+
+class Packer(object):
+
+    """
+    Compiles items one at a time, see `pack`. Only their packed data is
+    kept, so command base does not have to fit in memory as items.
+
+    Item with the same command as an earlier one is not added again, its
+    tags are added to the earlier item and its words find it.
+
+    Parts of command base can be compiled by packers of their own (in
+    other processes) and merged, see `part` and `extend`.
+    """
+
+    def __init__(self):
+        self._strings = []
+        """Utf-8 strings in order of string ids."""
+
+        self._string_id = {}
+        """Key is utf-8 string, value is string id."""
+
+        self._item_data = array(_UINT)
+        """
+        Six numbers per item (see module docs), tags of item are range of
+        `_tag_names`.
+        """
+
+        self._tag_names = []
+        """Tags of all items in order."""
+
+        self._tags = {}
+        """Key and value is tag, items share tag strings."""
+
+        self._postings = ({}, {})
+        """
+        Tag and word postings of items, key is name, value is sorted item
+        keys (array).
+        """
+
+        self._command_keys = {}
+        """Key is string id of command, value is key of its item."""
+
+        self._more_tags = {}
+        """Key is item key, value is list of tags of its duplicates."""
+
+    def __len__(self):
+        return len(self._item_data) // 6
+
+    def add(self, item):
+        """Add `item` (dictionary as found in json files)."""
+        command = self._intern(item['command'])
+        key = self._command_keys.get(command)
+        add_posting = _insert
+        if key is None:
+            nix_edit = NONE
+            if 'nix_edit' in item:
+                nix_edit = self._intern(json.dumps(item['nix_edit'],
+                                                   sort_keys=True))
+            key = self._add_item(command, self._intern(item['description']),
+                                 nix_edit, item['tag'],
+                                 command_hash(item['command']))
+            add_posting = _append
+        else:
+            self._add_tags(key, item['tag'])
+
+        tag_postings, word_postings = self._postings
+        for tag in item['tag']:
+            add_posting(tag_postings, tag, key)
+        for word in words(item['command'] + u' ' + item['description']):
+            add_posting(word_postings, word, key)
+
+    def chunks(self, sig):
+        """
+        Return index of added items as list of bytes, they are not joined
+        to save memory. `sig` is signature of json files.
+        """
+        tag_postings, word_postings = self._postings
+
+        tag_names = sorted(tag_postings, key=_encode)
+        tag_id = dict((tag, n) for n, tag in enumerate(tag_names))
+        word_names = sorted(word_postings, key=_encode)
+
+        gram_postings = {}
+        for term_id, term in enumerate(tag_names + word_names):
+            for gram in grams(term, 2) | grams(term, 3):
+                _append(gram_postings, gram, term_id)
+        gram_names = sorted(gram_postings, key=_encode)
+
+        item_data, item_tag_names = self._item_data, self._tag_names
+        if self._more_tags:
+            item_data, item_tag_names = self._merge_tags()
+        item_tags = array(_UINT, [tag_id[tag] for tag in item_tag_names])
+
+        posting_data = array(_UINT)
+        tables = []
+        for names, entries in ((tag_names, tag_postings),
+                               (word_names, word_postings),
+                               (gram_names, gram_postings)):
+            # Same as _ENTRY per name.
+            table = array(_UINT)
+            for name in names:
+                table.extend((self._intern(name), len(posting_data),
+                              len(entries[name])))
+                posting_data.extend(entries[name])
+            tables.append(_tobytes(table))
+
+        strings = self._strings
+        string_offsets = array(_UINT, [0])
+        for value in strings:
+            string_offsets.append(string_offsets[-1] + len(value))
+
+        # Sections are lists of chunks.
+        sections = [
+            [json.dumps(sig).encode('utf-8')],
+            [_tobytes(string_offsets)] + strings,
+            [_tobytes(item_data)],
+            [_tobytes(item_tags)],
+        ] + [[table] for table in tables] + [
+            [_tobytes(posting_data)],
+        ]
+
+        sizes = [sum(len(chunk) for chunk in section) for section in sections]
+        offsets = []
+        offset = _HEADER.size
+        for size in sizes:
+            # Keep every section 4 byte aligned for casting.
+            offset += -offset % 4
+            offsets.append(offset)
+            offset += size
+
+        header = _HEADER.pack(
+            MAGIC, VERSION, len(self), len(strings), len(tag_names),
+            len(word_names), len(gram_names), offsets[0], sizes[0],
+            *(offsets[1:] + [offset])
+        )
+
+        result = [header]
+        size = len(header)
+        for n, section in enumerate(sections):
+            result.append(b'\0' * (offsets[n] - size))
+            result.extend(section)
+            size = offsets[n] + sizes[n]
+        return result
+
+    def extend(self, part):
+        """
+        Add items of `part` of another packer (see `part`) after added
+        items. Result is the same as if they were added here.
+        """
+        strings, item_data, tag_names, more_tags, part_postings = part
+        string_id = self._string_id
+        start = len(self)
+        duplicates = any(string_id.get(strings[command]) in self._command_keys
+                         for command in item_data[0::6])
+        if duplicates:
+            keys = self._add_items(strings, item_data, tag_names)
+        else:
+            self._add_new_items(strings, item_data, tag_names)
+            keys = range(start, len(self))
+        for n, tags in more_tags.items():
+            self._add_tags(keys[n], tags)
+
+        for postings, (names, counts, values) in zip(self._postings,
+                                                     part_postings):
+            if duplicates:
+                values = array(_UINT, [keys[n] for n in values])
+            elif start:
+                values = array(_UINT, [n + start for n in values])
+            offset = 0
+            for name, count in zip(names, counts):
+                name_keys = values[offset:offset + count]
+                offset += count
+                if duplicates:
+                    # Duplicates got keys of earlier items.
+                    name_keys = array(_UINT, sorted(set(name_keys)))
+                old = postings.get(name)
+                if old is None:
+                    postings[name] = name_keys
+                elif old[-1] < name_keys[0]:
+                    old.extend(name_keys)
+                else:
+                    postings[name] = array(_UINT,
+                                           sorted(set(old).union(name_keys)))
+
+    def part(self):
+        """
+        Return added items as tuple of lists and arrays, which is pickled
+        much faster than packer itself, see `extend`.
+        """
+        return (self._strings, self._item_data, self._tag_names,
+                self._more_tags,
+                [flatten(postings) for postings in self._postings])
+
+    def _add_item(self, command, description, nix_edit, tags, hash_):
+        """
+        Add item of command, description and nix_edit string ids, `tags`
+        and command hash `hash_`. Return its key.
+        """
+        key = len(self)
+        self._command_keys[command] = key
+        tags = [self._tags.setdefault(tag, tag) for tag in tags]
+        self._item_data.extend((command, description, nix_edit,
+                                len(self._tag_names), len(tags), hash_))
+        self._tag_names.extend(tags)
+        return key
+
+    def _add_items(self, strings, item_data, tag_names):
+        """
+        Add items of part (see `extend`) one by one, duplicates of added
+        ones included. Return list of their keys.
+        """
+        keys = []
+        for n in range(0, len(item_data), 6):
+            command, description, nix_edit, first, count, hash_ = \
+                item_data[n:n + 6]
+            tags = tag_names[first:first + count]
+            command = self._intern_utf8(strings[command])
+            key = self._command_keys.get(command)
+            if key is None:
+                if nix_edit != NONE:
+                    nix_edit = self._intern_utf8(strings[nix_edit])
+                key = self._add_item(command,
+                                     self._intern_utf8(strings[description]),
+                                     nix_edit, tags, hash_)
+            else:
+                self._add_tags(key, tags)
+            keys.append(key)
+        return keys
+
+    def _add_new_items(self, strings, item_data, tag_names):
+        """
+        Add items of part (see `extend`) none of which was added, field by
+        field. Strings of part are in order they were first used, they get
+        ids in the same order as if items were added one by one.
+        """
+        string_id = self._string_id
+        new = [value for value in strings if value not in string_id]
+        string_id.update(zip(new, range(len(self._strings),
+                                        len(self._strings) + len(new))))
+        self._strings.extend(new)
+        ids = [string_id[value] for value in strings]
+
+        data = array(_UINT, item_data)
+        for field in (0, 1):
+            data[field::6] = array(_UINT,
+                                   [ids[n] for n in item_data[field::6]])
+        data[2::6] = array(_UINT, [NONE if n == NONE else ids[n]
+                                   for n in item_data[2::6]])
+        first_tag = len(self._tag_names)
+        data[3::6] = array(_UINT, [first_tag + first
+                                   for first in item_data[3::6]])
+        start = len(self)
+        self._command_keys.update(zip(data[0::6],
+                                      range(start, start + len(data) // 6)))
+        self._item_data.extend(data)
+        # Tags of part share strings only with each other, looking up
+        # every tag in _tags would cost more than memory it saves.
+        self._tag_names.extend(tag_names)
+
+    def _add_tags(self, key, tags):
+        """Add `tags` of duplicate of item `key`, see `_more_tags`."""
+        more_tags = self._more_tags.setdefault(key, [])
+        for tag in tags:
+            if tag not in more_tags:
+                more_tags.append(self._tags.setdefault(tag, tag))
+
+    def _intern(self, value):
+        """Return string id of `value`."""
+        return self._intern_utf8(value.encode('utf-8'))
+
+    def _intern_utf8(self, value):
+        """Return string id of utf-8 string `value`."""
+        string_id = self._string_id.get(value)
+        if string_id is None:
+            string_id = self._string_id[value] = len(self._strings)
+            self._strings.append(value)
+        return string_id
+
+    def _merge_tags(self):
+        """
+        Return item data and tags of items with tags of their duplicates
+        appended, see `_more_tags`.
+        """
+        item_data = array(_UINT, self._item_data)
+        tag_names = []
+        for key in range(len(self)):
+            first, count = item_data[6 * key + 3:6 * key + 5]
+            tags = self._tag_names[first:first + count]
+            tags += [tag for tag in self._more_tags.get(key, ())
+                     if tag not in tags]
+            item_data[6 * key + 3:6 * key + 5] = array(
+                _UINT, (len(tag_names), len(tags)))
+            tag_names.extend(tags)
+        return item_data, tag_names
+
+class Index(object):
+
+    """
+    Read-only view of compiled command base.
+
+    Items are identified by dense integer keys in order of compilation.
+    """
+
+    def __init__(self, buf):
+        """
+        Initialize index from `buf` (mmap or bytes).
+
+        Raises `ValueError` when `buf` is not an index of current version.
+        """
+        if len(buf) < _HEADER.size:
+            raise ValueError('Index file is truncated.')
+        header = _HEADER.unpack_from(buf, 0)
+        if header[0] != MAGIC or header[1] != VERSION:
+            raise ValueError('Unknown index file format.')
+        if header[16] != len(buf):
+            raise ValueError('Index file is truncated.')
+
+        self._buf = buf
+        (self._n_items, n_strings, n_tags, n_words, n_grams,
+         self._signature, self._signature_len, strings, self._items,
+         item_tags, tags, words, grams, postings) = header[2:16]
+
+        self._string_offsets = _uints(buf, strings, n_strings + 1)
+        self._strings = strings + 4 * (n_strings + 1)
+        self._item_tags = _uints(buf, item_tags, tags - item_tags)
+        self._postings = _uints(buf, postings, (header[16] - postings) // 4)
+
+        self._tag_names = {}
+        """Key is tag id, value is decoded tag shared by all items."""
+
+        self.tag_table = _Table(self, tags, n_tags)
+        """Tags, postings are item keys."""
+
+        self.word_table = _Table(self, words, n_words)
+        """Words of commands and descriptions, postings are item keys."""
+
+        self.gram_table = _Table(self, grams, n_grams)
+        """Bigrams and trigrams of tags and words, postings are term ids."""
+
+    @classmethod
+    def open(cls, path):
+        """Memory map index file `path`."""
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buf)
+
+    def __len__(self):
+        return self._n_items
+
+    def signature(self):
+        """Return signature of json files index was compiled from."""
+        return json.loads(self._buf[
+            self._signature:self._signature + self._signature_len
+        ].decode('utf-8'))
+
+    def item(self, key):
+        """Return `Item` view of item `key`."""
+        if not 0 <= key < self._n_items:
+            raise KeyError(key)
+        return Item(self, key)
+
+    def item_field(self, key, name):
+        """Return field `name` of item `key`, see `Item`."""
+        command, description, nix_edit, first, count, h = _ITEM.unpack_from(
+            self._buf, self._items + key * _ITEM.size)
+        if name == u'command':
+            return self._string(command)
+        if name == u'description':
+            return self._string(description)
+        if name == u'tag':
+            return [self.tag_name(n)
+                    for n in self._item_tags[first:first + count]]
+        if name == u'nix_edit' and nix_edit != NONE:
+            return json.loads(self._string(nix_edit))
+        raise KeyError(name)
+
+    def has_nix_edit(self, key):
+        """Return True if item `key` has nix_edit."""
+        return _ITEM.unpack_from(
+            self._buf, self._items + key * _ITEM.size)[2] != NONE
+
+    def command_hash(self, key):
+        """Return `command_hash` of command of item `key`."""
+        return _ITEM.unpack_from(self._buf,
+                                 self._items + key * _ITEM.size)[5]
+
+    def item_tags(self, key):
+        """Return tag ids of item `key`."""
+        command, description, nix_edit, first, count, h = _ITEM.unpack_from(
+            self._buf, self._items + key * _ITEM.size)
+        return self._item_tags[first:first + count]
+
+    def postings(self, tag):
+        """Return sorted keys of items tagged with `tag` or None."""
+        n = self.tag_table.find(tag)
+        if n < 0:
+            return None
+        return self.tag_table.postings(n)
+
+    def tag_name(self, n):
+        """Return tag id `n`, same string object for every item."""
+        name = self._tag_names.get(n)
+        if name is None:
+            name = self._tag_names[n] = self.tag_table.name(n)
+        return name
+
+    def tag_postings(self, n):
+        """Return sorted keys of items tagged with tag id `n`."""
+        return self.tag_table.postings(n)
+
+    def tag_range(self, prefix):
+        """Return (first, end) tag ids of tags starting with `prefix`."""
+        return self.tag_table.range(prefix)
+
+    def tags(self):
+        """Iterate over all tags in sorted order."""
+        for n in range(len(self.tag_table)):
+            yield self.tag_table.name(n)
+
+    def _bytes(self, sid):
+        start = self._strings + self._string_offsets[sid]
+        end = self._strings + self._string_offsets[sid + 1]
+        return self._buf[start:end]
+
+    def _string(self, sid):
+        return self._bytes(sid).decode('utf-8')
+
+class _Table(object):
+
+    """Sorted table of strings with postings."""
+
+    def __init__(self, index, offset, count):
+        self._index = index
+        self._offset = offset
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def find(self, name):
+        """Binary search table. Return id of `name` or -1."""
+        name = _encode(name)
+        lo = 0
+        hi = self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self._bytes(mid)
+            if value < name:
+                lo = mid + 1
+            elif value > name:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def name(self, n):
+        """Return string of entry `n`."""
+        return self._index._string(self._entry(n)[0])
+
+    def postings(self, n):
+        """Return sorted postings of entry `n`."""
+        sid, first, count = self._entry(n)
+        return self._index._postings[first:first + count]
+
+    def range(self, prefix):
+        """Return (first, end) ids of entries starting with `prefix`."""
+        prefix = _encode(prefix)
+        size = len(prefix)
+
+        lo = 0
+        hi = self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(mid) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        first = lo
+
+        hi = self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(mid)[:size] == prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        return first, lo
+
+    def _bytes(self, n):
+        return self._index._bytes(self._entry(n)[0])
+
+    def _entry(self, n):
+        return _ENTRY.unpack_from(self._index._buf,
+                                  self._offset + n * _ENTRY.size)
+
+class Postings(object):
+
+    """Dictionary-like view. Key is tag, value is sorted item keys."""
+
+    def __init__(self, index):
+        self._index = index
+
+    def __contains__(self, tag):
+        return self._index.postings(tag) is not None
+
+    def __getitem__(self, tag):
+        result = self._index.postings(tag)
+        if result is None:
+            raise KeyError(tag)
+        return result
+
+    def __iter__(self):
+        return self._index.tags()
+
+    def get(self, tag, default=None):
+        result = self._index.postings(tag)
+        if result is None:
+            return default
+        return result
+
+class Item(object):
+
+    """
+    Read-only view of an item, compares equal to its dictionary.
+
+    Only index and key are stored, fields are read from index when
+    accessed. Keys are ``command``, ``description``, ``tag`` and
+    ``nix_edit`` if item has it.
+    """
+
+    __slots__ = ('_index', '_key')
+
+    __hash__ = None
+
+    def __init__(self, index, key):
+        self._index = index
+        self._key = key
+
+    def __contains__(self, name):
+        return name in _FIELDS[:3] or (
+            name == u'nix_edit' and self._index.has_nix_edit(self._key))
+
+    def __eq__(self, other):
+        if isinstance(other, Item):
+            return (self._index is other._index and
+                    self._key == other._key) or dict(self) == dict(other)
+        if isinstance(other, Mapping):
+            return dict(self) == dict(other)
+        return NotImplemented
+
+    def __getitem__(self, name):
+        return self._index.item_field(self._key, name)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+    def keys(self):
+        if self._index.has_nix_edit(self._key):
+            return list(_FIELDS)
+        return list(_FIELDS[:3])
+
+    def values(self):
+        return [self[name] for name in self.keys()]
+
+Mapping.register(Item)
+
+class Items(object):
+
+    """List-like view. Index is item key, value is item."""
+
+    def __init__(self, index):
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._index.item(key)
+
+    def __len__(self):
+        return len(self._index)
+
+def _append(postings, name, value):
+    if name not in postings:
+        # Arrays take 4 bytes per key, lists 36.
+        postings[name] = array(_UINT)
+    postings[name].append(value)
+
+def _insert(postings, name, value):
+    """Insert `value` into sorted postings of `name` unless it is there."""
+    if name not in postings:
+        postings[name] = array(_UINT)
+    keys = postings[name]
+    n = bisect_left(keys, value)
+    if n == len(keys) or keys[n] != value:
+        keys.insert(n, value)
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
+
+def _tobytes(values):
+    if sys.version_info[0] < 3:
+        return values.tostring()
+    return values.tobytes()
+
+def _uints(buf, offset, count):
+    """Return unsigned ints stored at `offset` without copying them."""
+    if sys.version_info[0] < 3:
+        # Python 2 memoryview cannot be cast, fall back to copy.
+        return array(_UINT, buf[offset:offset + 4 * count])
+    return memoryview(buf)[offset:offset + 4 * count].cast(_UINT)
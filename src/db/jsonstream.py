@@ -0,0 +1,192 @@
+"""
+streaming json catalog reader module
+
+Command base files are json objects with list of items under ``item``
+key. `items` decodes big ones one item at a time from chunks of the
+file, so neither whole file nor its parsed copy has to fit in memory.
+Files may be compressed (see `SUFFIXES`), they are decompressed while
+read.
+"""
+
+import codecs
+import json
+import os
+import re
+
+SUFFIXES = ('.json', '.json.gz', '.json.xz', '.json.zst')
+"""Suffixes of command base files."""
+
+CHUNK_SIZE = 64 * 1024
+"""Bytes read at once."""
+
+STREAM_SIZE = 16 * 1024 * 1024
+"""
+Smaller uncompressed files are decoded at once, which is about twice as
+fast as decoding item by item.
+"""
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+_NEXT = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*')
+"""Separator after array value."""
+
+_modules = {}
+"""Key is suffix, value is decompression module or None if missing."""
+
+def files(directory):
+    """
+    Return sorted list of command base files in `directory`. Compressed
+    files are left out when their decompression module is not installed
+    (``zstandard`` is optional, ``lzma`` is missing on Python 2).
+    """
+    return [os.path.join(directory, file_name)
+            for file_name in sorted(os.listdir(directory))
+            if file_name.endswith(SUFFIXES) and _readable(file_name)]
+
+def open_file(path):
+    """Return binary file object of decompressed `path`."""
+    if path.endswith('.gz'):
+        return _module('.gz').open(path, 'rb')
+    if path.endswith('.xz'):
+        return _module('.xz').open(path, 'rb')
+    if path.endswith('.zst'):
+        decompressor = _module('.zst').ZstdDecompressor()
+        return decompressor.stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+def items(path, object_hook=None):
+    """
+    Yield items of command base file `path`, `object_hook` is called with
+    every decoded object (see `json.loads`). File is closed when all
+    items are read or generator is closed.
+    """
+    with open_file(path) as json_file:
+        if path.endswith('.json') and os.path.getsize(path) < STREAM_SIZE:
+            data = json.loads(json_file.read().decode('utf-8'),
+                              object_hook=object_hook)
+            for item in data.get(u'item', []):
+                yield item
+            return
+
+        reader = _Reader(json_file, json.JSONDecoder(object_hook=object_hook))
+        reader.expect('{')
+        if reader.skip('}'):
+            return
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            if key != u'item':
+                reader.value()
+            else:
+                for item in reader.array():
+                    yield item
+            if reader.skip('}'):
+                return
+            reader.expect(',')
+
+class _Reader(object):
+
+    """Decodes json values from buffered chunks of file."""
+
+    def __init__(self, json_file, decoder):
+        self._file = json_file
+        self._decoder = decoder
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = u''
+        self._pos = 0
+        self._eof = False
+
+    def expect(self, char):
+        """Consume `char` after whitespace, raise ValueError otherwise."""
+        if not self.skip(char):
+            raise ValueError('Expected %r at %d of json: %r' % (
+                char, self._pos, self._buffer[self._pos:self._pos + 20]))
+
+    def skip(self, char):
+        """Consume `char` after whitespace. Return True if found."""
+        self._skip_whitespace()
+        if self._buffer.startswith(char, self._pos):
+            self._pos += 1
+            return True
+        return False
+
+    def array(self):
+        """Consume json array after whitespace, yield its values."""
+        self.expect('[')
+        if self.skip(']'):
+            return
+        decode = self._decoder.raw_decode
+        while True:
+            try:
+                result, end = decode(self._buffer, self._pos)
+                separator = _NEXT.match(self._buffer, end)
+            except ValueError:
+                separator = None
+            if separator is None:
+                # Incomplete value or separator, decode it again with
+                # next chunk.
+                if not self._read():
+                    raise ValueError('Unterminated json array at %d: %r' % (
+                        self._pos, self._buffer[self._pos:self._pos + 20]))
+                self._skip_whitespace()
+                continue
+            self._pos = separator.end()
+            yield result
+            if separator.group(1) == ']':
+                return
+
+    def value(self):
+        """Consume and return json value after whitespace."""
+        self._skip_whitespace()
+        while True:
+            try:
+                result, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # Number at end of buffer may continue in next chunk.
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return result
+            except ValueError:
+                if self._eof:
+                    raise
+            # Incomplete value, decode it again with next chunk.
+            self._read()
+
+    def _skip_whitespace(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or not self._read():
+                return
+
+    def _read(self):
+        """Append next chunk to buffer. Return False at end of file."""
+        if self._eof:
+            return False
+        chunk = self._file.read(CHUNK_SIZE)
+        self._eof = not chunk
+        # Drop consumed part, so buffer stays about chunk long.
+        self._buffer = (self._buffer[self._pos:] +
+                        self._utf8.decode(chunk, self._eof))
+        self._pos = 0
+        return not self._eof
+
+def _module(suffix):
+    """Return decompression module of files with `suffix` or None."""
+    if suffix not in _modules:
+        names = {
+            '.gz': ('gzip',),
+            '.xz': ('lzma', 'backports.lzma'),
+            '.zst': ('zstandard',),
+        }[suffix]
+        _modules[suffix] = None
+        for name in names:
+            try:
+                _modules[suffix] = __import__(name, fromlist=['open'])
+                break
+            except ImportError:
+                pass
+    return _modules[suffix]
+
+def _readable(file_name):
+    """Return True if decompression module of `file_name` is installed."""
+    suffix = os.path.splitext(file_name)[1]
+    return suffix == '.json' or _module(suffix) is not None
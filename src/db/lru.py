@@ -0,0 +1,72 @@
+"""
+bounded least recently used cache module
+
+Entries have a weight (for example length of cached list), the least
+recently used ones are dropped when total weight grows over limit.
+"""
+
+import heapq
+
+class LRU(object):
+
+    """Cache of at most `max_weight` total weight."""
+
+    def __init__(self, max_weight):
+        self._max_weight = max_weight
+
+        self._entries = {}
+        """Key is key, value is (value, weight, use)."""
+
+        self._uses = []
+        """Heap of (use, key), stale when entry was used again since."""
+
+        self._use = 0
+        """Counter of uses, higher is more recent."""
+
+        self._weight = 0
+        """Total weight of entries."""
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Drop all entries."""
+        self._entries.clear()
+        del self._uses[:]
+        self._weight = 0
+
+    def get(self, key, default=None):
+        """Return value of `key` or `default`, mark it recently used."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        self._entries[key] = (entry[0], entry[1], self._touch(key))
+        return entry[0]
+
+    def put(self, key, value, weight=1):
+        """Cache `value` of `key`. Values heavier than limit are not kept."""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._weight -= old[1]
+        if weight > self._max_weight:
+            return
+
+        self._entries[key] = (value, weight, self._touch(key))
+        self._weight += weight
+        while self._weight > self._max_weight:
+            use, old_key = heapq.heappop(self._uses)
+            old = self._entries.get(old_key)
+            if old is not None and old[2] == use:
+                del self._entries[old_key]
+                self._weight -= old[1]
+
+    def _touch(self, key):
+        """Return next use of `key`, keep heap of uses small."""
+        self._use += 1
+        heapq.heappush(self._uses, (self._use, key))
+        if len(self._uses) > 2 * len(self._entries) + 16:
+            # Drop stale uses.
+            self._uses = [(entry[2], k) for k, entry in self._entries.items()]
+            self._uses.append((self._use, key))
+            heapq.heapify(self._uses)
+        return self._use
@@ -0,0 +1,232 @@
+"""
+remote command base module
+
+Thin client of command base server (see `server.py`). Server keeps
+command base loaded, so client does not have to import a `backend`.
+
+Requests and responses are json objects, one per line::
+
+    {"call": "get_commands", "args": [["git", "status"]]}
+    {"result": [...]}
+
+Commands returned by server end up in shell prompt, so client talks
+only to server of its own user: socket has to be in a directory no
+other user can access (see `private_dir`) and the process listening on
+it has to run as the same user.
+"""
+
+import errno
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import threading
+
+def _runtime_dir():
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.environ['XDG_RUNTIME_DIR']
+    # Imported only when needed, client should start fast.
+    import tempfile
+    return tempfile.gettempdir()
+
+SOCKET_FILE = os.environ.get('SHEARCH_SOCKET') or os.path.join(
+    _runtime_dir(), 'shearch-%d' % os.getuid(), 'server.sock')
+"""Unix domain socket server listens on, see `private_dir`."""
+
+PAGE_SIZE = 100
+"""Items fetched at once when `Cursor` is iterated."""
+
+SERVER_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'server.py'
+)
+
+class RemoteError(Exception):
+    """Server is not running or returned an error."""
+
+_connection = None
+"""Socket file of current connection."""
+
+_lock = threading.Lock()
+"""Held during `call`, threads share `_connection`."""
+
+def available():
+    """Return True if server accepts connections."""
+    try:
+        _connect()
+    except RemoteError:
+        return False
+    return True
+
+def private_dir():
+    """
+    Create directory of `SOCKET_FILE` accessible only by current user
+    unless it exists. Raise `RemoteError` if it is not such directory.
+    """
+    directory = os.path.dirname(SOCKET_FILE)
+    try:
+        os.mkdir(directory, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise RemoteError(str(e))
+    _check_private(directory)
+
+def start():
+    """Start server in background. Does not wait for it."""
+    import subprocess
+
+    with open(os.devnull, 'r+') as devnull:
+        subprocess.Popen(
+            [sys.executable, SERVER_FILE],
+            stdin=devnull,
+            stdout=devnull,
+            stderr=devnull,
+            close_fds=True,
+            preexec_fn=os.setsid
+        )
+
+def call(name, *args):
+    """Call `name` function of server's command base with `args`."""
+    global _connection
+
+    with _lock:
+        connection = _connect()
+        try:
+            connection.write(json.dumps({'call': name, 'args': args}) + '\n')
+            connection.flush()
+            response = connection.readline()
+        except socket.error as e:
+            _connection = None
+            raise RemoteError(str(e))
+        if not response:
+            _connection = None
+            raise RemoteError('Server closed connection.')
+
+    response = json.loads(response)
+    if 'error' in response:
+        raise RemoteError(response['error'])
+    return response['result']
+
+class Search(object):
+
+    """Search as you type on server, see `data_json.Search`."""
+
+    def cursor(self, query):
+        return Cursor(query)
+
+    def get_commands(self, query, limit=None, offset=0):
+        return call('search', query, limit, offset)
+
+class Cursor(object):
+
+    """
+    Items of `Search` query on server, see `data_json.Cursor`. Server is
+    asked when items or count are needed.
+    """
+
+    def __init__(self, query):
+        self._query = query
+        self._info = None
+        """[count, approximate] of query."""
+
+    def __iter__(self):
+        offset = 0
+        while offset < self.count():
+            for item in self.fetch(PAGE_SIZE, offset):
+                yield item
+            offset += PAGE_SIZE
+
+    @property
+    def approximate(self):
+        """True if items approximately match query."""
+        return self._get_info()[1]
+
+    def count(self):
+        return self._get_info()[0]
+
+    def fetch(self, limit=None, offset=0):
+        return call('search', self._query, limit, offset)
+
+    def _get_info(self):
+        if self._info is None:
+            self._info = call('search_count', self._query)
+        return self._info
+
+class TagCursor(Cursor):
+
+    """Items tagged with all tags on server, see `cursor`."""
+
+    def __init__(self, tags, prefix=False, approximate=False):
+        Cursor.__init__(self, [tags, prefix, approximate])
+
+    def fetch(self, limit=None, offset=0):
+        return call('get_commands', *(self._query + [limit, offset]))
+
+    def _get_info(self):
+        if self._info is None:
+            self._info = [call('count', *self._query), self._query[2]]
+        return self._info
+
+def count(tags, prefix=False, approximate=False):
+    return call('count', tags, prefix, approximate)
+
+def cursor(tags, prefix=False, approximate=False):
+    return TagCursor(tags, prefix, approximate)
+
+def get_commands(tags, prefix=False, approximate=False, limit=None, offset=0):
+    return call('get_commands', tags, prefix, approximate, limit, offset)
+
+def get_commands_many(queries, prefix=False, approximate=False, limit=None):
+    return call('get_commands_many', queries, prefix, approximate, limit)
+
+def _check_private(directory):
+    """Raise `RemoteError` unless only current user can use `directory`."""
+    try:
+        st = os.lstat(directory)
+    except OSError as e:
+        raise RemoteError(str(e))
+    if (not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or
+            st.st_mode & 0o077):
+        raise RemoteError('%s is not a private directory.' % directory)
+
+def _check_server(sock):
+    """Raise `RemoteError` unless `sock` is server of current user."""
+    try:
+        st = os.lstat(SOCKET_FILE)
+    except OSError as e:
+        raise RemoteError(str(e))
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+        raise RemoteError('%s is not a socket of current user.' %
+                          SOCKET_FILE)
+
+    if hasattr(socket, 'SO_PEERCRED'):
+        # Linux, the listening process itself.
+        creds = struct.Struct('3i')
+        pid, uid, gid = creds.unpack(sock.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, creds.size))
+        if uid != os.getuid():
+            raise RemoteError('Server runs as another user.')
+
+def _connect():
+    global _connection
+
+    if _connection is None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            _check_private(os.path.dirname(SOCKET_FILE))
+            sock.connect(SOCKET_FILE)
+            _check_server(sock)
+        except socket.error as e:
+            sock.close()
+            raise RemoteError(str(e))
+        except RemoteError:
+            sock.close()
+            raise
+        if sys.version_info[0] < 3:
+            _connection = sock.makefile('r+')
+        else:
+            _connection = sock.makefile('rw', encoding='utf-8')
+        sock.close()
+    return _connection
@@ -4,12 +4,27 @@
 # http://onlamp.com/pub/a/python/2005/02/03/tdd_pyunit2.html
 # http://docs.python.org/2/library/unittest.html
 
+import json
+import os
+import shutil
+import tempfile
+import threading
 import unittest
 
 import data_json
+import index
+import usage
 
 class TestDataJSON(unittest.TestCase):
 
+    def setUp(self):
+        # Keep results in catalog order, usage log does not exist.
+        self.frecency = data_json.frecency
+        data_json.frecency = usage.Scores(os.devnull + '.missing')
+
+    def tearDown(self):
+        data_json.frecency = self.frecency
+
     def test_get_commands_empty(self):
         self.assertEqual(
             data_json.get_commands(['']),
@@ -20,7 +35,7 @@ class TestDataJSON(unittest.TestCase):
     def test_get_commands_git(self):
         self.assertEqual(
             data_json.get_commands(['git']),
-            [{u'tag': [u'git', u'status'], u'command': u'git status', u'description': u'Returns git status.'}, {u'nix_edit': {u'args': [u'mygithub', u'git config --global user.name', u'shearch'], u'mask': u'git remote add %s git@github.com:%c/%s.git'}, u'tag': [u'git', u'add', u'commit', u'remote', u'contribute'], u'command': u'git remote add mygithub git@github.com:agiz/shearch.git', u'description': u'Adds your github to remote repositories.'}, {u'nix_edit': {u'args': [u'Added new commands'], u'mask': u'git commit -m "%s"'}, u'tag': [u'git', u'contribute', u'commit'], u'command': u'git commit -m "Added new commands."', u'description': u'Saves your newly added commands.'}, {u'nix_edit': {u'args': [u'mygithub', u'master'], u'mask': u'git push %s %s'}, u'tag': [u'git', u'push', u'contribute'], u'command': u'git push mygithub master', u'description': u'Uploads changes to your github repository.'}],
+            [{u'tag': [u'git', u'status'], u'command': u'git status', u'description': u'Returns git status.'}, {u'nix_edit': {u'args': [u'Added new commands'], u'mask': u'git commit -m "%s"'}, u'tag': [u'git', u'contribute', u'commit'], u'command': u'git commit -m "Added new commands."', u'description': u'Saves your newly added commands.'}, {u'nix_edit': {u'args': [u'mygithub', u'git config --global user.name', u'shearch'], u'mask': u'git remote add %s git@github.com:%c/%s.git'}, u'tag': [u'git', u'add', u'commit', u'remote', u'contribute'], u'command': u'git remote add mygithub git@github.com:agiz/shearch.git', u'description': u'Adds your github to remote repositories.'}, {u'nix_edit': {u'args': [u'mygithub', u'master'], u'mask': u'git push %s %s'}, u'tag': [u'git', u'push', u'contribute'], u'command': u'git push mygithub master', u'description': u'Uploads changes to your github repository.'}],
             'Database did not return expected item for "git" tag.'
         )
 
@@ -38,6 +53,162 @@ class TestDataJSON(unittest.TestCase):
             'Database did not return expected item for "status" tag.'
         )
 
+    def test_get_keys(self):
+        git = data_json.get_keys(['git'])
+        self.assertEqual(git, sorted(git))
+        self.assertEqual(data_json.get_keys(['git', 'nonexistent']), [])
+        self.assertEqual(
+            data_json.get_keys(['contribute', 'git', 'commit']),
+            data_json.get_keys(['commit', 'contribute'])
+        )
+        self.assertEqual(len(data_json.get_keys(['commit', 'push'])), 0)
+        self.assertEqual(len(data_json.get_keys([])),
+                         len(data_json.command))
+
+    def test_get_keys_prefix(self):
+        self.assertEqual(
+            data_json.get_keys(['stat'], prefix=True),
+            data_json.get_keys(['status'])
+        )
+        self.assertEqual(
+            data_json.get_keys(['git', 'co'], prefix=True),
+            data_json.get_keys(['git', 'contribute'])
+        )
+        self.assertEqual(
+            sorted(data_json.get_keys(['git', 'c'], prefix=True)),
+            sorted(set(data_json.get_keys(['git', 'contribute']) +
+                       data_json.get_keys(['git', 'commit'])))
+        )
+        self.assertEqual(data_json.get_keys(['statz'], prefix=True), [])
+
+    def test_cursor(self):
+        everything = data_json.get_commands(['git'])
+        cursor = data_json.cursor(['git'])
+        self.assertEqual(cursor.count(), len(everything))
+        self.assertEqual(cursor.fetch(2, 1), everything[1:3])
+        self.assertEqual(cursor.fetch(offset=2), everything[2:])
+        self.assertEqual(cursor.fetch(10, 10), [])
+        self.assertEqual(list(cursor), everything)
+        self.assertEqual(data_json.get_commands(['git'], limit=2, offset=1),
+                         everything[1:3])
+        search = data_json.Search()
+        self.assertEqual(search.cursor('git ').fetch(2, 1), everything[1:3])
+        self.assertEqual(search.cursor('').count(), 0)
+
+    def test_get_commands_many(self):
+        queries = [['git'], ['status'], ['git', 'status'], ['sta'], []]
+        self.assertEqual(
+            data_json.get_commands_many(queries, prefix=True, limit=2),
+            [data_json.get_commands(tags, True, False, 2) for tags in queries]
+        )
+
+    def test_cache(self):
+        self.assertEqual(data_json.cache_key(['git', 'status']),
+                         data_json.cache_key(['status', 'git']))
+        self.assertNotEqual(data_json.cache_key(['git', 'st'], True),
+                            data_json.cache_key(['st', 'git'], True))
+        data_json.cache.clear()
+        git_status = data_json.get_keys(['git', 'status'])
+        self.assertEqual(len(data_json.cache), 1)
+        # Cached result is reused, not recomputed.
+        self.assertTrue(data_json.get_keys(['status', 'git']) is git_status)
+        # Unchanged command base keeps its cache.
+        data_json.refresh()
+        self.assertEqual(len(data_json.cache), 1)
+
+    def test_compile_files(self):
+        json_files = data_json.json_files()
+        sig = index.signature(json_files)
+        serial = b''.join(data_json.compile_files(json_files, sig))
+        self.assertEqual(
+            b''.join(data_json.compile_files(json_files, sig, workers=2)),
+            serial)
+        self.assertEqual(index.Index(serial).signature(), sig)
+        self.assertEqual(len(index.Index(serial)), len(data_json.command))
+
+    def test_compile_thread(self):
+        # Workers are not forked while other threads run.
+        json_files = data_json.json_files()
+        sig = index.signature(json_files)
+        result = []
+        thread = threading.Thread(target=lambda: result.append(b''.join(
+            data_json.compile_files(json_files, sig, workers=2))))
+        thread.start()
+        thread.join()
+        self.assertEqual(result,
+                         [b''.join(data_json.compile_files(json_files, sig))])
+
+    def test_compile_duplicates(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            json_files = [os.path.join(tmp_dir, name)
+                          for name in ('a.json', 'b.json')]
+            catalogs = [
+                [(u'git status', [u'git', u'status']), (u'ls', [u'ls']),
+                 (u'git status', [u'st'])],
+                [(u'ls', [u'list']), (u'git status', [u'git', u'state'])],
+            ]
+            for json_file, commands in zip(json_files, catalogs):
+                with open(json_file, 'w') as out:
+                    json.dump({u'item': [
+                        {u'command': command, u'description': u'',
+                         u'tag': tags} for command, tags in commands
+                    ]}, out)
+            sig = index.signature(json_files)
+            serial = b''.join(data_json.compile_files(json_files, sig))
+            self.assertEqual(
+                b''.join(data_json.compile_files(json_files, sig,
+                                                 workers=2)),
+                serial)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        catalog = index.Index(serial)
+        self.assertEqual(len(catalog), 2)
+        # Tags of all entries find the first one.
+        for tag, keys in ((u'git', [0]), (u'st', [0]), (u'state', [0]),
+                          (u'ls', [1]), (u'list', [1])):
+            self.assertEqual(list(catalog.postings(tag)), keys)
+        self.assertEqual(index.Items(catalog)[0]['tag'],
+                         [u'git', u'status', u'st', u'state'])
+
+    def test_duplicate_tags(self):
+        items = [{u'command': command, u'description': u'', u'tag': tags}
+                 for command, tags in ((u'a', [u'x']), (u'b', [u'y']),
+                                       (u'a', [u'zza', u'zzb']))]
+        saved = data_json.catalog, data_json.db, data_json.command
+        data_json.catalog = index.Index(index.pack(items, []))
+        data_json.db = index.Postings(data_json.catalog)
+        data_json.command = index.Items(data_json.catalog)
+        data_json.cache.clear()
+        try:
+            # Tags of duplicate are tags of the item on every path.
+            self.assertEqual(data_json.command[0]['tag'],
+                             [u'x', u'zza', u'zzb'])
+            self.assertEqual(data_json.get_keys([u'x', u'zz'], True), [0])
+            self.assertEqual(data_json.Search().get_keys(u'x zz'), [0])
+            self.assertEqual(data_json.get_keys([u'zza', u'x']), [0])
+        finally:
+            data_json.catalog, data_json.db, data_json.command = saved
+            data_json.cache.clear()
+
+    def test_search(self):
+        search = data_json.Search()
+        self.assertEqual(search.get_keys(''), [])
+        self.assertEqual(search.get_keys('g'),
+                         data_json.get_keys(['g'], prefix=True))
+        self.assertEqual(search.get_keys('git'),
+                         data_json.get_keys(['git']))
+        self.assertEqual(search.get_keys('git st'),
+                         data_json.get_keys(['git', 'status']))
+        self.assertEqual(search.get_keys('git s'),
+                         data_json.get_keys(['git', 's'], prefix=True))
+        self.assertEqual(search.get_keys('git sx'), [])
+        self.assertEqual(search.get_keys('git '),
+                         data_json.get_keys(['git']))
+        self.assertEqual(search.get_commands('git status '),
+                         data_json.get_commands(['git', 'status']))
+
 def main():
     unittest.main()
 
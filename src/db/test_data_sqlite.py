@@ -0,0 +1,127 @@
+"""This tests sqlite command base backend module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import data_json
+import data_sqlite
+import index
+
+class TestDataSQLite(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'catalog.sqlite')
+        data_sqlite.build(self.path, data_json.iterate())
+        self.catalog = data_sqlite.Catalog(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_same_as_json(self):
+        json_catalog = data_json.catalog
+        for tags, prefix in ((['git'], False), (['git', 'status'], False),
+                             (['status'], False), (['git', 'st'], True),
+                             (['s'], True), (['nonexistent'], False),
+                             ([''], False)):
+            self.assertEqual(
+                self.catalog.get_commands(tags, prefix),
+                [json_catalog.item(key)
+                 for key in data_json.get_keys(tags, prefix)],
+                tags)
+            self.assertEqual(self.catalog.count(tags, prefix),
+                             data_json.count(tags, prefix))
+
+    def test_limit_and_scores(self):
+        status = self.catalog.get_commands(['status'])
+        self.assertEqual(self.catalog.get_commands(['status'], limit=2),
+                         status[:2])
+
+        self.assertEqual(
+            self.catalog.get_commands(['status'], limit=1, offset=1),
+            status[1:2])
+
+        scores = {index.command_hash(status[2]['command']): 1.0}
+        ranked = self.catalog.get_commands(['status'], limit=2, scores=scores)
+        self.assertEqual(ranked, [status[2], status[0]])
+        self.assertEqual(self.catalog.get_commands(
+            ['status'], limit=2, scores=scores, offset=1), status[:2])
+
+    def test_approximate(self):
+        if not self.catalog.fts:
+            self.skipTest('SQLite without FTS5')
+        commands = [item['command'] for item in self.catalog.get_commands(
+            ['github', 'repo'], approximate=True)]
+        self.assertEqual(sorted(commands), [
+            'git push mygithub master',
+            'git remote add mygithub git@github.com:agiz/shearch.git'])
+        self.assertEqual(
+            self.catalog.count(['github', 'repo'], approximate=True), 2)
+
+    def test_cursor(self):
+        search = data_sqlite.Search()
+        cursor = search.cursor('git s')
+        self.assertEqual(cursor.count(), 1)
+        self.assertEqual(list(cursor), data_sqlite.get_commands(['git', 's'],
+                                                                True))
+        self.assertEqual(search.cursor('').fetch(), [])
+        self.assertEqual(search.cursor(' ').count(), 0)
+        git = data_sqlite.cursor(['git'])
+        self.assertEqual(git.fetch(2, 1),
+                         data_sqlite.get_commands(['git'])[1:3])
+
+    def test_iterate(self):
+        self.assertEqual(list(self.catalog.iterate()),
+                         list(data_json.iterate()))
+        self.assertEqual(self.catalog.signature(), None)
+
+    def test_duplicates(self):
+        items = [dict(item) for item in data_json.iterate()]
+        duplicate = dict(items[0])
+        duplicate['tag'] = [u'again', items[0]['tag'][0]]
+        duplicate['description'] = u'Zebrafish.'
+        data_sqlite.build(self.path + '2', items + [duplicate])
+        catalog = data_sqlite.Catalog(self.path + '2')
+
+        # Same as json backend.
+        json_catalog = index.Index(index.pack(items + [duplicate], []))
+        self.assertEqual(list(catalog.iterate()),
+                         [json_catalog.item(key)
+                          for key in range(len(json_catalog))])
+        self.assertEqual(catalog.get_commands([u'again'])[0]['tag'],
+                         items[0]['tag'] + [u'again'])
+        self.assertEqual(catalog.version(), data_sqlite.VERSION)
+        if catalog.fts:
+            self.assertEqual(
+                catalog.get_commands([u'zebrafish'], approximate=True),
+                catalog.get_commands([u'again']))
+
+    def test_read_only(self):
+        built = []
+        build = data_sqlite.build
+        tempdir = tempfile.tempdir
+
+        def counted(path, items, sig=None):
+            built.append(path)
+            return build(path, items, sig)
+        data_sqlite.build = counted
+        tempfile.tempdir = self.tmp_dir
+        try:
+            path = os.path.join(self.tmp_dir, 'missing', 'catalog.sqlite')
+            catalog = data_sqlite.load(path)
+            self.assertEqual(len(built), 2)
+            self.assertEqual(os.path.dirname(catalog.path), self.tmp_dir)
+            # Database in temporary directory is reused.
+            self.assertEqual(data_sqlite.load(path).path, catalog.path)
+            self.assertEqual(len(built), 3)
+        finally:
+            data_sqlite.build = build
+            tempfile.tempdir = tempdir
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""This tests approximate command matching module."""
+
+import unittest
+
+import data_json
+import fuzzy
+
+class TestFuzzy(unittest.TestCase):
+
+    def test_distance(self):
+        self.assertEqual(fuzzy.distance('status', 'status', 2), 0)
+        self.assertEqual(fuzzy.distance('stauts', 'status', 2), 1)
+        self.assertEqual(fuzzy.distance('comit', 'commit', 2), 1)
+        self.assertEqual(fuzzy.distance('git', 'mercurial', 2), 3)
+
+    def test_get_keys_exact_first(self):
+        keys = fuzzy.get_keys(data_json.catalog, ['commit'])
+        exact = data_json.get_keys(['commit'])
+        self.assertEqual(keys[:len(exact)], exact)
+
+    def test_get_keys_typo(self):
+        self.assertEqual(
+            fuzzy.get_keys(data_json.catalog, ['gti', 'stauts']),
+            data_json.get_keys(['git', 'status'])
+        )
+        self.assertEqual(fuzzy.get_keys(data_json.catalog, ['qqqqqqqq']), [])
+
+    def test_get_keys_words(self):
+        # Neither "repository" nor "repositories" is a tag, closer first.
+        self.assertEqual(
+            fuzzy.get_keys(data_json.catalog, ['repositorys']),
+            data_json.get_keys(['push']) + data_json.get_keys(['remote'])
+        )
+
+    def test_search_fallback(self):
+        search = data_json.Search()
+        self.assertEqual(search.get_keys('git stauts'),
+                         data_json.get_keys(['git', 'status']))
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""This tests shell history importer module."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import history
+import index
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'history')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read(self, data, history_format=None):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+        return list(history.read(self.path, history_format))
+
+    def test_read_bash(self):
+        self.assertEqual(self.read(b'#1458291931\nls -la\ngit status\n'),
+                         ['ls -la', 'git status'])
+
+    def test_read_zsh(self):
+        data = (b': 1458291931:0;ls -la\n'
+                b': 1458291932:0;echo a \\\nb\n'
+                b': 1458291933:0;echo \xc4\x83\xad\n')
+        self.assertEqual(self.read(data),
+                         ['ls -la', 'echo a \\\nb', u'echo \u010d'])
+
+    def test_read_fish(self):
+        data = b'- cmd: echo a\\\\b\n  when: 1458291931\n- cmd: ls\n'
+        self.assertEqual(self.read(data), ['echo a\\b', 'ls'])
+
+    def test_template(self):
+        self.assertEqual(
+            history.template(['find', '.', '-name', '"*.txt"']),
+            ('find %s -name "%s"', ['.', '*.txt']))
+        self.assertEqual(
+            history.template(['git', 'log', '--author=agiz']),
+            ('git log --author=%s', ['agiz']))
+
+    def test_items(self):
+        importer = history.Importer()
+        for command in ('git status', 'git commit -m "a"', 'git status',
+                        'git commit -m "b"', 'ls /tmp', 'git status',
+                        'echo "unbalanced'):
+            importer.add(command)
+
+        status, commit, ls = importer.items()
+        self.assertEqual(status['command'], 'git status')
+        self.assertEqual(status['tag'], ['git', 'status'])
+        self.assertEqual(commit['command'], 'git commit -m "b"')
+        self.assertEqual(commit['nix_edit'],
+                         {'mask': 'git commit -m "%s"', 'args': ['b']})
+        self.assertEqual(ls['command'], 'ls /tmp')
+        self.assertNotIn('nix_edit', ls)
+        self.assertEqual(status['description'],
+                         'From shell history (3 uses).')
+        self.assertEqual(ls['description'], 'From shell history (1 use).')
+
+    def test_prune(self):
+        importer = history.Importer(2)
+        for n in range(100):
+            importer.add('git status')
+            importer.add('echo a%d' % n)
+            self.assertTrue(len(importer._templates) <= 4)
+        self.assertEqual(importer.items()[0]['command'], 'git status')
+
+    def test_write(self):
+        importer = history.Importer()
+        importer.add('git commit -m "a"')
+        importer.add('git commit -m "b"')
+        history.write(importer.items(), self.path)
+
+        with open(self.path) as f:
+            items = json.load(f)['item']
+        catalog = index.Index(index.pack(items, []))
+        self.assertEqual(catalog.item(0)['command'], 'git commit -m "b"')
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""This tests compiled command base module."""
+
+import unittest
+
+import index
+
+ITEMS = [
+    {u'command': u'ls -la', u'description': u'Lists files.',
+     u'tag': [u'ls', u'list', u'files']},
+    {u'command': u'find . -name "*.txt"', u'description': u'Finds files.',
+     u'nix_edit': {u'mask': u'find . -name "%s"', u'args': [u'*.txt']},
+     u'tag': [u'find', u'files']},
+    {u'command': u'echo č', u'description': u'Prints č.',
+     u'tag': [u'echo', u'č']},
+]
+
+SIGNATURE = [[u'example.json', 1356914093.0, 2355]]
+
+class TestIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = index.Index(index.pack(ITEMS, SIGNATURE))
+
+    def test_items(self):
+        self.assertEqual(len(self.index), len(ITEMS))
+        for key, item in enumerate(ITEMS):
+            self.assertEqual(self.index.item(key), item)
+
+    def test_item_view(self):
+        ls, find = self.index.item(0), self.index.item(1)
+        self.assertTrue(ITEMS[1] == find and find == ITEMS[1])
+        self.assertNotEqual(ls, find)
+        self.assertNotEqual(ls, ITEMS[1])
+        self.assertNotIn(u'nix_edit', ls)
+        self.assertEqual(ls.get(u'nix_edit'), None)
+        self.assertEqual(find[u'nix_edit'][u'args'], [u'*.txt'])
+        self.assertEqual(dict(find), ITEMS[1])
+        self.assertRaises(AttributeError, setattr, ls, 'x', 1)
+        # Tags are shared between items.
+        self.assertTrue(ls[u'tag'][2] is find[u'tag'][1])
+
+    def test_postings(self):
+        self.assertEqual(list(self.index.postings(u'files')), [0, 1])
+        self.assertEqual(list(self.index.postings(u'č')), [2])
+        self.assertEqual(self.index.postings(u'missing'), None)
+
+    def test_signature(self):
+        self.assertEqual(self.index.signature(), SIGNATURE)
+
+    def test_tags(self):
+        self.assertEqual(
+            list(self.index.tags()),
+            [u'echo', u'files', u'find', u'list', u'ls', u'č']
+        )
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, index.Index, b'SHIX')
+        self.assertRaises(ValueError, index.Index, b'\0' * 64)
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""This tests streaming json catalog reader module."""
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import jsonstream
+
+CATALOG = {
+    u'comment': {u'item': [1, 2.5, u'[{"}]']},
+    u'item': [
+        {u'command': u'ls -la', u'description': u'Lists files.',
+         u'tag': [u'ls', u'list', u'files']},
+        {u'command': u'echo č', u'description': u'Prints č.',
+         u'tag': [u'echo', u'č'], u'nix_edit': {u'mask': u'echo %s',
+                                                u'args': [u'č']}},
+    ],
+    u'version': 12345,
+}
+
+class TestJSONStream(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'catalog.json')
+        self.data = json.dumps(CATALOG, indent=1,
+                               ensure_ascii=False).encode('utf-8')
+        with open(self.path, 'wb') as out:
+            out.write(self.data)
+        self.stream_size = jsonstream.STREAM_SIZE
+        self.chunk_size = jsonstream.CHUNK_SIZE
+        jsonstream.STREAM_SIZE = 0
+
+    def tearDown(self):
+        jsonstream.STREAM_SIZE = self.stream_size
+        jsonstream.CHUNK_SIZE = self.chunk_size
+        shutil.rmtree(self.tmp_dir)
+
+    def test_items(self):
+        # Values split by every chunk boundary.
+        for chunk_size in (1, 2, 3, 7, 64 * 1024):
+            jsonstream.CHUNK_SIZE = chunk_size
+            self.assertEqual(list(jsonstream.items(self.path)),
+                             CATALOG[u'item'], chunk_size)
+        jsonstream.STREAM_SIZE = self.stream_size
+        self.assertEqual(list(jsonstream.items(self.path)), CATALOG[u'item'])
+
+    def test_object_hook(self):
+        tags = list(jsonstream.items(
+            self.path, lambda obj: obj.get(u'tag', obj)))
+        self.assertEqual(tags, [item[u'tag'] for item in CATALOG[u'item']])
+
+    def test_empty_and_broken(self):
+        for data, result in ((b'{}', []), (b'{"item": []}', []),
+                             (b' {"item" : [ {} ] } ', [{}])):
+            with open(self.path, 'wb') as out:
+                out.write(data)
+            self.assertEqual(list(jsonstream.items(self.path)), result)
+        for data in (b'[]', b'{"item": [{}', b'{"item": [{} {}]}'):
+            with open(self.path, 'wb') as out:
+                out.write(data)
+            self.assertRaises(ValueError, list, jsonstream.items(self.path))
+
+    def test_compressed(self):
+        with gzip.open(self.path + '.gz', 'wb') as out:
+            out.write(self.data)
+        open(self.path + '.bz2', 'wb').close()
+        self.assertEqual(jsonstream.files(self.tmp_dir),
+                         [self.path, self.path + '.gz'])
+        self.assertEqual(list(jsonstream.items(self.path + '.gz')),
+                         CATALOG[u'item'])
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""This tests bounded least recently used cache module."""
+
+import unittest
+
+import lru
+
+class TestLRU(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = lru.LRU(10)
+
+    def test_get(self):
+        self.cache.put('a', [1, 2], 2)
+        self.assertEqual(self.cache.get('a'), [1, 2])
+        self.assertEqual(self.cache.get('b'), None)
+        self.assertEqual(self.cache.get('b', []), [])
+
+    def test_evict(self):
+        self.cache.put('a', 1, 4)
+        self.cache.put('b', 2, 4)
+        self.cache.get('a')
+        self.cache.put('c', 3, 4)
+        # Least recently used 'b' is dropped.
+        self.assertEqual(self.cache.get('b'), None)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('c'), 3)
+
+    def test_many_uses(self):
+        for n in range(100):
+            self.cache.put(n % 5, n)
+            self.cache.get(0)
+        self.cache.put('a', 1, 7)
+        # Least recently used 1 and 2 are dropped.
+        self.assertEqual(len(self.cache), 4)
+        self.assertEqual(self.cache.get(2), None)
+        self.assertEqual(self.cache.get(3), 98)
+        self.assertEqual(self.cache.get(0), 95)
+
+    def test_too_heavy(self):
+        self.cache.put('a', 1, 4)
+        self.cache.put('b', 2, 11)
+        self.assertEqual(len(self.cache), 1)
+        self.cache.put('a', 3, 11)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_clear(self):
+        self.cache.put('a', 1, 10)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+        self.cache.put('b', 2, 10)
+        self.assertEqual(self.cache.get('b'), 2)
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""This tests command usage module."""
+
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+
+import data_json
+import usage
+
+DAY = 86400
+
+class TestUsage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'usage')
+        self.frecency = data_json.frecency
+        data_json.frecency = usage.Scores(self.path)
+
+    def tearDown(self):
+        data_json.frecency = self.frecency
+        shutil.rmtree(self.tmp_dir)
+
+    def test_load_missing(self):
+        self.assertEqual(usage.load(self.path), {})
+
+    def test_score(self):
+        now = 1000 * DAY
+        usage.record('git status', self.path, now - DAY)
+        usage.record('git status', self.path, now - 20 * DAY)
+        usage.record('hg status', self.path, now - 200 * DAY)
+        scores = usage.load(self.path, now)
+        self.assertEqual(scores[usage.command_hash('git status')], 150)
+        self.assertEqual(scores[usage.command_hash('hg status')], 10)
+
+    def test_compact(self):
+        now = 1000 * DAY
+        for n in range(usage.COMPACT_RECORDS + 1):
+            usage.record('git status', self.path, now - n)
+        usage.record('hg status', self.path, now)
+        scores = usage.load(self.path, now)
+        self.assertEqual(os.path.getsize(self.path), 12 * (usage.MAX_USES + 1))
+        self.assertEqual(scores, usage.load(self.path, now))
+        self.assertEqual(scores[usage.command_hash('git status')],
+                         100 * (usage.COMPACT_RECORDS + 1))
+
+    def test_compact_once(self):
+        now = 1000 * DAY
+        n_uses = 5
+        n_commands = usage.COMPACT_RECORDS // n_uses + 1000
+        with open(self.path, 'wb') as f:
+            for h in range(n_commands):
+                for n in range(n_uses):
+                    f.write(usage._RECORD.pack(h, now - h - n, 1))
+        scores = usage.Scores(self.path)
+        self.assertEqual(len(scores.get()),
+                         usage.COMPACT_TARGET // n_uses)
+        self.assertEqual(os.path.getsize(self.path) // usage._RECORD.size,
+                         usage.COMPACT_TARGET // n_uses * n_uses)
+
+        compact = usage._compact
+        calls = []
+        def counted(*args):
+            calls.append(args)
+            return compact(*args)
+        usage._compact = counted
+        load = usage._load
+        loads = []
+        def counted_load(*args):
+            loads.append(args)
+            return load(*args)
+        usage._load = counted_load
+        try:
+            # Compacted log neither compacted nor reloaded again.
+            scores.get()
+            usage.load(self.path, now)
+        finally:
+            usage._compact = compact
+            usage._load = load
+        self.assertEqual(calls, [])
+        self.assertEqual(len(loads), 1)
+
+    def test_unwritable(self):
+        # Recording usage never fails the chosen command.
+        usage.record('git status', os.path.join(self.tmp_dir, 'missing',
+                                                'usage'))
+        usage.record('git status', self.tmp_dir)
+        self.assertEqual(usage.load(self.tmp_dir), {})
+
+    def test_read_only(self):
+        now = 1000 * DAY
+        for n in range(usage.COMPACT_RECORDS + 1):
+            usage.record('git status', self.path, now - n)
+        expected = {usage.command_hash('git status'):
+                    100 * (usage.COMPACT_RECORDS + 1)}
+        size = os.path.getsize(self.path)
+
+        compact_file = usage._compact_file
+        def read_only(path, now):
+            raise IOError(errno.EROFS, 'Read-only file system')
+        usage._compact_file = read_only
+        try:
+            # Log that cannot be compacted is scored as it is.
+            self.assertEqual(usage.load(self.path, now), expected)
+        finally:
+            usage._compact_file = compact_file
+        self.assertEqual(os.path.getsize(self.path), size)
+
+        # Reading scores needs no write access.
+        os.chmod(self.path, 0o444)
+        usage.COMPACT_RECORDS, saved = size, usage.COMPACT_RECORDS
+        try:
+            self.assertEqual(usage.load(self.path, now), expected)
+        finally:
+            usage.COMPACT_RECORDS = saved
+
+    def test_compact_merged(self):
+        now = 1000 * DAY
+        uses = [(now - 60 * DAY, 1), (now - 40 * DAY, 3)]
+        uses += [(now, 1)] * (usage.MAX_USES - 1)
+        merged = usage._compact({1: uses}, now)[1]
+        self.assertEqual(len(merged), usage.MAX_USES)
+        # Weighted by count, not as recent as the newest merged use.
+        self.assertEqual(merged[0], (now - 45 * DAY, 4))
+
+    def test_rank(self):
+        keys = data_json.get_keys(['status'])
+        usage.record('svn status', self.path)
+        usage.record('git status', self.path)
+        usage.record('git status', self.path)
+        self.assertEqual(
+            [item['command'] for item in
+             data_json.get_commands(['status'], limit=2)],
+            ['git status', 'svn status']
+        )
+        self.assertEqual(len(data_json.rank(keys)), len(keys))
+        self.assertEqual(
+            data_json.Search().get_commands('stat', 1)[0]['command'],
+            'git status'
+        )
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
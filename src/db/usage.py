@@ -0,0 +1,193 @@
+"""
+command usage module
+
+Every chosen command is appended to `USAGE_FILE` as a fixed size binary
+record (command hash, time, count). Commands are ranked by frecency:
+each use is weighted by its age, so commands used often and recently
+come first.
+
+Log is compacted when it grows over `COMPACT_RECORDS` records: uses of
+a command older than its last `MAX_USES` are merged into one record and
+only best commands are kept, at most `MAX_COMMANDS` of them in at most
+`COMPACT_TARGET` records.
+"""
+
+import fcntl
+import os
+import struct
+import time
+
+try:
+    from .index import command_hash
+except (ImportError, ValueError):
+    # Imported as top level module (tests).
+    from index import command_hash
+
+USAGE_FILE = os.environ.get('SHEARCH_USAGE') or os.path.join(
+    os.path.expanduser('~'), '.shearch_usage')
+"""Binary usage log."""
+
+COMPACT_RECORDS = 8192
+"""Log is compacted when it has more records."""
+
+COMPACT_TARGET = COMPACT_RECORDS // 2
+"""
+Records kept on compaction, far enough below `COMPACT_RECORDS` so that
+log is not compacted again soon.
+"""
+
+MAX_USES = 10
+"""Uses of a command kept apart, older ones are merged."""
+
+MAX_COMMANDS = 2048
+"""Commands kept on compaction."""
+
+WEIGHTS = ((4, 100), (14, 70), (31, 50), (90, 30), (None, 10))
+"""(Age in days, weight) of a use, first matching age applies."""
+
+_RECORD = struct.Struct('=III')
+"""Command hash, time, count."""
+
+class Scores(object):
+
+    """Frecency scores, reloaded when usage log changes."""
+
+    def __init__(self, path=None):
+        self._path = path or USAGE_FILE
+        self._stat = None
+        self._scores = {}
+
+    def get(self):
+        """Return dictionary, key is command hash, value is score."""
+        try:
+            st = os.stat(self._path)
+            st = (st.st_mtime, st.st_size)
+        except EnvironmentError:
+            st = None
+        if st != self._stat:
+            if st:
+                # Compaction rewrites log, keep its state afterwards.
+                self._scores, self._stat = _load(self._path)
+            else:
+                self._scores, self._stat = {}, st
+        return self._scores
+
+def load(path=None, now=None):
+    """
+    Return dictionary, key is command hash, value is frecency score.
+
+    Compacts usage log when it has grown too big.
+    """
+    return _load(path, now)[0]
+
+def record(command, path=None, now=None):
+    """
+    Append use of `command` to usage log. Usage is recorded on best
+    effort, log that cannot be written (read-only home, full disk) is
+    left as it is.
+    """
+    now = time.time() if now is None else now
+    try:
+        with open(path or USAGE_FILE, 'ab') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(_RECORD.pack(command_hash(command), int(now), 1))
+    except EnvironmentError:
+        pass
+
+def score(uses, now):
+    """Return frecency score of list of (time, count) uses."""
+    result = 0
+    for t, count in uses:
+        age = (now - t) / 86400.0
+        for days, weight in WEIGHTS:
+            if days is None or age < days:
+                result += weight * count
+                break
+    return result
+
+def _compact(uses, now):
+    """Return `uses` with old uses merged and unpopular commands dropped."""
+    result = {}
+    for h, values in uses.items():
+        values.sort()
+        if len(values) > MAX_USES:
+            old = values[:-MAX_USES + 1]
+            count = sum(c for t, c in old)
+            # Merged use is as old as its uses on average.
+            merged = (sum(t * c for t, c in old) // count, count)
+            values = [merged] + values[-MAX_USES + 1:]
+        result[h] = values
+
+    best = sorted(result, key=lambda h: score(result[h], now), reverse=True)
+    kept = {}
+    n_records = 0
+    for h in best[:MAX_COMMANDS]:
+        n_records += len(result[h])
+        if n_records > COMPACT_TARGET:
+            break
+        kept[h] = result[h]
+    return kept
+
+def _compact_file(path, now):
+    """
+    Compact usage log `path` unless other process did it meanwhile.
+    Return its uses (see `_uses`) and (mtime, size) afterwards.
+    """
+    with open(path, 'r+b') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        data = f.read()
+        uses = _uses(data)
+        if len(data) // _RECORD.size > COMPACT_RECORDS:
+            uses = _compact(uses, now)
+            f.seek(0)
+            for h, values in uses.items():
+                for t, count in values:
+                    f.write(_RECORD.pack(h, t, count))
+            f.truncate()
+            f.flush()
+        st = os.fstat(f.fileno())
+    return uses, (st.st_mtime, st.st_size)
+
+def _load(path=None, now=None):
+    """
+    Return scores (see `load`) and (mtime, size) of usage log after they
+    were loaded, or None if it cannot be read.
+
+    Log is only read unless it has to be compacted, so scores are
+    loaded also when it cannot be written.
+    """
+    now = time.time() if now is None else now
+    path = path or USAGE_FILE
+    try:
+        with open(path, 'rb') as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            data = f.read()
+            st = os.fstat(f.fileno())
+    except EnvironmentError:
+        return {}, None
+
+    uses = _uses(data)
+    stat = (st.st_mtime, st.st_size)
+    if len(data) // _RECORD.size > COMPACT_RECORDS:
+        try:
+            uses, stat = _compact_file(path, now)
+        except EnvironmentError:
+            # Read-only log, scores are the same without compaction.
+            pass
+
+    scores = dict((h, score(values, now)) for h, values in uses.items())
+    return scores, stat
+
+def _uses(data):
+    """
+    Return uses of usage log `data`, key is command hash, value is list
+    of (time, count).
+    """
+    uses = {}
+    # Ignore partially written record at the end.
+    for n in range(len(data) // _RECORD.size):
+        h, t, count = _RECORD.unpack_from(data, n * _RECORD.size)
+        if h not in uses:
+            uses[h] = []
+        uses[h].append((t, count))
+    return uses
@@ -0,0 +1,85 @@
+"""
+Edit buffer of a command, this module defines the following class:
+
+- `GapBuffer`: text with a gap at the place of the last edit.
+
+Characters are kept in a list with an unused gap at the cursor. Typing,
+deleting and pasting near the last edit only move the gap a little, so
+local edits cost amortized O(1) per character instead of copying the
+whole command. Text is joined only when it is read as a whole.
+"""
+
+__docformat__ = 'reStructuredText'
+
+class GapBuffer(object):
+
+    """Text supporting cheap local range replacement."""
+
+    def __init__(self, text=''):
+        self._chars = list(text)
+
+        self._start = len(self._chars)
+        """Index of the first character of the gap."""
+
+        self._end = len(self._chars)
+        """Index of the first character after the gap."""
+
+        self._text = text
+        """Joined text, None after an edit."""
+
+    def __getitem__(self, key):
+        """Return character or (step 1) slice of text."""
+        if self._text is not None:
+            return self._text[key]
+        if not isinstance(key, slice):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError(key)
+            if key >= self._start:
+                key += self._end - self._start
+            return self._chars[key]
+
+        start, stop, step = key.indices(len(self))
+        gap = self._end - self._start
+        left = self._chars[start:min(stop, self._start)]
+        right = self._chars[max(start, self._start) + gap:stop + gap]
+        return ''.join(left + right)
+
+    def __len__(self):
+        return len(self._chars) - (self._end - self._start)
+
+    def replace(self, start, end, text):
+        """Replace characters from `start` to `end` with `text`."""
+        self._move(end)
+        self._start = start
+
+        if self._end - self._start < len(text):
+            # Grow gap at least by length of buffer, amortized O(1).
+            grow = max(len(text), len(self._chars))
+            self._chars[self._start:self._start] = [''] * grow
+            self._end += grow
+
+        self._chars[self._start:self._start + len(text)] = text
+        self._start += len(text)
+        self._text = None
+
+    def text(self):
+        """Return whole text."""
+        if self._text is None:
+            self._text = ''.join(self._chars[:self._start] +
+                                 self._chars[self._end:])
+        return self._text
+
+    def _move(self, pos):
+        """Move gap to start at `pos`."""
+        if pos < self._start:
+            n = self._start - pos
+            self._chars[self._end - n:self._end] = self._chars[pos:self._start]
+            self._start -= n
+            self._end -= n
+        elif pos > self._start:
+            n = pos - self._start
+            self._chars[self._start:pos] = self._chars[self._end:self._end + n]
+            self._start += n
+            self._end += n
@@ -0,0 +1,121 @@
+"""
+Virtual list of query results, this module defines the following class:
+
+- `ListView`: window of results visible on screen.
+
+Query may return thousands of results but only a screen of them can be
+shown. `ListView` fetches results from cursor (see `db.backend`) a page
+ahead and creates `Command` objects only for rows in the visible window.
+Results scrolled into view get their `Command` lazily, results scrolled
+out of view drop it.
+
+Rows keep what was drawn in the previous frame: a new query rebuilds
+only rows whose result changed. Commands only stage their output, see
+`Command._print_command`, so the caller updates terminal once.
+"""
+
+__docformat__ = 'reStructuredText'
+
+class ListView(object):
+
+    """Window of `height` rows over results, starting with `top` result."""
+
+    def __init__(self, build, release, first_row, height):
+        """
+        Initialize an empty `ListView`.
+
+        Parameters:
+
+        - `build`: function (item, row) returning `Command` shown in `row`.
+        - `release`: function (command) called when command is dropped.
+        - `first_row`: row of main terminal window with first result.
+        - `height`: number of visible rows.
+        """
+        self._build = build
+        self._release = release
+        self._first_row = first_row
+        self._height = height
+
+        self._cursor = None
+        """Cursor of results, see `db.backend`."""
+
+        self._items = []
+        """Results fetched so far."""
+
+        self._exhausted = True
+        """True if there are no more results to fetch."""
+
+        self._commands = {}
+        """Key is index of result, value is its `Command`."""
+
+        self.top = 0
+        """Index of result in the first row."""
+
+    def commands(self):
+        """Return list of visible commands."""
+        return list(self._commands.values())
+
+    def get(self, row):
+        """Return `Command` in `row` of window (0 is first) or None."""
+        return self._commands.get(self.top + row)
+
+    def reset(self, cursor):
+        """Show results of new `cursor` from the top."""
+        previous = dict((n - self.top, command)
+                        for n, command in self._commands.items())
+        """Key is row, value is its `Command` in previous frame."""
+
+        self._cursor = cursor
+        self._items = []
+        self._exhausted = False
+        self._commands = {}
+        self.top = 0
+        self._load()
+
+        for row, command in previous.items():
+            if (row < min(self._height, len(self._items)) and
+                    command.get_item() == self._items[row]):
+                # Same result in the same row, nothing to draw.
+                self._commands[row] = command
+            else:
+                self._release(command)
+        self._show()
+
+    def rows(self):
+        """Return number of rows showing results."""
+        return len(self._commands)
+
+    def scroll(self, delta):
+        """Scroll window by `delta` rows. Return True if it moved."""
+        top = max(self.top + delta, 0)
+        self._load(top)
+        top = min(top, max(len(self._items) - self._height, 0))
+        if top == self.top:
+            return False
+        self.top = top
+        self._show()
+        return True
+
+    def _load(self, top=0):
+        """Fetch results up to a page after window starting at `top`."""
+        if self._exhausted or len(self._items) >= top + self._height:
+            return
+        # Only results not fetched yet.
+        limit = top + 2 * self._height - len(self._items)
+        page = self._cursor.fetch(limit, len(self._items))
+        self._items.extend(page)
+        self._exhausted = len(page) < limit
+
+    def _show(self):
+        """Create commands of visible results, drop the others."""
+        end = min(self.top + self._height, len(self._items))
+        for n in list(self._commands):
+            if not self.top <= n < end:
+                self._release(self._commands.pop(n))
+
+        for n in range(self.top, end):
+            row = self._first_row + n - self.top
+            if n in self._commands:
+                self._commands[n].move(row)
+            else:
+                self._commands[n] = self._build(self._items[n], row)
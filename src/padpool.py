@@ -0,0 +1,52 @@
+"""
+Reusable pads of result rows, this module defines the following class:
+
+- `PadPool`: bounded pool of one line pads.
+
+Every visible command is drawn in its own pad. Pads are wide as their
+command, not as the widest command ever shown, and at most `limit` of
+them are kept, so memory does not grow with the session.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import curses
+
+class PadPool(object):
+
+    """At most `limit` pads, each at least `min_width` characters wide."""
+
+    def __init__(self, limit, min_width):
+        self._limit = limit
+        self._min_width = min_width
+
+        self._free = []
+        """Pads ready for reuse."""
+
+        self._used = 0
+        """Number of pads given out."""
+
+    def get(self, length):
+        """Return empty pad for text of `length` characters."""
+        # Cursor needs a column after the text.
+        width = max(length + 1, self._min_width)
+        self._used += 1
+        if not self._free:
+            return curses.newpad(1, width)
+
+        # Narrowest pad that fits, otherwise the widest one grown.
+        fits = [(pad.getmaxyx()[1], n) for n, pad in enumerate(self._free)]
+        fitting = [fit for fit in fits if fit[0] >= width]
+        if fitting:
+            pad = self._free.pop(min(fitting)[1])
+        else:
+            pad = self._free.pop(max(fits)[1])
+            pad.resize(1, width)
+        return pad
+
+    def put(self, pad):
+        """Take back `pad`, drop it if pool is full."""
+        self._used -= 1
+        if self._used + len(self._free) < self._limit:
+            pad.erase()
+            self._free.append(pad)
@@ -0,0 +1,192 @@
+"""
+Asynchronous resolution of ``%c`` placeholders in ``nix_edit`` masks.
+
+``%c`` placeholder is replaced with output of a shell command. Commands
+run on a pool of worker threads with a timeout, so the UI never waits
+for them. Outputs are kept in a cache shared by all queries and, through
+`CACHE_FILE`, by all sessions for `TTL` seconds.
+
+How To Use This Module
+======================
+
+1. Ask for output: ``resolver.get(command)``. It returns cached output,
+   `FAILED` if command failed or timed out, or None, when command is
+   started in background.
+
+2. Collect finished commands from time to time:
+   ``resolver.completed()``.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+import tracing
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+CACHE_FILE = os.environ.get('SHEARCH_CACHE') or os.path.join(
+    os.path.expanduser('~'), '.shearch_cache')
+"""Json file with cached outputs, key is command, value is [time, output]."""
+
+TIMEOUT = 2
+"""Seconds a command may run before it is killed."""
+
+TTL = 300
+"""Seconds an output is cached."""
+
+WORKERS = 4
+"""Number of worker threads."""
+
+FAILED = object()
+"""Output of command that failed or was killed, see `get`."""
+
+_cache = None
+"""Key is command, value is (time, output). Output is None on failure."""
+
+_done = queue.Queue()
+"""Finished (command, output)."""
+
+_jobs = queue.Queue()
+"""Commands waiting for a worker."""
+
+_lock = threading.Lock()
+"""Guards `_cache`, `_pending` and `_workers`."""
+
+_pending = set()
+"""Commands waiting or running."""
+
+_workers = []
+
+def completed():
+    """
+    Return list of (command, output) finished since last call, output is
+    `FAILED` if command failed.
+    """
+    result = []
+    while True:
+        try:
+            result.append(_done.get_nowait())
+        except queue.Empty:
+            return result
+
+def get(command):
+    """
+    Return cached output of `command` (`FAILED` if it failed) or None and
+    resolve it later.
+    """
+    with _lock:
+        cache = _load()
+        if command in cache and time.time() - cache[command][0] < TTL:
+            return _output(cache[command][1])
+
+        if command not in _pending:
+            _pending.add(command)
+            _jobs.put(command)
+            if len(_workers) < min(WORKERS, len(_pending)):
+                worker = threading.Thread(target=_work)
+                worker.daemon = True
+                worker.start()
+                _workers.append(worker)
+    return None
+
+def run(command, timeout=None):
+    """
+    Return stripped output of shell `command`, None if it failed or was
+    killed after `timeout` (default `TIMEOUT`) seconds.
+    """
+    # Only sessions showing `%c` placeholders pay for the import.
+    import subprocess
+
+    if sys.version_info[0] < 3:
+        # Not safe in threads, but Python 2 has no other way.
+        session = {'preexec_fn': os.setsid}
+    else:
+        session = {'start_new_session': True}
+
+    with tracing.span('%c', command=command):
+        with open(os.devnull, 'r+') as devnull:
+            process = subprocess.Popen(
+                command,
+                stdin=devnull,
+                stdout=subprocess.PIPE,
+                stderr=devnull,
+                shell=True,
+                **session
+            )
+        # Kill the whole group, shell's children keep stdout open too.
+        timer = threading.Timer(TIMEOUT if timeout is None else timeout,
+                                _kill, (process,))
+        timer.start()
+        try:
+            output = process.communicate()[0]
+        finally:
+            timer.cancel()
+
+    if process.returncode != 0:
+        return None
+    if not isinstance(output, str):
+        output = output.decode('utf-8', 'replace')
+    return output.strip()
+
+def _kill(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        # Finished in the meantime.
+        pass
+
+def _load():
+    """Return cache, read `CACHE_FILE` on first use."""
+    global _cache
+
+    if _cache is None:
+        _cache = {}
+        try:
+            with open(CACHE_FILE) as f:
+                for command, value in json.load(f).items():
+                    _cache[command] = tuple(value)
+        except (EnvironmentError, ValueError):
+            # Missing or broken cache.
+            pass
+    return _cache
+
+def _output(output):
+    """Return cached `output`, `FAILED` if it is None."""
+    return FAILED if output is None else output
+
+def _save():
+    """Write fresh part of cache to `CACHE_FILE`."""
+    now = time.time()
+    cache = dict((command, value) for command, value in _cache.items()
+                 if now - value[0] < TTL)
+    tmp_file = '%s.%d.tmp' % (CACHE_FILE, os.getpid())
+    try:
+        with open(tmp_file, 'w') as f:
+            json.dump(cache, f)
+        os.rename(tmp_file, CACHE_FILE)
+    except EnvironmentError:
+        # Cache is only an optimization.
+        pass
+
+def _work():
+    while True:
+        command = _jobs.get()
+        try:
+            output = run(command)
+        except EnvironmentError:
+            # Shell cannot be started (too many processes).
+            output = None
+        with _lock:
+            _pending.discard(command)
+            _load()[command] = (time.time(), output)
+            _save()
+        _done.put((command, _output(output)))
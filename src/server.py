@@ -0,0 +1,131 @@
+#!/usr/bin/python
+"""
+Command base server.
+
+Keeps command base loaded and answers queries of `db.remote` clients on
+a unix domain socket, so pressing the hotkey does not pay for loading
+the command base. Server shuts itself down after being idle.
+
+Usage: ``python server.py [idle seconds]``.
+"""
+
+import json
+import os
+import sys
+import threading
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from db import backend
+from db import remote
+
+data = backend.get()
+"""Command base, see `backend`."""
+
+IDLE_TIMEOUT = 30 * 60
+"""Seconds without connected clients before server exits."""
+
+CALLS = ('count', 'get_commands', 'get_commands_many', 'search',
+         'search_count')
+"""Functions of command base clients may call."""
+
+class Handler(socketserver.StreamRequestHandler):
+
+    """Answer requests of one client until it disconnects."""
+
+    def handle(self):
+        self.search = None
+        """Search as you type state of this client."""
+
+        self.server.connected(1)
+        try:
+            for line in iter(self.rfile.readline, b''):
+                self.wfile.write(self._answer(line).encode('utf-8') + b'\n')
+                self.wfile.flush()
+        finally:
+            self.server.connected(-1)
+
+    def _answer(self, line):
+        try:
+            request = json.loads(line.decode('utf-8'))
+            if request['call'] not in CALLS:
+                raise ValueError('Unknown call %s.' % request['call'])
+            with self.server.lock:
+                data.refresh()
+                if request['call'].startswith('search'):
+                    if self.search is None:
+                        self.search = data.Search()
+                    result = self._search(request['call'], *request['args'])
+                else:
+                    result = getattr(data, request['call'])(*request['args'])
+            # Items of compiled command base are views, not dictionaries.
+            return json.dumps({'result': result}, default=dict)
+        except Exception as e:
+            return json.dumps({'error': '%s: %s' % (type(e).__name__, e)})
+
+    def _search(self, call, query, *args):
+        """Answer search as you type `call` of `query`."""
+        if call == 'search_count':
+            cursor = self.search.cursor(query)
+            return [cursor.count(), cursor.approximate]
+        return self.search.get_commands(query, *args)
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, path, idle_timeout):
+        self.timeout = idle_timeout
+        self.lock = threading.Lock()
+        """Serializes access to command base."""
+
+        self._clients = 0
+        self._idle = False
+        socketserver.UnixStreamServer.__init__(self, path, Handler)
+
+    def connected(self, delta):
+        """Count connected clients."""
+        with self.lock:
+            self._clients += delta
+
+    def handle_timeout(self):
+        with self.lock:
+            self._idle = self._clients == 0
+
+    def serve_until_idle(self):
+        while not self._idle:
+            self.handle_request()
+
+def main():
+    idle_timeout = IDLE_TIMEOUT
+    if len(sys.argv) > 1:
+        idle_timeout = float(sys.argv[1])
+
+    if remote.available():
+        # Server is already running.
+        return
+    try:
+        remote.private_dir()
+    except remote.RemoteError as e:
+        sys.exit(str(e))
+    if os.path.exists(remote.SOCKET_FILE):
+        # Stale socket of a dead server.
+        os.remove(remote.SOCKET_FILE)
+
+    old_umask = os.umask(0o077)
+    try:
+        server = Server(remote.SOCKET_FILE, idle_timeout)
+    finally:
+        os.umask(old_umask)
+
+    try:
+        server.serve_until_idle()
+    finally:
+        server.server_close()
+        os.remove(remote.SOCKET_FILE)
+
+if __name__ == '__main__':
+    main()
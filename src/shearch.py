@@ -5,171 +5,446 @@
 import curses
 import os
 import sys
+import threading
 
 import bindings
 import command_
-from db import data_json as data
+import listview
+import padpool
+import resolver
+import tracing
 
 # TODO: Replace current tags field with Textbox.
 
-def display_description(idx):
-    global commands, pad
+class Loader(threading.Thread):
+
+    """Calls `function` in background, `result` waits for its result."""
+
+    def __init__(self, function):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._function = function
+        self._result = None
+        self._error = None
+
+    def result(self):
+        """Return result of function, raise its exception if it failed."""
+        self.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def run(self):
+        try:
+            self._result = self._function()
+        except Exception as e:
+            self._error = e
+
+class Searcher(threading.Thread):
+
+    """
+    Runs queries of `submit` in background, so prompt never waits for
+    them. Only the newest query runs: queries submitted meanwhile replace
+    each other and results of stale ones are dropped when they finish.
+    """
+
+    def __init__(self, get_search, prefetch):
+        """
+        Initialize `Searcher` of `Search` returned by `get_search` (called
+        in background). First `prefetch` items of results are fetched in
+        background too.
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._get_search = get_search
+        self._prefetch = prefetch
+        self._condition = threading.Condition()
+
+        self._query = None
+        """Query waiting to run or None."""
+
+        self._generation = 0
+        """Incremented by every `submit`."""
+
+        self._done = (0, None)
+        """Generation and result of the last query, taken by `result`."""
+
+    def busy(self):
+        """Return True if result of the last query is not taken yet."""
+        with self._condition:
+            generation, result = self._done
+            return generation != self._generation or result is not None
+
+    def result(self, wait=False):
+        """
+        Return `Prefetched` cursor of the last query or None if it did
+        not finish (unless `wait`) or its result was taken already.
+        Raise exception of query if it failed.
+        """
+        with self._condition:
+            while wait and self._done[0] != self._generation:
+                self._condition.wait()
+            generation, result = self._done
+            if generation != self._generation or result is None:
+                return None
+            self._done = (generation, None)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._query is None:
+                    self._condition.wait()
+                query, generation = self._query, self._generation
+                self._query = None
+
+            try:
+                with tracing.span('query', query=query):
+                    result = Prefetched(self._get_search().cursor(query),
+                                        self._prefetch)
+            except Exception as e:
+                result = e
+
+            with self._condition:
+                if generation == self._generation:
+                    self._done = (generation, result)
+                    self._condition.notify_all()
+
+    def submit(self, query):
+        """Search `query` in background, see `result`."""
+        with self._condition:
+            self._generation += 1
+            self._query = query
+            self._condition.notify_all()
+
+class Prefetched(object):
+
+    """
+    `cursor` (see `db.backend`) with its first `limit` items fetched, so
+    showing them costs nothing.
+    """
+
+    def __init__(self, cursor, limit):
+        self._cursor = cursor
+        self._items = cursor.fetch(limit)
+        self._exhausted = len(self._items) < limit
+
+    def count(self):
+        return self._cursor.count()
+
+    def fetch(self, limit=None, offset=0):
+        end = None if limit is None else offset + limit
+        if self._exhausted or (end is not None and end <= len(self._items)):
+            return self._items[offset:end]
+        return self._cursor.fetch(limit, offset)
+
+RESOLVE_INTERVAL = 100
+"""Milliseconds between checks for resolved `%c` placeholders."""
+
+KEY_INTERVAL = 15
+"""
+Milliseconds to wait for next key while typing or searching. Keys typed
+faster are searched as one query, finished search is shown after it.
+"""
+
+stdscr = None
+"""Main terminal screen."""
 
-    index = idx - pad
+asterisk = 6
+"""Current asterisk position."""
 
-    if index < 0:
-        return
-    if index >= len(commands):
-        return
+key = ''
+"""Current character."""
 
-    commands[index].print_description()
+max_i = 9
+"""Maximum tag field length."""
 
-def edit_command(idx):
-    """Calls `Command`'s `texbox.edit()`."""
-    global commands, pad
+pad = 7
+"""Offset where commands are displayed."""
 
-    index = idx - pad
+right_edge_offset = 0.75
+"""Percent of characters that will be displayed until right edge."""
 
-    if index < 0:
-        return
-    if index >= len(commands):
-        return
+loader = None
+"""`Loader` of `search` while command base loads, see `get_search`."""
 
-    commands[index].get_input_field().move(0, 0)
-    commands[index].edit()
+searcher = None
+"""`Searcher` running queries of tags field."""
 
-def parse_tags(tag_field):
-    """Retrieves commands that matches entered tags."""
+search = None
+"""Search as you type. Narrows results of previous tags."""
 
-    global commands, pad, y_offset
+tag_field = ''
+"""Input field for tags."""
 
-    for n, item in enumerate(commands):
-        # Clear current commands.
-        stdscr.move(n + pad, 1)
-        stdscr.clrtoeol()
-        stdscr.refresh()
+y_offset = 5
+"""_y_ offset from left terminal screen edge."""
 
-    commands = []
-    items = data.get_commands(tag_field.split(' '))
+y_max = x_max = 0
+"""Size of current terminal screen, _x_ without the box (character width)."""
 
-    n_cols = 500
-    """Virtual window character width."""
+n_rows = 0
+"""Number of commands that fit above the bottom border."""
 
-    right_edge_offset = 0.75
-    """Percent of characters that will be displayed until right edge."""
+tab_offset = 0
+"""Number of characters tab characters to show."""
 
-    y_max, x_max = stdscr.getmaxyx()
-    x_max -= 2 # Must at least be -1 (window inside window).
-    """Character width of current terminal screen."""
+pads = None
+"""Input fields of visible commands."""
 
-    tab_offset = int(right_edge_offset * x_max)
-    """Number of characters tab characters to show."""
-
-    for n, item in enumerate(items):
-        if n >= len(input_fields):
-            # Add new input field at the end if there are none left available.
-            tmp_scr = curses.newpad(1, n_cols)
-            input_fields.append(tmp_scr)
-
-        command = command_.Command(
-            item,
-            (n + pad, y_offset, x_max),
-            input_fields[n],
-            tab_offset,
-            input_fields[n],
-            insert_mode=True
-        )
-        commands.append(command)
+view = None
+"""Commands visible on screen."""
 
-def print_command(idx):
-    global commands, pad
+def build_command(item, row):
+    """Create `Command` of `item` in `row`. Called by `ListView`."""
+    input_field = pads.get(len(item['command']))
+    return command_.Command(
+        item,
+        (row, y_offset, x_max),
+        input_field,
+        tab_offset,
+        input_field,
+        insert_mode=True
+    )
 
-    index = idx - pad
+@tracing.traced('load')
+def connect():
+    """Return command base, see `db.backend.connect`."""
+    from db import backend
+    return backend.connect()
 
-    if index < 0:
-        return
-    if index >= len(commands):
+def display_description(idx):
+    command = get_command(idx)
+    if command is None:
         return
 
-    # Python os.fdopen() Method [1]
-    # [1]: http://www.tutorialspoint.com/python/os_fdopen.htm
-    out = os.fdopen(3, 'w')
-    out.write(commands[index].get_command())
-    out.flush()
+    command.print_description()
 
-stdscr = curses.initscr()
-stdscr.box()
-#curses.cbreak()
-#curses.nocbreak()
-curses.noecho()
-#curses.echo()
-# Hide cursor.
-#curses.curs_set(0)
-stdscr.keypad(1)
+def edit_command(idx):
+    """Calls `Command`'s `texbox.edit()`."""
+    command = get_command(idx)
+    if command is None:
+        return
 
-# TODO: Remove this debug hack.
-command_.stdscr = stdscr
-"""Set Command's global, main terminal screen."""
+    command.get_input_field().move(0, 0)
+    command.edit()
 
-asterisk = 6
-"""Current asterisk position."""
+def get_search():
+    """Return `search`, wait for command base if it is still loading."""
+    global search
 
-commands = []
-"""Global list of commands that instanciate class Command."""
+    if search is None:
+        search = loader.result()
+    return search
 
-input_fields = []
-"""Global list of input_fields."""
+def get_command(idx):
+    """Return `Command` shown in row `idx` or None."""
+    global pad
 
-key = ''
-"""Current character."""
+    if idx < pad:
+        return None
+    return view.get(idx - pad)
 
-max_i = 9
-"""Maximum tag field length."""
+@tracing.traced()
+def show_results(cursor):
+    """Show items of `cursor` instead of previous results."""
+    shown = view.rows()
+    view.reset(cursor)
 
-pad = 7
-"""Offset where commands are displayed."""
+    for n in range(view.rows(), shown):
+        # Clear rows that had commands in previous frame.
+        stdscr.move(n + pad, 1)
+        stdscr.clrtoeol()
 
-tag_field = ''
-"""Input field for tags."""
+def print_command(idx):
+    command = get_command(idx)
+    if command is None:
+        return
 
-y_offset = 5
-"""_y_ offset from left terminal screen edge."""
+    # Python os.fdopen() Method [1]
+    # [1]: http://www.tutorialspoint.com/python/os_fdopen.htm
+    out = os.fdopen(3, 'w')
+    out.write(command.get_command())
+    out.flush()
 
-stdscr.addstr(0, y_offset, "Hit 'enter' to place command in command line.")
-stdscr.addstr(y_offset, 1, " * tags: ")
-stdscr.refresh()
-
-while key not in bindings.enter:
-    key = stdscr.getch()
-
-    if key in bindings.prev:
-        stdscr.addstr(asterisk, 2, ' ')
-        asterisk -= 1
-        stdscr.addstr(asterisk, 2, '*')
-        display_description(asterisk)
-    elif key in bindings.next:
-        stdscr.addstr(asterisk, 2, ' ')
-        asterisk += 1
-        stdscr.addstr(asterisk, 2, '*')
-        display_description(asterisk)
-    elif key in bindings.back:
-        if max_i > pad:
-            max_i -= 1
-        stdscr.move(y_offset, max_i + 1)
-    elif key in bindings.frwd:
-        max_i += 1
-        stdscr.move(y_offset, max_i + 1)
-    elif key in bindings.space:
-        max_i += 1
-        stdscr.addstr(y_offset, max_i, ' ')
-        parse_tags(tag_field)
-        tag_field += ' '
-    elif key is bindings.TAB:
-        edit_command(asterisk)
-    elif key <= 0xff:
-        max_i += 1
-        tag_field += chr(key)
-        stdscr.addstr(y_offset, max_i, chr(key))
-
-curses.endwin()
-print_command(asterisk)
\ No newline at end of file
+    from db import usage
+    usage.record(command.get_item()['command'])
+
+@tracing.traced()
+def render():
+    """Update terminal with everything staged since the last call."""
+    # Cursor stays in tags field.
+    stdscr.move(y_offset, max_i + 1)
+    stdscr.noutrefresh()
+    curses.doupdate()
+
+def show_searched(wait=False):
+    """
+    Show results of the last query of `searcher` if it finished (or
+    `wait` for it). Return True if results changed.
+    """
+    cursor = searcher.result(wait)
+    if cursor is None:
+        return False
+    show_results(cursor)
+    return True
+
+def show_resolved():
+    """
+    Replace `%c` placeholders of visible commands resolved meanwhile.
+
+    Return True if any command changed.
+    """
+    changed = False
+    for c, output in resolver.completed():
+        for command in view.commands():
+            changed = command.resolve(c, output) or changed
+    return changed
+
+def release_command(command):
+    """Return input field of `Command` dropped by `ListView` to pool."""
+    pads.put(command.get_input_field())
+
+@tracing.traced()
+def init(screen, data=None):
+    """
+    Draw empty UI in `screen` and prepare search of `data` (see `connect`).
+
+    Without `data`, `loader` has to be started to load command base. Does
+    not touch terminal itself, so `screen` may be any object with methods
+    of curses window (benchmarks use a stand-in).
+    """
+    global stdscr, search, y_max, x_max, n_rows, tab_offset, pads, view
+
+    stdscr = screen
+    stdscr.box()
+    stdscr.keypad(1)
+    # Wake up now and then to show resolved `%c` placeholders.
+    stdscr.timeout(RESOLVE_INTERVAL)
+
+    # TODO: Remove this debug hack.
+    command_.stdscr = stdscr
+    """Set Command's global, main terminal screen."""
+
+    if data is not None:
+        search = data.Search()
+    y_max, x_max = stdscr.getmaxyx()
+    x_max -= 2 # Must at least be -1 (window inside window).
+    n_rows = max(y_max - pad - 1, 0)
+    tab_offset = int(right_edge_offset * x_max)
+    pads = padpool.PadPool(n_rows, x_max)
+    view = listview.ListView(build_command, release_command, pad, n_rows)
+
+    stdscr.addstr(0, y_offset, "Hit 'enter' to place command in command line.")
+    stdscr.addstr(y_offset, 1, " * tags: ")
+
+def interact(screen):
+    """Show search in `screen` until user chooses command with enter."""
+    global asterisk, key, loader, max_i, searcher, tag_field
+
+    #curses.cbreak()
+    #curses.nocbreak()
+    curses.noecho()
+    #curses.echo()
+    # Hide cursor.
+    #curses.curs_set(0)
+    init(screen)
+    stdscr.refresh()
+    # Prompt is shown, command base loads while user types.
+    loader = Loader(lambda: connect().Search())
+    loader.start()
+    # Only `searcher` uses `search` from now on.
+    searcher = Searcher(get_search, 2 * n_rows)
+    searcher.start()
+    # Tags field changed since last query.
+    typed = False
+
+    while key not in bindings.enter:
+        if typed or searcher.busy():
+            stdscr.timeout(KEY_INTERVAL)
+        else:
+            stdscr.timeout(RESOLVE_INTERVAL)
+        key = stdscr.getch()
+
+        if key == -1:
+            # No key pressed meanwhile, typing paused.
+            if typed:
+                searcher.submit(tag_field)
+                typed = False
+            changed = show_searched()
+            if not show_resolved() and not changed:
+                continue
+        elif key in bindings.prev:
+            if asterisk == pad and view.scroll(-1):
+                display_description(asterisk)
+            else:
+                stdscr.addstr(asterisk, 2, ' ')
+                asterisk -= 1
+                stdscr.addstr(asterisk, 2, '*')
+                display_description(asterisk)
+        elif key in bindings.next:
+            if asterisk == pad + n_rows - 1:
+                # Last row, scroll instead of leaving the box.
+                if view.scroll(1):
+                    display_description(asterisk)
+            else:
+                stdscr.addstr(asterisk, 2, ' ')
+                asterisk += 1
+                stdscr.addstr(asterisk, 2, '*')
+                display_description(asterisk)
+        elif key in bindings.back:
+            if max_i > pad:
+                max_i -= 1
+            stdscr.move(y_offset, max_i + 1)
+        elif key in bindings.frwd:
+            max_i += 1
+            stdscr.move(y_offset, max_i + 1)
+        elif key in bindings.space:
+            max_i += 1
+            stdscr.addstr(y_offset, max_i, ' ')
+            tag_field += ' '
+            typed = True
+        elif key in bindings.backspace:
+            if tag_field:
+                stdscr.addstr(y_offset, max_i, ' ')
+                max_i -= 1
+                stdscr.move(y_offset, max_i + 1)
+                tag_field = tag_field[:-1]
+                typed = True
+        elif key is bindings.TAB:
+            edit_command(asterisk)
+        elif key <= 0xff and key not in bindings.enter:
+            max_i += 1
+            tag_field += chr(key)
+            stdscr.addstr(y_offset, max_i, chr(key))
+            typed = True
+
+        render()
+
+    # Chosen row refers to results of tags as typed.
+    if typed:
+        searcher.submit(tag_field)
+    if searcher.busy():
+        show_searched(wait=True)
+
+def main():
+    if sys.argv[1:]:
+        # Interactive search takes no arguments, argparse is not loaded
+        # for it.
+        import cli
+        args = cli.parser().parse_args()
+        if args.query or args.batch:
+            return cli.run(args)
+
+    screen = curses.initscr()
+    try:
+        interact(screen)
+    finally:
+        # Restore terminal also when command base failed to load.
+        curses.endwin()
+    print_command(asterisk)
+
+if __name__ == '__main__':
+    sys.exit(main())
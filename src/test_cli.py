@@ -0,0 +1,165 @@
+"""This tests non-interactive query module."""
+
+import errno
+import io
+import json
+import sys
+import unittest
+
+import cli
+from db import data_json
+
+class Cursor(object):
+
+    """Cursor of `items` counting iterated ones."""
+
+    def __init__(self, items):
+        self.items = items
+        self.iterated = 0
+
+    def __iter__(self):
+        for item in self.items:
+            self.iterated += 1
+            yield item
+
+    def count(self):
+        return len(self.items)
+
+class Data(object):
+
+    """Command base of one `Cursor` for every query."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self, tags, prefix=False, approximate=False):
+        return self._cursor
+
+class BrokenPipe(io.BytesIO):
+
+    """Standard output whose reader went away after `size` bytes."""
+
+    def __init__(self, size=0, error=errno.EPIPE):
+        io.BytesIO.__init__(self)
+        self._size = size
+        self._error = error
+
+    def write(self, data):
+        if self.tell() + len(data) > self._size:
+            raise IOError(self._error, 'Broken pipe')
+        return io.BytesIO.write(self, data)
+
+class TestRun(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = sys.stdin, sys.stdout
+        sys.stdout = io.BytesIO()
+
+    def tearDown(self):
+        sys.stdin, sys.stdout = self.saved
+
+    def run_cli(self, argv, data=data_json, stdin=u''):
+        """Return exit status and output of `cli.run` of `argv`."""
+        sys.stdin = io.StringIO(stdin)
+        status = cli.run(cli.parser().parse_args(argv), data)
+        return status, sys.stdout.getvalue()
+
+    def test_tsv(self):
+        status, output = self.run_cli(['--query', 'git', 'status'])
+        self.assertEqual(status, 0)
+        lines = output.decode('utf-8').splitlines()
+        self.assertEqual(lines, [
+            u'%s\t%s\t%s' % (item['command'], item['description'],
+                             u' '.join(item['tag']))
+            for item in data_json.get_commands([u'git', u'status'])
+        ])
+
+    def test_tsv_separators(self):
+        item = {u'command': u'printf "a\\tb"\n', u'description': u'x\ty',
+                u'tag': [u'printf']}
+        status, output = self.run_cli(['-q', 'printf'], Data(Cursor([item])))
+        self.assertEqual(output, b'printf "a\\tb" \tx y\tprintf\n')
+
+    def test_json(self):
+        status, output = self.run_cli(['-q', 'git', '-f', 'json'])
+        self.assertEqual(status, 0)
+        self.assertEqual([json.loads(line)
+                          for line in output.decode('utf-8').splitlines()],
+                         [dict(item)
+                          for item in data_json.get_commands([u'git'])])
+
+    def test_nul(self):
+        status, output = self.run_cli(['-q', 'git', '-f', 'nul'])
+        self.assertEqual(status, 0)
+        self.assertEqual(output, b''.join(
+            item['command'].encode('utf-8') + b'\0'
+            for item in data_json.get_commands([u'git'])))
+
+    def test_no_results(self):
+        self.assertEqual(self.run_cli(['-q', 'missing-tag']), (1, b''))
+
+    def test_approximate(self):
+        self.assertEqual(self.run_cli(['-q', 'gti', 'stauts']), (1, b''))
+        status, output = self.run_cli(['-q', 'gti', 'stauts', '-a',
+                                       '-f', 'nul'])
+        self.assertEqual(status, 0)
+        self.assertEqual(output.split(b'\0')[0], b'git status')
+
+    def test_limit(self):
+        cursor = Cursor([{u'command': u'c%d' % n, u'description': u'',
+                          u'tag': []} for n in range(10)])
+        status, output = self.run_cli(['-q', 'c', '-n', '2', '-f', 'nul'],
+                                      Data(cursor))
+        self.assertEqual(output, b'c0\0c1\0')
+        # Items are written as they are found, not collected first.
+        self.assertEqual(cursor.iterated, 2)
+
+    def test_batch(self):
+        queries = u'git status\n\nmissing-tag\ngit status\n'
+        expected = [item['command'].encode('utf-8')
+                    for item in data_json.get_commands([u'git', u'status'])]
+
+        status, output = self.run_cli(['--batch', '-f', 'nul'],
+                                      stdin=queries)
+        self.assertEqual(status, 0)
+        # Results of every query end with an empty record.
+        self.assertEqual(output.split(b'\0'),
+                         expected + [b'', b'', b''] + expected + [b'', b''])
+
+        sys.stdout = io.BytesIO()
+        status, output = self.run_cli(['-b'], stdin=queries)
+        # Or an empty line.
+        lines = [line.split(b'\t')[0] for line in output.split(b'\n')]
+        self.assertEqual(lines,
+                         expected + [b'', b'', b''] + expected + [b'', b''])
+
+        sys.stdout = io.BytesIO()
+        status, output = self.run_cli(['-b', '-f', 'json'], stdin=queries)
+        lists = [json.loads(line)
+                 for line in output.decode('utf-8').splitlines()]
+        self.assertEqual([len(items) for items in lists],
+                         [len(expected), 0, 0, len(expected)])
+
+    def test_batch_no_results(self):
+        self.assertEqual(self.run_cli(['-b', '-f', 'json'],
+                                      stdin=u'missing-tag\n'),
+                         (1, b'[]\n'))
+
+    def test_broken_pipe(self):
+        cursor = Cursor([{u'command': u'c%d' % n, u'description': u'',
+                          u'tag': []} for n in range(1000)])
+        sys.stdout = BrokenPipe(len(b'c0\0c1\0'))
+        status, output = self.run_cli(['-q', 'c', '-f', 'nul'], Data(cursor))
+        # Reader has seen enough, that is not an error.
+        self.assertEqual(status, 0)
+        self.assertEqual(output, b'c0\0c1\0')
+        self.assertEqual(cursor.iterated, 3)
+
+        sys.stdout = BrokenPipe(error=errno.ENOSPC)
+        self.assertRaises(IOError, self.run_cli, ['-q', 'git'])
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
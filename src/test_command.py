@@ -0,0 +1,172 @@
+"""This tests command editing module."""
+
+import random
+import unittest
+
+import benchmark
+import bindings
+import command_
+import resolver
+
+def command(text, mask=None, args=None):
+    """Return `command_.Command` of `text` drawn on `benchmark.Window`."""
+    item = {'command': text, 'description': '', 'tag': []}
+    if mask is not None:
+        item['nix_edit'] = {'mask': mask, 'args': args}
+    pad = benchmark.Window(1, 80)
+    return command_.Command(item, (7, 5, 78), pad, 58, pad, insert_mode=True)
+
+class TestTabStops(unittest.TestCase):
+
+    def setUp(self):
+        # Arguments "msg" at 14 and "bob" at 27.
+        self.command = command('', 'git commit -m %s --author %s',
+                               ['msg', 'bob'])
+
+    def assertStops(self, stops):
+        self.assertEqual(self.command._index_tab, sorted(stops))
+        self.assertEqual(self.command._tab_value, stops)
+        for pos, word in stops.items():
+            self.assertEqual(self.command.get_command()[pos:pos + len(word)],
+                             word)
+
+    def test_init(self):
+        self.assertEqual(self.command.get_command(),
+                         'git commit -m msg --author bob')
+        self.assertStops({14: 'msg', 27: 'bob'})
+
+    def test_edit_before(self):
+        self.command._replace(0, 3, 'hg')
+        self.assertStops({13: 'msg', 26: 'bob'})
+        self.assertEqual(self.command._detect_broken_args(),
+                         (False, '', -1, -1))
+
+    def test_edit_between(self):
+        self.command._replace(18, 18, 'x')
+        self.assertStops({14: 'msg', 28: 'bob'})
+
+    def test_edit_inside(self):
+        self.command._replace(15, 16, 'XY')
+        self.assertStops({14: 'mXYg', 28: 'bob'})
+        self.assertEqual(self.command._detect_broken_args(),
+                         (True, 'msg', 14, 17))
+
+    def test_edit_across(self):
+        # Edit starting before argument takes it in.
+        self.command._replace(12, 15, 'A')
+        self.assertStops({12: 'Asg', 25: 'bob'})
+
+    def test_extend(self):
+        self.command._replace(17, 17, 'x')
+        self.assertStops({14: 'msgx', 28: 'bob'})
+        # Space ends argument.
+        self.command._replace(18, 18, ' ')
+        self.assertStops({14: 'msgx', 29: 'bob'})
+
+    def test_delete_argument(self):
+        self.command._replace(14, 17, '')
+        self.assertStops({24: 'bob'})
+
+    def test_edit_after(self):
+        self.command._replace(30, 30, ' -q')
+        self.assertStops({14: 'msg', 27: 'bob'})
+        self.command._replace(31, 33, '')
+        self.assertStops({14: 'msg', 27: 'bob'})
+
+class TestEdit(unittest.TestCase):
+
+    def setUp(self):
+        self.command = command('git commit -m msg')
+
+    def test_replace(self):
+        self.command._replace(4, 10, 'ci')
+        self.assertEqual(self.command.get_command(), 'git ci -m msg')
+        self.command._replace(13, 13, ' -q')
+        self.command._replace(0, 0, 'sudo ')
+        self.assertEqual(self.command.get_command(),
+                         'sudo git ci -m msg -q')
+
+    def test_set_command(self):
+        self.command._set_command('git commit --amend -m msg')
+        self.assertEqual(self.command.get_command(),
+                         'git commit --amend -m msg')
+
+    def test_cut(self):
+        self.command._edit(10, bindings.CTRL_K)
+        self.assertEqual(self.command._yank, ' -m msg')
+        self.assertEqual(self.command.get_command(), 'git commit')
+        self.command._edit(10, bindings.CTRL_W)
+        self.assertEqual(self.command._yank, 'commit')
+        self.command._edit(4, bindings.CTRL_U)
+        self.assertEqual(self.command._yank, 'git ')
+        self.assertEqual(self.command.get_command(), '')
+
+class TestResolve(unittest.TestCase):
+
+    def setUp(self):
+        self.get = resolver.get
+        self.outputs = {}
+        resolver.get = self.outputs.get
+        self.command = command('', 'cd %c', ['git rev-parse --show-toplevel'])
+
+    def tearDown(self):
+        resolver.get = self.get
+
+    def test_resolved(self):
+        self.assertEqual(self.command.get_command(),
+                         'cd $(git rev-parse --show-toplevel)')
+        self.outputs['git rev-parse --show-toplevel'] = '/src'
+        self.assertTrue(self.command.resolve('git rev-parse --show-toplevel',
+                                             '/src'))
+        self.assertEqual(self.command.get_command(), 'cd /src')
+        self.assertFalse(self.command.resolve('git rev-parse --show-toplevel',
+                                              '/src'))
+
+    def test_failed(self):
+        self.outputs['git rev-parse --show-toplevel'] = resolver.FAILED
+        # Row is redrawn, shell runs the command when it is chosen.
+        self.assertTrue(self.command.resolve('git rev-parse --show-toplevel',
+                                             resolver.FAILED))
+        self.assertEqual(self.command.get_command(),
+                         'cd $(git rev-parse --show-toplevel)')
+        self.assertEqual(self.command._pending, set())
+        # Cached failure is not waited for.
+        self.outputs['false'] = resolver.FAILED
+        failed = command('', 'cd %c', ['false'])
+        self.assertEqual(failed.get_command(), 'cd $(false)')
+        self.assertEqual(failed._pending, set())
+
+class TestWords(unittest.TestCase):
+
+    def setUp(self):
+        self.command = command('git log --oneline -n 10')
+
+    def test_motions(self):
+        self.assertEqual(self.command._word_starts, [0, 4, 10, 19, 21])
+        self.assertEqual(self.command._next_word(0), 4)
+        self.assertEqual(self.command._next_word(3), 10)
+        self.assertEqual(self.command._next_word(21), 23)
+        self.assertEqual(self.command._prev_word(10), 4)
+        self.assertEqual(self.command._prev_word(12), 10)
+        self.assertEqual(self.command._prev_word(0), 0)
+
+    def test_random_edits(self):
+        rng = random.Random(0)
+        for n in range(500):
+            text = self.command.get_command()
+            start = rng.randint(0, len(text))
+            end = rng.randint(start, min(start + 4, len(text)))
+            insert = ''.join(rng.choice('ab_1 -.')
+                             for m in range(rng.randint(0, 3)))
+            self.command._replace(start, end, insert)
+
+            word_starts = list(self.command._word_starts)
+            self.command._index_words()
+            self.assertEqual(word_starts, self.command._word_starts,
+                             repr(self.command.get_command()))
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
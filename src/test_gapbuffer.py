@@ -0,0 +1,89 @@
+"""This tests edit buffer module."""
+
+import random
+import unittest
+
+import gapbuffer
+
+class TestGapBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = gapbuffer.GapBuffer('git status')
+
+    def assertText(self, text):
+        self.assertEqual(self.buffer.text(), text)
+        self.assertEqual(len(self.buffer), len(text))
+        self.assertEqual(self.buffer[:], text)
+
+    def test_init(self):
+        self.assertText('git status')
+        self.assertEqual(gapbuffer.GapBuffer().text(), '')
+        self.assertEqual(len(gapbuffer.GapBuffer()), 0)
+
+    def test_insert_at_gap(self):
+        self.buffer.replace(3, 3, ' -C')
+        self.assertText('git -C status')
+        # Gap stays after the insert, typing goes on there.
+        self.buffer.replace(6, 6, ' .')
+        self.assertText('git -C . status')
+
+    def test_delete_at_gap(self):
+        self.buffer.replace(10, 10, 'x')
+        self.buffer.replace(10, 11, '')
+        self.assertText('git status')
+        self.buffer.replace(9, 10, '')
+        self.buffer.replace(8, 9, '')
+        self.assertText('git stat')
+
+    def test_move_gap(self):
+        self.buffer.replace(0, 3, 'hg')
+        self.assertText('hg status')
+        self.buffer.replace(9, 9, ' -v')
+        self.assertText('hg status -v')
+        self.buffer.replace(2, 3, '')
+        self.assertText('hgstatus -v')
+
+    def test_grow(self):
+        text = 'x' * 1000
+        self.buffer.replace(4, 4, text)
+        self.assertText('git ' + text + 'status')
+        for n in range(100):
+            self.buffer.replace(4 + n, 4 + n, 'y')
+        self.assertText('git ' + 'y' * 100 + text + 'status')
+
+    def test_getitem(self):
+        self.buffer.replace(3, 4, '_')
+        self.assertEqual(self.buffer[0], 'g')
+        self.assertEqual(self.buffer[3], '_')
+        self.assertEqual(self.buffer[5], 't')
+        self.assertEqual(self.buffer[-1], 's')
+        self.assertRaises(IndexError, lambda: self.buffer[10])
+        self.assertRaises(IndexError, lambda: self.buffer[-11])
+        self.assertEqual(self.buffer[2:6], 't_st')
+        self.assertEqual(self.buffer[5:], 'tatus')
+        self.assertEqual(self.buffer[:-7], 'git')
+        self.assertEqual(self.buffer[8:2], '')
+
+    def test_random(self):
+        rng = random.Random(0)
+        text = 'git status'
+        for n in range(500):
+            start = rng.randint(0, len(text))
+            end = rng.randint(start, min(start + 3, len(text)))
+            insert = ''.join(rng.choice('ab ')
+                             for m in range(rng.randint(0, 4)))
+            self.buffer.replace(start, end, insert)
+            text = text[:start] + insert + text[end:]
+            if n % 7 == 0:
+                # Reading joined text must not disturb the gap.
+                self.assertText(text)
+            else:
+                self.assertEqual(self.buffer[start:start + len(insert)],
+                                 insert)
+        self.assertText(text)
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
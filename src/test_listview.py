@@ -0,0 +1,152 @@
+"""This tests virtual list of query results module."""
+
+import unittest
+
+import listview
+
+class Cursor(object):
+
+    """Cursor of `items` recording fetched pages."""
+
+    def __init__(self, items):
+        self.items = items
+        self.fetches = []
+
+    def fetch(self, limit=None, offset=0):
+        self.fetches.append((limit, offset))
+        return self.items[offset:offset + limit]
+
+class Command(object):
+
+    """Stand-in of `command_.Command` remembering its row."""
+
+    def __init__(self, item, row):
+        self.item = item
+        self.row = row
+
+    def get_item(self):
+        return self.item
+
+    def move(self, row):
+        self.row = row
+
+def cursor(*commands):
+    return Cursor([{'command': command} for command in commands])
+
+class TestListView(unittest.TestCase):
+
+    def setUp(self):
+        self.built = []
+        self.released = []
+        self.view = listview.ListView(self.build, self.released.append, 5, 3)
+
+    def build(self, item, row):
+        command = Command(item, row)
+        self.built.append(command)
+        return command
+
+    def assertRows(self, commands):
+        """Assert that rows show `commands` in order, first row first."""
+        rows = [self.view.get(row) for row in range(self.view.rows())]
+        self.assertEqual([command.item['command'] for command in rows],
+                         commands)
+        self.assertEqual([command.row for command in rows],
+                         list(range(5, 5 + len(commands))))
+
+    def built_commands(self):
+        result = [command.item['command'] for command in self.built]
+        del self.built[:]
+        return result
+
+    def test_reset(self):
+        results = cursor(*'abcdefghij')
+        self.view.reset(results)
+        self.assertRows(['a', 'b', 'c'])
+        self.assertEqual(self.built_commands(), ['a', 'b', 'c'])
+        # A page ahead only.
+        self.assertEqual(results.fetches, [(6, 0)])
+
+    def test_reset_keeps_rows(self):
+        self.view.reset(cursor('a', 'b', 'c', 'd'))
+        kept = [self.view.get(0), self.view.get(2)]
+        dropped = self.view.get(1)
+        del self.built[:]
+
+        self.view.reset(cursor('a', 'x', 'c'))
+        self.assertRows(['a', 'x', 'c'])
+        # Only the changed row is rebuilt.
+        self.assertEqual(self.built_commands(), ['x'])
+        self.assertEqual(self.released, [dropped])
+        self.assertEqual([self.view.get(0), self.view.get(2)], kept)
+
+    def test_reset_moved_rows(self):
+        self.view.reset(cursor('a', 'b', 'c'))
+        old = self.view.commands()
+        del self.built[:]
+        # Same results in other rows are drawn again.
+        self.view.reset(cursor('b', 'c', 'a'))
+        self.assertRows(['b', 'c', 'a'])
+        self.assertEqual(self.built_commands(), ['b', 'c', 'a'])
+        self.assertEqual(sorted(id(command) for command in self.released),
+                         sorted(id(command) for command in old))
+
+    def test_reset_fewer(self):
+        self.view.reset(cursor('a', 'b', 'c'))
+        dropped = [self.view.get(1), self.view.get(2)]
+        self.view.reset(cursor('a'))
+        self.assertRows(['a'])
+        self.assertEqual(self.released, dropped)
+
+        self.view.reset(cursor())
+        self.assertEqual(self.view.rows(), 0)
+        self.assertEqual(len(self.released), 3)
+
+    def test_reset_scrolled(self):
+        self.view.reset(cursor(*'abcde'))
+        self.view.scroll(2)
+        del self.built[:]
+        del self.released[:]
+        # Rows are compared as shown, not by result index.
+        self.view.reset(cursor('c', 'x', 'y'))
+        self.assertRows(['c', 'x', 'y'])
+        self.assertEqual(self.built_commands(), ['x', 'y'])
+        self.assertEqual(len(self.released), 2)
+
+    def test_scroll(self):
+        results = cursor(*'abcdefghij')
+        self.view.reset(results)
+        first = self.view.get(0)
+        moved = [self.view.get(1), self.view.get(2)]
+        del self.built[:]
+
+        self.assertTrue(self.view.scroll(1))
+        self.assertRows(['b', 'c', 'd'])
+        self.assertEqual(self.built_commands(), ['d'])
+        self.assertEqual(self.released, [first])
+        # Kept commands move up a row.
+        self.assertEqual([self.view.get(0), self.view.get(1)], moved)
+
+        self.assertTrue(self.view.scroll(3))
+        self.assertRows(['e', 'f', 'g'])
+        self.assertEqual(results.fetches, [(6, 0), (4, 6)])
+        self.assertEqual(len(self.released), 4)
+
+    def test_scroll_bounds(self):
+        self.view.reset(cursor(*'abcde'))
+        self.assertFalse(self.view.scroll(-1))
+        self.assertTrue(self.view.scroll(10))
+        # Last result stays in the last row.
+        self.assertRows(['c', 'd', 'e'])
+        self.assertFalse(self.view.scroll(1))
+        self.assertTrue(self.view.scroll(-10))
+        self.assertRows(['a', 'b', 'c'])
+        self.assertEqual(self.view.rows(), len(self.view.commands()))
+
+        self.view.reset(cursor('a'))
+        self.assertFalse(self.view.scroll(1))
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
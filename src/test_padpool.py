@@ -0,0 +1,89 @@
+"""This tests reusable pads module."""
+
+import random
+import unittest
+
+import benchmark
+import padpool
+
+class Curses(benchmark.Curses):
+
+    """`benchmark.Curses` counting created pads."""
+
+    def __init__(self):
+        self.pads = 0
+
+    def newpad(self, rows, cols):
+        self.pads += 1
+        return benchmark.Curses.newpad(self, rows, cols)
+
+def width(pad):
+    return pad.getmaxyx()[1]
+
+class TestPadPool(unittest.TestCase):
+
+    def setUp(self):
+        self.curses = padpool.curses
+        padpool.curses = self.fake = Curses()
+        self.pool = padpool.PadPool(3, 10)
+
+    def tearDown(self):
+        padpool.curses = self.curses
+
+    def test_width(self):
+        self.assertEqual(width(self.pool.get(2)), 10)
+        # Cursor needs a column after the text.
+        self.assertEqual(width(self.pool.get(20)), 21)
+
+    def test_reuse(self):
+        narrow, wide = self.pool.get(5), self.pool.get(30)
+        wide.addstr(0, 0, 'git status')
+        self.pool.put(wide)
+        self.pool.put(narrow)
+
+        # Narrowest pad that fits.
+        self.assertTrue(self.pool.get(4) is narrow)
+        pad = self.pool.get(12)
+        self.assertTrue(pad is wide)
+        # Pads come back empty.
+        self.assertEqual(pad.instr(0, 0, 10), b' ' * 10)
+        self.assertEqual(self.fake.pads, 2)
+
+    def test_grow(self):
+        self.pool.put(self.pool.get(5))
+        pad = self.pool.get(40)
+        self.assertEqual(width(pad), 41)
+        self.assertEqual(self.fake.pads, 1)
+
+    def test_limit(self):
+        pads = [self.pool.get(n) for n in range(5)]
+        for pad in pads:
+            self.pool.put(pad)
+        # Pads over limit are dropped.
+        self.assertEqual(len(self.pool._free), 3)
+        pads = [self.pool.get(n) for n in range(5)]
+        self.assertEqual(self.fake.pads, 7)
+
+    def test_random(self):
+        rng = random.Random(0)
+        used = []
+        for n in range(1000):
+            if used and rng.random() < 0.5:
+                self.pool.put(used.pop(rng.randrange(len(used))))
+            else:
+                length = rng.randint(0, 60)
+                pad = self.pool.get(length)
+                self.assertTrue(width(pad) > length)
+                self.assertFalse(any(pad is other for other in used))
+                used.append(pad)
+            # Pool never holds more than limit pads, given out included
+            # unless more are in use.
+            self.assertTrue(len(self.pool._free) + len(used) <=
+                            max(3, len(used)))
+            self.assertEqual(self.pool._used, len(used))
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
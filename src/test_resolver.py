@@ -0,0 +1,71 @@
+"""This tests asynchronous placeholder resolution module."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import resolver
+
+class TestRun(unittest.TestCase):
+
+    def test_output(self):
+        self.assertEqual(resolver.run('echo " hi "'), 'hi')
+
+    def test_failure(self):
+        self.assertEqual(resolver.run('echo partial; exit 3'), None)
+
+    def test_timeout(self):
+        start = time.time()
+        # Children of shell are killed with it, they keep stdout open.
+        self.assertEqual(resolver.run('sleep 10 & sleep 10; echo late',
+                                      0.2), None)
+        self.assertTrue(time.time() - start < 5)
+
+class TestGet(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.saved = resolver.CACHE_FILE, resolver.TIMEOUT
+        resolver.CACHE_FILE = os.path.join(self.tmp_dir, 'cache')
+        resolver.TIMEOUT = 0.2
+        resolver._cache = None
+        resolver.completed()
+
+    def tearDown(self):
+        resolver.CACHE_FILE, resolver.TIMEOUT = self.saved
+        resolver._cache = None
+        shutil.rmtree(self.tmp_dir)
+
+    def wait(self):
+        """Return `resolver.completed` once anything completed."""
+        for n in range(500):
+            result = resolver.completed()
+            if result:
+                return result
+            time.sleep(0.01)
+        self.fail('Nothing completed.')
+
+    def test_output(self):
+        self.assertEqual(resolver.get('echo x'), None)
+        self.assertEqual(self.wait(), [('echo x', 'x')])
+        self.assertEqual(resolver.get('echo x'), 'x')
+
+    def test_failure(self):
+        for command in ('exit 1', 'sleep 10'):
+            self.assertEqual(resolver.get(command), None)
+            self.assertEqual(self.wait(), [(command, resolver.FAILED)])
+            # Failure is cached, it is not pending again.
+            self.assertEqual(resolver.get(command), resolver.FAILED)
+            self.assertEqual(resolver._pending, set())
+
+        # Also across sessions.
+        resolver._cache = None
+        self.assertEqual(resolver.get('exit 1'), resolver.FAILED)
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
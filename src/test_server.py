@@ -0,0 +1,105 @@
+"""This tests command base server and its remote client."""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import server
+from db import remote
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.socket_file = remote.SOCKET_FILE
+        self.page_size = remote.PAGE_SIZE
+        remote.SOCKET_FILE = os.path.join(self.tmp_dir, 'server.sock')
+        remote._connection = None
+
+    def tearDown(self):
+        self.disconnect()
+        remote.SOCKET_FILE = self.socket_file
+        remote.PAGE_SIZE = self.page_size
+        shutil.rmtree(self.tmp_dir)
+
+    def disconnect(self):
+        if remote._connection is not None:
+            remote._connection.close()
+            remote._connection = None
+
+    def serve(self, idle_timeout=0.1):
+        """Return thread of `server.Server` serving until idle."""
+        instance = server.Server(remote.SOCKET_FILE, idle_timeout)
+        thread = threading.Thread(target=instance.serve_until_idle)
+        thread.daemon = True
+        thread.start()
+
+        def stop():
+            # Client is disconnected by tearDown, server gets idle.
+            thread.join(5)
+            instance.server_close()
+        self.addCleanup(stop)
+        return thread
+
+    def test_search(self):
+        self.serve()
+        local = server.data.Search().cursor('git s')
+        cursor = remote.Search().cursor('git s')
+        self.assertEqual(cursor.count(), local.count())
+        self.assertEqual(cursor.approximate, local.approximate)
+        self.assertEqual(cursor.fetch(), local.fetch())
+
+        git = server.data.Search().cursor('git')
+        self.assertTrue(git.count() > 2)
+        remote.PAGE_SIZE = 2
+        cursor = remote.Search().cursor('git')
+        self.assertEqual(cursor.fetch(2, 1), git.fetch(2, 1))
+        # Iterated page by page.
+        self.assertEqual(list(cursor), git.fetch())
+        self.assertEqual(remote.get_commands(['git'], limit=1),
+                         server.data.get_commands(['git'], limit=1))
+
+        cursor = remote.cursor(['git'], True)
+        self.assertEqual(cursor.count(), server.data.count(['git'], True))
+        self.assertFalse(cursor.approximate)
+        self.assertEqual(list(cursor), server.data.get_commands(['git'], True))
+
+    def test_error(self):
+        self.serve()
+        self.assertRaises(remote.RemoteError, remote.call, 'iterate')
+        self.assertRaises(remote.RemoteError, remote.call, 'count')
+        # Connection is still usable.
+        self.assertEqual(remote.count(['git']), server.data.count(['git']))
+
+    def test_not_running(self):
+        self.assertFalse(remote.available())
+        self.assertRaises(remote.RemoteError, remote.count, ['git'])
+
+    def test_private(self):
+        self.serve()
+        os.chmod(self.tmp_dir, 0o755)
+        try:
+            # Other users could replace server.
+            self.assertFalse(remote.available())
+        finally:
+            os.chmod(self.tmp_dir, 0o700)
+        self.assertTrue(remote.available())
+
+    def test_idle(self):
+        thread = self.serve()
+        remote.count(['git'])
+        time.sleep(0.3)
+        # Connected client keeps server running.
+        self.assertTrue(thread.is_alive())
+        self.disconnect()
+        thread.join(2)
+        self.assertFalse(thread.is_alive())
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""This tests interactive search module."""
+
+import sys
+import time
+import unittest
+
+import benchmark
+import padpool
+import shearch
+
+class Curses(benchmark.Curses):
+
+    """`benchmark.Curses` counting `initscr` and `endwin` calls."""
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.initscr_calls = 0
+        self.endwin_calls = 0
+
+    def endwin(self):
+        self.endwin_calls += 1
+
+    def initscr(self):
+        self.initscr_calls += 1
+        return self.screen
+
+    def noecho(self):
+        pass
+
+class Window(benchmark.Window):
+
+    """`benchmark.Window` returning `keys` from `getch`."""
+
+    def __init__(self, rows, cols, keys):
+        benchmark.Window.__init__(self, rows, cols)
+        self._keys = list(keys)
+
+    def getch(self):
+        if self._keys:
+            return self._keys.pop(0)
+        # Nothing typed, as curses would wait for `timeout`.
+        time.sleep(0.001)
+        return -1
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = (shearch.curses, padpool.curses, shearch.connect,
+                      sys.argv)
+        sys.argv = ['shearch.py']
+        shearch.search = None
+        shearch.key = ''
+        shearch.tag_field = ''
+
+    def tearDown(self):
+        (shearch.curses, padpool.curses, shearch.connect,
+         sys.argv) = self.saved
+        shearch.search = None
+
+    def test_load_error(self):
+        def connect():
+            raise ValueError('malformed command base')
+
+        fake = Curses(Window(12, 80, [ord('g')]))
+        shearch.curses = padpool.curses = fake
+        shearch.connect = connect
+        self.assertRaises(ValueError, shearch.main)
+        self.assertEqual(fake.initscr_calls, 1)
+        self.assertEqual(fake.endwin_calls, 1)
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Opt-in tracing of a session, this module defines the following:
+
+- `span`: context manager timing a block of code.
+- `traced`: decorator timing every call of a function.
+
+Set ``SHEARCH_TRACE`` to a directory (``1`` for temporary directory) and
+every session writes ``shearch-<pid>.json`` there when it exits. It is in
+Chrome trace event format, open it in ``chrome://tracing`` or Perfetto to
+see where time goes: loading command base, queries, drawing, ``%c``
+commands and editing. Set ``SHEARCH_PROFILE`` too and cProfile
+statistics of the main thread are written to ``shearch-<pid>.prof``.
+
+Tracing is decided when this module is imported. When it is off,
+`traced` returns functions unchanged and `span` returns a shared no-op
+context manager, so instrumented code runs as if it was not.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import atexit
+import functools
+import os
+import threading
+from timeit import default_timer as timer
+
+TRACE_DIR = os.environ.get('SHEARCH_TRACE')
+"""Directory of trace files, None when tracing is off."""
+if TRACE_DIR == '1':
+    import tempfile
+    TRACE_DIR = tempfile.gettempdir()
+
+ENABLED = bool(TRACE_DIR)
+"""True if this session is traced."""
+
+_events = []
+"""List of (name, start, end, thread id, args) of finished spans."""
+
+_profile = None
+"""`cProfile.Profile` of this session or None."""
+
+_start = timer()
+
+class _Span(object):
+
+    """Records time between entering and leaving it."""
+
+    __slots__ = ('_args', '_name', '_start')
+
+    def __init__(self, name, args):
+        self._name = name
+        self._args = args
+        self._start = None
+
+    def __enter__(self):
+        self._start = timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        _record(self._name, self._start, self._args)
+
+class _NullSpan(object):
+
+    """Does nothing, returned by `span` when tracing is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+def path(extension):
+    """Return path of this session's trace file with `extension`."""
+    return os.path.join(TRACE_DIR, 'shearch-%d.%s' % (os.getpid(), extension))
+
+def span(name, **args):
+    """Return context manager recording span `name` with `args`."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+def traced(name=None):
+    """Return decorator recording calls as spans `name` (function name)."""
+    def decorate(function):
+        if not ENABLED:
+            return function
+        label = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = timer()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record(label, start)
+        return wrapper
+    return decorate
+
+def _record(name, start, args=None):
+    # Appending to a list is atomic, spans of worker threads are safe.
+    _events.append((name, start, timer(), threading.current_thread().ident,
+                    args))
+
+def _write():
+    """Write trace (and profile) of this session."""
+    import json
+
+    if _profile is not None:
+        _profile.disable()
+        _profile.dump_stats(path('prof'))
+
+    pid = os.getpid()
+    events = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+               'args': {'name': 'shearch'}}]
+    for name, start, end, tid, args in _events:
+        event = {
+            'name': name,
+            'ph': 'X',
+            'pid': pid,
+            'tid': tid,
+            'ts': round((start - _start) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+        }
+        if args:
+            event['args'] = args
+        events.append(event)
+
+    with open(path('json'), 'w') as out:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, out)
+
+if ENABLED:
+    atexit.register(_write)
+    if os.environ.get('SHEARCH_PROFILE'):
+        import cProfile
+        _profile = cProfile.Profile()
+        _profile.enable()